@@ -0,0 +1,39 @@
+import argparse
+import time
+
+import numpy as np
+
+from smart_nanogrid_gym.envs import SmartNanogridEnv
+
+
+def measure_step_time(number_of_chargers, charger_backend, episodes):
+    environment = SmartNanogridEnv(number_of_chargers=number_of_chargers, charger_backend=charger_backend,
+                                   episode_recorder_mode='off')
+    low, high = environment.action_space.low, environment.action_space.high
+    total_timesteps = environment.TOTAL_TIMESTEPS
+
+    step_time, steps = 0.0, 0
+    for _ in range(episodes):
+        environment.reset()
+        actions = np.random.uniform(low, high, size=(total_timesteps, low.shape[0])).astype(np.float32)
+        start = time.perf_counter()
+        for timestep in range(total_timesteps):
+            environment.step(actions[timestep])
+        step_time += time.perf_counter() - start
+        steps += total_timesteps
+    return step_time / steps
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chargers", nargs='+', default=[8, 64, 256, 1000, 2000, 5000], type=int)
+    parser.add_argument("--backends", nargs='+', default=['fleet', 'objects'], choices=['fleet', 'objects'])
+    parser.add_argument("--episodes", default=5, type=int)
+    args = parser.parse_args()
+
+    for number_of_chargers in args.chargers:
+        step_times = []
+        for charger_backend in args.backends:
+            step_time = measure_step_time(number_of_chargers, charger_backend, args.episodes)
+            step_times.append(f"{charger_backend}: {step_time * 1e6:.0f} us/step")
+        print(f"{number_of_chargers} chargers - " + ", ".join(step_times))
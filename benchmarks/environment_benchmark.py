@@ -0,0 +1,186 @@
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from smart_nanogrid_gym.envs import SmartNanogridEnv
+from smart_nanogrid_gym.utils.pv_system_manager import PVSystemManager
+from smart_nanogrid_gym.utils.scenario_generator import ScenarioGenerator
+from smart_nanogrid_gym.utils.shared_data_registry import shared_data_registry
+from solvers.RBC.rbc import RBC
+from solvers.env_variants import env_variants
+
+# Micro benchmarks time single calls (reset, step, observation building, scenario generation, PV system set up),
+# macro benchmarks whole episodes under a random policy and under RBC. Every case runs a number of rounds and
+# reports the median and minimum time per call. Results are saved as JSON, and compared against a baseline JSON
+# saved earlier every case whose median grew by more than the threshold is reported as a regression:
+#   python -m benchmarks.environment_benchmark --output baseline.json
+#   python -m benchmarks.environment_benchmark --baseline baseline.json --threshold 0.2
+BATCH_SIZE = 256
+
+
+def summarise_round_times(round_times):
+    return {'median_us': float(np.median(round_times) * 1e6), 'min_us': float(np.min(round_times) * 1e6)}
+
+
+def measure_calls(function, calls, rounds):
+    round_times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        round_times.append((time.perf_counter() - start) / calls)
+    return summarise_round_times(round_times)
+
+
+def measure_steps(environment, rounds, random_generator):
+    # Every round times the steps of one episode, started by an untimed reset
+    low, high = environment.action_space.low, environment.action_space.high
+    round_times = []
+    for _ in range(rounds):
+        actions = random_generator.uniform(low, high, size=(environment.TOTAL_TIMESTEPS, low.shape[0]))
+        actions = actions.astype(np.float32)
+        environment.reset()
+        start = time.perf_counter()
+        for timestep in range(environment.TOTAL_TIMESTEPS):
+            environment.step(actions[timestep])
+        round_times.append((time.perf_counter() - start) / environment.TOTAL_TIMESTEPS)
+    return summarise_round_times(round_times)
+
+
+def run_episode(environment, select_action):
+    observation = environment.reset()
+    done = False
+    while not done:
+        observation, _, done, _ = environment.step(select_action(observation))
+
+
+def benchmark_environment(configuration, number_of_chargers, time_interval, rounds, calls, seed):
+    environment = SmartNanogridEnv(**configuration, episode_recorder_mode='off', number_of_chargers=number_of_chargers,
+                                   time_interval=time_interval)
+    scenario_generator = ScenarioGenerator(number_of_chargers, environment.TIME_INTERVAL, seed=seed)
+    scenarios = [scenario_generator.generate_scenario() for _ in range(calls)]
+    random_generator = np.random.default_rng(seed)
+    low, high = environment.action_space.low, environment.action_space.high
+
+    scenario_indices = iter(range(calls * rounds))
+    environment.reset()
+
+    return {
+        'reset_generated': measure_calls(environment.reset, calls, rounds),
+        'reset_loaded': measure_calls(lambda: environment.reset(scenario=scenarios[next(scenario_indices) % calls]),
+                                      calls, rounds),
+        'observations': measure_calls(environment.get_observations, calls * 10, rounds),
+        'step': measure_steps(environment, rounds, random_generator),
+        'episode_random': measure_calls(
+            lambda: run_episode(environment, lambda _: random_generator.uniform(low, high).astype(np.float32)),
+            1, rounds),
+        'episode_rbc': measure_calls(
+            lambda: run_episode(environment, lambda observation: RBC.select_action(environment, observation)),
+            1, rounds)
+    }
+
+
+def benchmark_scenario_generation(number_of_chargers, time_interval, rounds, calls, seed):
+    scenario_generator = ScenarioGenerator(number_of_chargers, time_interval, seed=seed)
+    batch_result = measure_calls(lambda: scenario_generator.generate_scenario_batch(BATCH_SIZE), 1, rounds)
+    return {
+        'scenario_generation': measure_calls(scenario_generator.generate_scenario, calls, rounds),
+        # Per scenario, so it compares directly with scenario_generation
+        'scenario_generation_batched': {name: value / BATCH_SIZE for name, value in batch_result.items()}
+    }
+
+
+def benchmark_pv_system_manager(time_interval, rounds, calls):
+    def construct_uncached_pv_system_manager():
+        # Drops the tables kept by this process, so the irradiance table is loaded from the registry file again
+        shared_data_registry.clear()
+        PVSystemManager(1, time_interval)
+
+    return {
+        'pv_system_manager': measure_calls(lambda: PVSystemManager(1, time_interval), calls, rounds),
+        'pv_system_manager_uncached': measure_calls(construct_uncached_pv_system_manager, calls, rounds)
+    }
+
+
+def run_benchmarks(variant_names, numbers_of_chargers, time_interval, rounds, calls, seed):
+    results = {}
+    for name, result in benchmark_pv_system_manager(time_interval, rounds, calls).items():
+        results[name] = result
+
+    for number_of_chargers in numbers_of_chargers:
+        scenario_results = benchmark_scenario_generation(number_of_chargers, time_interval, rounds, calls, seed)
+        for name, result in scenario_results.items():
+            results[f'{number_of_chargers}/{name}'] = result
+
+        for env_variant in env_variants:
+            if env_variant['variant_name'] not in variant_names:
+                continue
+            environment_results = benchmark_environment(env_variant['config'], number_of_chargers, time_interval,
+                                                        rounds, calls, seed)
+            for name, result in environment_results.items():
+                results[f"{env_variant['variant_name']}/{number_of_chargers}/{name}"] = result
+            print(f"{env_variant['variant_name']} {number_of_chargers} chargers - "
+                  f"step: {environment_results['step']['median_us']:.0f} us, "
+                  f"episode: {environment_results['episode_random']['median_us'] / 1e3:.2f} ms")
+    return results
+
+
+def compare_with_baseline(results, baseline_results, threshold):
+    regressions = []
+    for case, result in results.items():
+        if case not in baseline_results:
+            continue
+        ratio = result['median_us'] / baseline_results[case]['median_us']
+        regressed = ratio > 1 + threshold
+        if regressed:
+            regressions.append(case)
+        print(f"{'REGRESSION ' if regressed else ''}{case}: {baseline_results[case]['median_us']:.1f} -> "
+              f"{result['median_us']:.1f} us ({ratio:.2f}x)")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--variants", nargs='+', default=[env_variant['variant_name'] for env_variant in env_variants])
+    parser.add_argument("--chargers", nargs='+', default=[8, 64, 256], type=int)
+    parser.add_argument("--time_interval", default='1h')
+    parser.add_argument("--rounds", default=7, type=int)
+    parser.add_argument("--calls", default=20, type=int)
+    parser.add_argument("--seed", default=0, type=int)
+    parser.add_argument("--output", default=None, help="JSON file the results are saved to")
+    parser.add_argument("--baseline", default=None, help="JSON file of earlier results to compare against")
+    parser.add_argument("--threshold", default=0.2, type=float,
+                        help="Relative growth of the median time reported as a regression")
+    args = parser.parse_args()
+
+    benchmark_results = run_benchmarks(args.variants, args.chargers, args.time_interval, args.rounds, args.calls,
+                                       args.seed)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({
+                'metadata': {
+                    'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'python': platform.python_version(),
+                    'numpy': np.__version__,
+                    'platform': platform.platform(),
+                    'processor': platform.processor(),
+                    'time_interval': args.time_interval,
+                    'rounds': args.rounds,
+                    'calls': args.calls
+                },
+                'results': benchmark_results
+            }, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressed_cases = compare_with_baseline(benchmark_results, baseline['results'], args.threshold)
+        print(f"{len(regressed_cases)} of {len(benchmark_results)} cases regressed by more than "
+              f"{args.threshold:.0%}")
+        if regressed_cases:
+            sys.exit(1)
@@ -0,0 +1,87 @@
+import argparse
+import time
+
+import numpy as np
+
+from smart_nanogrid_gym.envs import SmartNanogridEnv
+from solvers.env_variants import env_variants
+
+# Step time of the object-oriented simulation ('objects', 'fleet' charger backends) against the pure step kernel
+# ('numpy', 'numba'), both through env.step() and calling the kernel directly, which leaves out the gym wrapper.
+# Speedups are relative to the 'objects' backend:
+#   python -m benchmarks.step_kernel_benchmark --chargers 8 64 --variants v2x-b-pv-
+CHARGER_BACKENDS = ['objects', 'fleet']
+STEP_KERNEL_BACKENDS = ['numpy', 'numba']
+
+
+def create_environment(configuration, number_of_chargers, backend):
+    if backend in STEP_KERNEL_BACKENDS:
+        return SmartNanogridEnv(**configuration, episode_recorder_mode='off', number_of_chargers=number_of_chargers,
+                                step_kernel_backend=backend)
+    return SmartNanogridEnv(**configuration, episode_recorder_mode='off', number_of_chargers=number_of_chargers,
+                            charger_backend=backend)
+
+
+def measure_step_time(environment, episodes, random_generator, kernel_only=False):
+    low, high = environment.action_space.low, environment.action_space.high
+    total_timesteps = environment.TOTAL_TIMESTEPS
+
+    step_time = 0.0
+    for _ in range(episodes):
+        environment.reset()
+        actions = random_generator.uniform(low, high, size=(total_timesteps, low.shape[0])).astype(np.float32)
+        if kernel_only:
+            kernel_step, state, parameters = environment.step_kernel.step, environment.kernel_state, \
+                environment.kernel_parameters
+            actions = actions.astype(np.float64)
+            start = time.perf_counter()
+            for timestep in range(total_timesteps):
+                state, _, _ = kernel_step(state, actions[timestep], parameters)
+        else:
+            start = time.perf_counter()
+            for timestep in range(total_timesteps):
+                environment.step(actions[timestep])
+        step_time += time.perf_counter() - start
+    return step_time / (episodes * total_timesteps)
+
+
+def measure_first_step_time(configuration, number_of_chargers, backend):
+    # Environment construction, reset and the first step, which includes compiling or loading the compiled kernel
+    start = time.perf_counter()
+    environment = create_environment(configuration, number_of_chargers, backend)
+    environment.reset()
+    environment.step(environment.action_space.sample())
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--variants", nargs='+', default=[env_variant['variant_name'] for env_variant in env_variants])
+    parser.add_argument("--chargers", nargs='+', default=[8, 64, 256], type=int)
+    parser.add_argument("--backends", nargs='+', default=CHARGER_BACKENDS + STEP_KERNEL_BACKENDS,
+                        choices=CHARGER_BACKENDS + STEP_KERNEL_BACKENDS)
+    parser.add_argument("--episodes", default=20, type=int)
+    parser.add_argument("--seed", default=0, type=int)
+    args = parser.parse_args()
+
+    for env_variant in env_variants:
+        if env_variant['variant_name'] not in args.variants:
+            continue
+        for number_of_chargers in args.chargers:
+            step_times = {}
+            for backend in args.backends:
+                first_step_time = measure_first_step_time(env_variant['config'], number_of_chargers, backend)
+                environment = create_environment(env_variant['config'], number_of_chargers, backend)
+                random_generator = np.random.default_rng(args.seed)
+                step_times[backend] = measure_step_time(environment, args.episodes, random_generator)
+                if backend in STEP_KERNEL_BACKENDS:
+                    step_times[f'{backend} kernel only'] = measure_step_time(environment, args.episodes,
+                                                                             random_generator, kernel_only=True)
+                print(f"{env_variant['variant_name']} {number_of_chargers} chargers - {backend} first step "
+                      f"{first_step_time * 1e3:.0f} ms")
+
+            reference_time = step_times.get('objects')
+            for backend, step_time in step_times.items():
+                speedup = f" ({reference_time / step_time:.1f}x)" if reference_time else ""
+                print(f"{env_variant['variant_name']} {number_of_chargers} chargers - {backend}: "
+                      f"{step_time * 1e6:.1f} us/step{speedup}")
@@ -0,0 +1,82 @@
+import argparse
+import time
+
+import numpy as np
+
+from smart_nanogrid_gym.envs import SmartNanogridEnv, VectorSmartNanogridEnv
+from solvers.env_variants import env_variants
+
+
+def compare_with_single_environment(configuration, episodes):
+    single_environment = SmartNanogridEnv(**configuration)
+    vector_environment = VectorSmartNanogridEnv(1, **configuration)
+    max_observation_difference = 0.0
+    max_reward_difference = 0.0
+
+    for _ in range(episodes):
+        single_observation = single_environment.reset()
+        vector_observation = vector_environment.reset(scenarios=[single_environment.get_scenario()])
+        max_observation_difference = max(max_observation_difference,
+                                         np.abs(single_observation - vector_observation[0]).max())
+
+        done = False
+        while not done:
+            action = single_environment.action_space.sample()
+            single_observation, single_reward, done, _ = single_environment.step(action)
+            vector_observation, vector_reward, _, infos = vector_environment.step(action[np.newaxis, :])
+            if done:
+                vector_observation = infos[0]['terminal_observation'][np.newaxis, :]
+
+            max_observation_difference = max(max_observation_difference,
+                                             np.abs(single_observation - vector_observation[0]).max())
+            max_reward_difference = max(max_reward_difference,
+                                        abs(single_reward - vector_reward[0]) / max(1.0, abs(single_reward)))
+
+    return max_observation_difference, max_reward_difference
+
+
+def measure_single_environment_steps_per_second(configuration, steps):
+    environment = SmartNanogridEnv(**configuration)
+    environment.reset()
+    start = time.perf_counter()
+    for _ in range(steps):
+        _, _, done, _ = environment.step(environment.action_space.sample())
+        if done:
+            environment.reset()
+    return steps / (time.perf_counter() - start)
+
+
+def measure_vector_environment_steps_per_second(configuration, number_of_environments, steps):
+    environment = VectorSmartNanogridEnv(number_of_environments, **configuration)
+    low, high = environment.action_space.low, environment.action_space.high
+    actions = np.random.uniform(low, high, size=(steps, number_of_environments, low.shape[0]))
+
+    environment.reset()
+    start = time.perf_counter()
+    for step in range(steps):
+        environment.step(actions[step])
+    return steps * number_of_environments / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--episodes", default=20, type=int)
+    parser.add_argument("--steps", default=96, type=int)
+    parser.add_argument("--max_environments", default=4096, type=int)
+    args = parser.parse_args()
+
+    numbers_of_environments = [2 ** exponent for exponent in range(0, 13, 2) if 2 ** exponent <= args.max_environments]
+
+    for env_variant in env_variants:
+        configuration = env_variant['config']
+        observation_difference, reward_difference = compare_with_single_environment(configuration, args.episodes)
+        print(f"{env_variant['variant_name']} max observation difference: {observation_difference:.3e}, "
+              f"max relative reward difference: {reward_difference:.3e}")
+
+        single_steps_per_second = measure_single_environment_steps_per_second(configuration, args.steps)
+        print(f"{env_variant['variant_name']} SmartNanogridEnv: {single_steps_per_second:.0f} steps/s")
+        for number_of_environments in numbers_of_environments:
+            vector_steps_per_second = measure_vector_environment_steps_per_second(configuration,
+                                                                                  number_of_environments, args.steps)
+            print(f"{env_variant['variant_name']} VectorSmartNanogridEnv N={number_of_environments}: "
+                  f"{vector_steps_per_second:.0f} steps/s")
@@ -6,3 +6,9 @@ register(
      entry_point='smart_nanogrid_gym.envs:SmartNanogridEnv',
      max_episode_steps=200,
 )
+
+register(
+     id='MultiSiteSmartNanogridEnv-v0',
+     entry_point='smart_nanogrid_gym.envs:MultiSiteSmartNanogridEnv',
+     max_episode_steps=200,
+)
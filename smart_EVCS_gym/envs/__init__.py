@@ -1 +1,16 @@
 from smart_nanogrid_gym.envs.smart_nanogrid_environment import SmartNanogridEnv
+from smart_nanogrid_gym.envs.multi_site_smart_nanogrid_environment import MultiSiteSmartNanogridEnv
+
+# The vector environments are stable_baselines3 VecEnvs, imported on first use so that importing the package does
+# not import stable_baselines3 and torch
+LAZY_ENVIRONMENTS = {
+    'VectorSmartNanogridEnv': 'smart_nanogrid_gym.envs.vector_smart_nanogrid_environment',
+    'AsyncVectorSmartNanogridEnv': 'smart_nanogrid_gym.envs.async_vector_smart_nanogrid_environment'
+}
+
+
+def __getattr__(name):
+    if name in LAZY_ENVIRONMENTS:
+        import importlib
+        return getattr(importlib.import_module(LAZY_ENVIRONMENTS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,277 @@
+import multiprocessing
+import threading
+import traceback
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+
+from smart_nanogrid_gym.envs.smart_nanogrid_environment import SmartNanogridEnv
+
+# Commands the main process writes to the shared header before releasing the workers
+RESET = 0
+STEP = 1
+SEED = 2
+CLOSE = 3
+# get_attr, set_attr or env_method, given with its arguments on the workers' request queues
+CALL = 4
+
+
+def create_shared_arrays(buffer, number_of_environments, observation_size, action_size, action_dtype):
+    # Views of every part of the shared block, created the same way by the main process and by every worker. 8-byte
+    # parts come first so that every view is aligned.
+    #   header                  command, seed of a SEED command (-1 unseeded)
+    #   rewards                 reward of every environment in the last step
+    #   actions                 actions of every environment for the next step
+    #   observations            observation of every environment after the last step or reset
+    #   terminal_observations   last observation of every environment that finished its episode in the last step,
+    #                           whose observation is already the first one of its next episode
+    #   dones                   flags of the environments that finished their episode in the last step
+    shapes = [
+        ('header', (2,), np.int64),
+        ('rewards', (number_of_environments,), np.float64),
+        ('actions', (number_of_environments, action_size), action_dtype),
+        ('observations', (number_of_environments, observation_size), np.float32),
+        ('terminal_observations', (number_of_environments, observation_size), np.float32),
+        ('dones', (number_of_environments,), np.bool_)
+    ]
+
+    shared_arrays = {}
+    offset = 0
+    for name, shape, dtype in shapes:
+        dtype = np.dtype(dtype)
+        offset = -(-offset // dtype.alignment) * dtype.alignment
+        shared_arrays[name] = np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset) \
+            if buffer is not None else None
+        offset += int(np.prod(shape)) * dtype.itemsize
+    return shared_arrays, offset
+
+
+def call_environments(environments, environment_indices, request):
+    # Runs a CALL request on the worker's environments among its indices. Returns their results by environment
+    # index and the traceback of a failed call, which the main process raises, so that one bad call does not stop
+    # the workers.
+    kind, name, args, kwargs, indices = request
+    results = {}
+    try:
+        for environment_index, environment in zip(environment_indices, environments):
+            if environment_index not in indices:
+                continue
+            if kind == 'get_attr':
+                results[environment_index] = getattr(environment, name)
+            elif kind == 'set_attr':
+                setattr(environment, name, args[0])
+            else:
+                results[environment_index] = getattr(environment, name)(*args, **kwargs)
+    except Exception:
+        return results, traceback.format_exc()
+    return results, None
+
+
+def run_worker(env_configuration, environment_indices, shared_memory_name, shared_arrays_specification, barrier,
+               error_queue, request_queue, response_queue):
+    # Builds the environments of the given slots from their configuration and runs every command the main process
+    # gives until CLOSE. Each phase ends at the barrier; a worker that fails aborts it so the main process does not
+    # wait forever, and reports its traceback on error_queue. CALL requests come on request_queue, pickled as they
+    # are rare, and every worker answers one on response_queue.
+    block = shared_memory.SharedMemory(name=shared_memory_name)
+    try:
+        shared_arrays, _ = create_shared_arrays(block.buf, *shared_arrays_specification)
+        header = shared_arrays['header']
+        environments = [SmartNanogridEnv(**env_configuration) for _ in environment_indices]
+
+        while True:
+            barrier.wait()
+            command = header[0]
+            if command == CLOSE:
+                break
+
+            if command == SEED:
+                for environment_index, environment in zip(environment_indices, environments):
+                    environment.seed(AsyncVectorSmartNanogridEnv.get_environment_seed(header[1], environment_index))
+            elif command == RESET:
+                for environment_index, environment in zip(environment_indices, environments):
+                    shared_arrays['observations'][environment_index] = environment.reset()
+                    shared_arrays['dones'][environment_index] = False
+            elif command == STEP:
+                for environment_index, environment in zip(environment_indices, environments):
+                    observations, reward, done, _ = environment.step(shared_arrays['actions'][environment_index])
+                    if done:
+                        shared_arrays['terminal_observations'][environment_index] = observations
+                        observations = environment.reset()
+                    shared_arrays['observations'][environment_index] = observations
+                    shared_arrays['rewards'][environment_index] = reward
+                    shared_arrays['dones'][environment_index] = done
+            elif command == CALL:
+                response_queue.put(call_environments(environments, environment_indices, request_queue.get()))
+            barrier.wait()
+    except threading.BrokenBarrierError:
+        pass
+    except BaseException:
+        error_queue.put(traceback.format_exc())
+        barrier.abort()
+    finally:
+        shared_arrays = header = None
+        block.close()
+
+
+def release_workers(block, barrier, workers):
+    # Gives the workers CLOSE and frees the shared block, from close() or once an environment that was never closed
+    # is collected, so it holds no reference to the environment. The barrier is aborted afterwards in case the
+    # environment was dropped between step_async and step_wait, when CLOSE only ends the step.
+    if not barrier.broken:
+        header = np.ndarray((1,), dtype=np.int64, buffer=block.buf)
+        header[0] = CLOSE
+        header = None
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            pass
+        barrier.abort()
+    for worker in workers:
+        worker.join()
+    block.unlink()
+    try:
+        block.close()
+    except BufferError:
+        # Views of the block are still alive at interpreter exit, their mapping goes with the process
+        pass
+
+
+class AsyncVectorSmartNanogridEnv(VecEnv):
+    # Runs NUMBER_OF_ENVIRONMENTS SmartNanogridEnv days in worker processes that share one block of memory with the
+    # main process. Actions, observations, rewards and done flags are written straight into that block and every
+    # step is one pass through a barrier to start the workers and one to collect them, so nothing is pickled per
+    # step, unlike SubprocVecEnv. Every worker builds its environments from env_configuration, the keyword
+    # arguments of SmartNanogridEnv, and steps a contiguous slice of the environments.
+    #
+    # Environments reset themselves when their episode ends, as in every VecEnv, and their last observation is
+    # given as the terminal_observation info. Other infos of the environments are not sent back. get_attr,
+    # set_attr and env_method run in the workers, on the environments of the given indices, and pickle their
+    # arguments and results. Once seeded, environment j runs the episodes of a SmartNanogridEnv seeded with
+    # SeedSequence(seed, spawn_key=(j,)), as in VectorSmartNanogridEnv; a seed in env_configuration is taken as that
+    # seed rather than given to every environment, which would make them all run the same episodes.
+    def __init__(self, number_of_environments, env_configuration=None, number_of_workers=None, seed=None,
+                 start_method=None):
+        env_configuration = dict(env_configuration or {}, episode_recorder_mode='off')
+        if 'seed' in env_configuration:
+            if seed is not None:
+                raise Exception("Give the seed of the async vector environment either as seed or in "
+                                "env_configuration, not both.")
+            seed = env_configuration.pop('seed')
+        self.reference_environment = SmartNanogridEnv(**env_configuration)
+        self.NUMBER_OF_ENVIRONMENTS = number_of_environments
+        observation_size = self.reference_environment.observation_space.shape[0]
+        action_space = self.reference_environment.action_space
+
+        shared_arrays_specification = (number_of_environments, observation_size, action_space.shape[0],
+                                       action_space.dtype.str)
+        _, shared_memory_size = create_shared_arrays(None, *shared_arrays_specification)
+        self.shared_memory = shared_memory.SharedMemory(create=True, size=shared_memory_size)
+        self.shared_arrays, _ = create_shared_arrays(self.shared_memory.buf, *shared_arrays_specification)
+
+        number_of_workers = min(number_of_workers or multiprocessing.cpu_count(), number_of_environments)
+        context = multiprocessing.get_context(start_method)
+        self.barrier = context.Barrier(number_of_workers + 1)
+        self.error_queue = context.Queue()
+        self.request_queues = [context.Queue() for _ in range(number_of_workers)]
+        self.response_queue = context.Queue()
+        self.workers = []
+        for worker_environment_indices, request_queue in zip(
+                np.array_split(np.arange(number_of_environments), number_of_workers), self.request_queues):
+            worker = context.Process(target=run_worker, args=(env_configuration, worker_environment_indices.tolist(),
+                                                              self.shared_memory.name, shared_arrays_specification,
+                                                              self.barrier, self.error_queue, request_queue,
+                                                              self.response_queue), daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        self.closed = False
+        self.release = weakref.finalize(self, release_workers, self.shared_memory, self.barrier, self.workers)
+
+        if seed is not None:
+            self.seed(seed)
+
+        super().__init__(number_of_environments, self.reference_environment.observation_space, action_space)
+
+    def run_command(self, command):
+        self.shared_arrays['header'][0] = command
+        self.synchronise()
+
+    def synchronise(self):
+        try:
+            self.barrier.wait()
+        except threading.BrokenBarrierError:
+            self.close()
+            raise Exception(f"A worker of the async vector environment failed:\n{self.error_queue.get(timeout=10)}")
+
+    def reset(self):
+        self.run_command(RESET)
+        self.synchronise()
+        return self.shared_arrays['observations'].copy()
+
+    def step_async(self, actions):
+        self.shared_arrays['actions'][:] = np.asarray(actions).reshape(self.NUMBER_OF_ENVIRONMENTS, -1)
+        self.run_command(STEP)
+
+    def step_wait(self):
+        self.synchronise()
+        observations = self.shared_arrays['observations'].copy()
+        rewards = self.shared_arrays['rewards'].astype(np.float32)
+        dones = self.shared_arrays['dones'].copy()
+
+        infos = [{} for _ in range(self.NUMBER_OF_ENVIRONMENTS)]
+        for environment_index in np.flatnonzero(dones):
+            infos[environment_index]['terminal_observation'] = \
+                self.shared_arrays['terminal_observations'][environment_index].copy()
+        return observations, rewards, dones, infos
+
+    def seed(self, seed=None):
+        self.shared_arrays['header'][1] = -1 if seed is None else seed
+        self.run_command(SEED)
+        self.synchronise()
+        return [self.get_environment_seed(seed, environment_index)
+                for environment_index in range(self.NUMBER_OF_ENVIRONMENTS)]
+
+    @staticmethod
+    def get_environment_seed(seed, environment_index):
+        if seed is None or seed < 0:
+            return None
+        return np.random.SeedSequence(int(seed), spawn_key=(environment_index,))
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.shared_arrays = None
+        self.release()
+
+    def call_workers(self, kind, name, args=(), kwargs=None, indices=None):
+        indices = list(self._get_indices(indices))
+        for request_queue in self.request_queues:
+            request_queue.put((kind, name, args, kwargs or {}, set(indices)))
+        self.run_command(CALL)
+        self.synchronise()
+
+        results = {}
+        errors = []
+        for _ in self.workers:
+            worker_results, error = self.response_queue.get()
+            results.update(worker_results)
+            if error:
+                errors.append(error)
+        if errors:
+            raise Exception(f"{kind}('{name}') failed in the async vector environment:\n{errors[0]}")
+        return [results.get(environment_index) for environment_index in indices]
+
+    def get_attr(self, attr_name, indices=None):
+        return self.call_workers('get_attr', attr_name, indices=indices)
+
+    def set_attr(self, attr_name, value, indices=None):
+        self.call_workers('set_attr', attr_name, (value,), indices=indices)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return self.call_workers('env_method', method_name, method_args, method_kwargs, indices)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
@@ -0,0 +1,193 @@
+import numpy as np
+import gym
+from gym import spaces
+
+from smart_nanogrid_gym.envs.smart_nanogrid_environment import SmartNanogridEnv
+from smart_nanogrid_gym.utils.charging_station import ChargingStation
+from smart_nanogrid_gym.utils.multi_site_central_management_system import MultiSiteCentralManagementSystem
+from smart_nanogrid_gym.utils.random_streams import RandomStreams
+from smart_nanogrid_gym.utils.scenario_generator import ScenarioGenerator
+
+
+class MultiSiteSmartNanogridEnv(gym.Env):
+    # NUMBER_OF_SITES charging sites, each with its own chargers, PV system and battery, behind one grid contract.
+    # The chargers of all sites are simulated as one array-backed charging station whose chargers are numbered site
+    # by site, and a MultiSiteCentralManagementSystem balances the energy of every site in one pass per step.
+    #
+    # Observations hold the radiation and price values and predictions shared by all sites, followed by one block
+    # per site with its vehicle states of charge, departure times and battery state of charge. Actions hold one
+    # block per site with its charger actions followed by its battery action.
+    def __init__(self, number_of_sites=4, chargers_per_site=8, price_model=0, pv_system_available_in_model=True,
+                 battery_system_available_in_model=True, vehicle_to_everything=False, pv_system_scales=None,
+                 number_of_hours_ahead=3, arrival_model=None, dwell_time_model=None, state_of_charge_model=None,
+                 seed=None, time_interval=1, historical_prices_path=None, battery_units=None):
+        self.site_environment = SmartNanogridEnv(price_model, pv_system_available_in_model,
+                                                 battery_system_available_in_model, vehicle_to_everything,
+                                                 number_of_hours_ahead=number_of_hours_ahead,
+                                                 episode_recorder_mode='off', number_of_chargers=chargers_per_site,
+                                                 time_interval=time_interval,
+                                                 historical_prices_path=historical_prices_path,
+                                                 battery_units=battery_units)
+        self.NUMBER_OF_SITES = number_of_sites
+        self.CHARGERS_PER_SITE = chargers_per_site
+        self.NUMBER_OF_CHARGERS = number_of_sites * chargers_per_site
+        self.TIME_INTERVAL = self.site_environment.TIME_INTERVAL
+        self.TOTAL_TIMESTEPS = self.site_environment.TOTAL_TIMESTEPS
+        self.NUMBER_OF_DAYS_TO_PREDICT = self.site_environment.NUMBER_OF_DAYS_TO_PREDICT
+        self.CURRENT_PRICE_MODEL = price_model
+        self.PV_SYSTEM_AVAILABLE_IN_MODEL = pv_system_available_in_model
+        self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL = battery_system_available_in_model
+        self.VEHICLE_TO_EVERYTHING = vehicle_to_everything
+
+        scenario_generator = ScenarioGenerator(self.NUMBER_OF_CHARGERS, self.TIME_INTERVAL, arrival_model,
+                                               dwell_time_model, state_of_charge_model)
+        self.charging_station = ChargingStation(self.NUMBER_OF_CHARGERS, self.TIME_INTERVAL, scenario_generator)
+        self.charger_sites = np.repeat(np.arange(number_of_sites), chargers_per_site)
+        self.central_management_system = MultiSiteCentralManagementSystem(number_of_sites,
+                                                                          battery_system_available_in_model,
+                                                                          pv_system_available_in_model,
+                                                                          vehicle_to_everything, battery_units)
+
+        # Every site sees the same irradiance, scaled by the size of its own PV system
+        if pv_system_scales is None:
+            pv_system_scales = np.ones(number_of_sites)
+        self.pv_system_scales = np.asarray(pv_system_scales, dtype=float)
+        if self.PV_SYSTEM_AVAILABLE_IN_MODEL:
+            available_solar_power = self.site_environment.pv_system_manager.get_available_solar_produced_power(
+                self.TIME_INTERVAL)[0, :]
+            self.available_solar_power = self.pv_system_scales[:, np.newaxis] * available_solar_power
+        else:
+            self.available_solar_power = np.zeros((number_of_sites, self.TOTAL_TIMESTEPS))
+
+        self.energy_price = None
+        self.disturbance_observations = None
+        self.timestep = None
+        self.info = None
+
+        self.random_streams = None
+        if seed is not None:
+            self.seed(seed)
+
+        self.site_observation_layout = self.site_environment.observation_layout
+        self.disturbances_size = self.site_observation_layout.vehicle_state_of_charge.start
+        self.site_states_size = self.site_observation_layout.size - self.disturbances_size
+        self.observations = np.zeros(self.disturbances_size + number_of_sites * self.site_states_size,
+                                     dtype=np.float32)
+        self.site_states = self.observations[self.disturbances_size:].reshape(number_of_sites, self.site_states_size)
+
+        site_action_space = self.site_environment.action_space
+        self.site_action_size = site_action_space.shape[0]
+        self.action_space = spaces.Box(low=np.tile(site_action_space.low, number_of_sites),
+                                       high=np.tile(site_action_space.high, number_of_sites), dtype=np.float32)
+        self.observation_space = spaces.Box(low=np.zeros(self.observations.shape, dtype=np.float32),
+                                            high=np.ones(self.observations.shape, dtype=np.float32), dtype=np.float32)
+
+    def step(self, actions):
+        site_actions = np.asarray(actions).reshape(self.NUMBER_OF_SITES, self.site_action_size)
+        charger_actions = site_actions[:, :self.CHARGERS_PER_SITE].ravel()
+        if self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL:
+            battery_actions = site_actions[:, -1]
+        else:
+            battery_actions = np.zeros(self.NUMBER_OF_SITES)
+
+        total_charging_power, total_discharging_power = self.simulate_vehicle_charging(charger_actions)
+        results = self.central_management_system.simulate(total_charging_power, total_discharging_power,
+                                                          self.available_solar_power[:, self.timestep],
+                                                          self.energy_price[0, self.timestep],
+                                                          self.calculate_insufficiently_charged_penalty(),
+                                                          battery_actions, self.TIME_INTERVAL)
+
+        observations = self.get_observations()
+        self.timestep = self.timestep + 1
+
+        done = self.timestep == self.TOTAL_TIMESTEPS
+        if done:
+            self.timestep = 0
+
+        reward = -results['Total cost']
+        self.info = {'Site power': results['Site power']}
+
+        return observations, reward, done, self.info
+
+    def simulate_vehicle_charging(self, charger_actions):
+        occupied_chargers, charger_power_values = self.charging_station.charger_fleet.charge_connected_vehicles(
+            charger_actions, self.timestep, self.TIME_INTERVAL)
+        occupied_sites = self.charger_sites[occupied_chargers]
+
+        total_charging_power = np.bincount(occupied_sites, np.maximum(charger_power_values, 0.0),
+                                           minlength=self.NUMBER_OF_SITES)
+        total_discharging_power = np.bincount(occupied_sites, np.minimum(charger_power_values, 0.0),
+                                              minlength=self.NUMBER_OF_SITES)
+        return total_charging_power, total_discharging_power
+
+    def calculate_insufficiently_charged_penalty(self):
+        departing_vehicles = self.charging_station.departing_vehicles
+        uncharged_capacity = 1 - self.charging_station.vehicle_state_of_charge[departing_vehicles, self.timestep - 1]
+        return np.bincount(self.charger_sites[departing_vehicles], (uncharged_capacity * 2) ** 2,
+                           minlength=self.NUMBER_OF_SITES)
+
+    def get_observations(self):
+        departure_times, vehicles_state_of_charge = self.charging_station.simulate(self.timestep, self.TIME_INTERVAL)
+        states_of_charge_end = self.CHARGERS_PER_SITE
+        departure_times_end = 2 * self.CHARGERS_PER_SITE
+
+        self.observations[:self.disturbances_size] = self.disturbance_observations[self.timestep]
+        self.site_states[:, :states_of_charge_end] = vehicles_state_of_charge.reshape(self.NUMBER_OF_SITES, -1)
+        self.site_states[:, states_of_charge_end:departure_times_end] = \
+            departure_times.reshape(self.NUMBER_OF_SITES, -1) * self.TIME_INTERVAL / 24
+        if self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL:
+            self.site_states[:, departure_times_end] = self.central_management_system.get_battery_state_of_charge()
+
+        return self.observations.copy()
+
+    def get_site_observations(self, observations):
+        # Splits observations into one single-site observation per site, laid out as site_observation_layout, so
+        # single-site policies such as RBC.select_actions can act on every site at once
+        site_observations = np.empty((self.NUMBER_OF_SITES, self.site_observation_layout.size), dtype=np.float32)
+        site_observations[:, :self.disturbances_size] = observations[:self.disturbances_size]
+        site_observations[:, self.disturbances_size:] = \
+            observations[self.disturbances_size:].reshape(self.NUMBER_OF_SITES, self.site_states_size)
+        return site_observations
+
+    def reset(self, scenario=None, episode=None):
+        self.timestep = 0
+        episode = self.random_streams.start_episode(episode) if self.random_streams else None
+
+        tariff_engine = self.site_environment.tariff_engine
+        if self.random_streams and tariff_engine.varies_per_episode(self.CURRENT_PRICE_MODEL):
+            price_generator = self.random_streams.get_generator(episode, RandomStreams.PRICES)
+        else:
+            price_generator = None
+        self.energy_price = tariff_engine.get_energy_price(self.CURRENT_PRICE_MODEL, self.NUMBER_OF_DAYS_TO_PREDICT,
+                                                           random_generator=price_generator)
+        if self.PV_SYSTEM_AVAILABLE_IN_MODEL:
+            solar_radiation = self.site_environment.pv_system_manager.get_solar_radiation()
+            self.disturbance_observations = self.site_environment.calculate_disturbance_observations(
+                self.energy_price[0], solar_radiation[0])
+        else:
+            self.disturbance_observations = self.site_environment.calculate_disturbance_observations(
+                self.energy_price[0])
+
+        self.central_management_system.reset_battery_systems()
+        if scenario is not None:
+            self.charging_station.load_scenario(scenario)
+        else:
+            scenario_generator = self.random_streams.get_generator(episode, RandomStreams.SCENARIO) \
+                if self.random_streams else None
+            self.charging_station.generate_new_initial_values(scenario_generator)
+
+        return self.get_observations()
+
+    def get_scenario(self):
+        return self.charging_station.scenario
+
+    def render(self, mode="human"):
+        pass
+
+    def seed(self, seed=None):
+        # Scenarios of all sites and the prices, see RandomStreams
+        self.random_streams = RandomStreams(seed)
+        return [self.random_streams.seed_sequence.entropy]
+
+    def close(self):
+        pass
@@ -1,39 +1,68 @@
 import numpy as np
 import gym
 from gym import spaces
-from gym.utils import seeding
-from scipy.io import savemat
 import time
 
+from smart_nanogrid_gym.utils.battery_bank import BatteryBank
 from smart_nanogrid_gym.utils.central_management_system import CentralManagementSystem
 from smart_nanogrid_gym.utils.charging_station import ChargingStation
+from smart_nanogrid_gym.utils.environment_state import GENERATOR_STATE_WORDS, STATE_FORMAT_VERSION, VALUE_TYPES, \
+    StateLayout, get_generator_state, get_value_type_index, set_generator_state
+from smart_nanogrid_gym.utils.episode_recorder import create_episode_recorder
+from smart_nanogrid_gym.utils.observation_layout import ObservationLayout
 from smart_nanogrid_gym.utils.pv_system_manager import PVSystemManager
-from ..utils.config import data_files_directory_path
+from smart_nanogrid_gym.utils.random_streams import RandomStreams
+from smart_nanogrid_gym.utils.scenario import ScenarioBatch
+from smart_nanogrid_gym.utils.scenario_bank import ScenarioBank
+from smart_nanogrid_gym.utils.step_kernel import STEP_RESULT_NAMES, create_kernel_parameters, create_kernel_state, \
+    create_step_kernel
+from smart_nanogrid_gym.utils.step_profiler import create_step_profiler
+from smart_nanogrid_gym.utils.tariff_engine import TariffEngine
+from smart_nanogrid_gym.utils.time_grid import TimeGrid
 
 
 class SmartNanogridEnv(gym.Env):
     def __init__(self, price_model=0, pv_system_available_in_model=True, battery_system_available_in_model=True,
-                 vehicle_to_everything=False):
+                 vehicle_to_everything=False, save_initial_values=False, scenario_bank_path=None,
+                 scenario_generator=None, number_of_hours_ahead=3, episode_recorder_mode='mat',
+                 episode_recorder_options=None, number_of_chargers=8, charger_backend='fleet', time_interval=1,
+                 historical_prices_path=None, step_profiler_mode='off', step_profiler_options=None,
+                 step_kernel_backend='off', battery_units=None, seed=None):
         # Add building_in_nanogrid=False, building_demand=False as init arguments
-        self.NUMBER_OF_CHARGERS = 8
+        self.NUMBER_OF_CHARGERS = number_of_chargers
         self.NUMBER_OF_DAYS_TO_PREDICT = 1
-        # TODO: Add method for setting time_interval by keyword argument from ['1h', '2h'...-> '?h'; '15min'...->'?min']
-        self.TIME_INTERVAL = 1
-        self.NUMBER_OF_HOURS_AHEAD = 3
+        # Timestep length in hours (0.25) or as '15min', '1h'; see TimeGrid
+        self.time_grid = TimeGrid(time_interval)
+        self.TIME_INTERVAL = self.time_grid.time_interval
+        self.TOTAL_TIMESTEPS = self.time_grid.total_timesteps
+        self.NUMBER_OF_HOURS_AHEAD = number_of_hours_ahead
         self.CURRENT_PRICE_MODEL = price_model
         self.PV_SYSTEM_AVAILABLE_IN_MODEL = pv_system_available_in_model
         self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL = battery_system_available_in_model
         self.VEHICLE_TO_EVERYTHING = vehicle_to_everything
+        self.SAVE_INITIAL_VALUES = save_initial_values
         # self.BUILDING_IN_NANOGRID = building_in_nanogrid
 
-        self.charging_station = ChargingStation(self.NUMBER_OF_CHARGERS, self.TIME_INTERVAL)
+        self.charging_station = ChargingStation(self.NUMBER_OF_CHARGERS, self.TIME_INTERVAL, scenario_generator,
+                                                charger_backend)
         # self.central_management_system = CentralManagementSystem(battery_system_available_in_model,
         #                                                          building_demand, building_in_nanogrid)
         self.central_management_system = CentralManagementSystem(self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL,
                                                                  self.PV_SYSTEM_AVAILABLE_IN_MODEL,
-                                                                 self.VEHICLE_TO_EVERYTHING)
+                                                                 self.VEHICLE_TO_EVERYTHING, battery_units)
+        self.tariff_engine = TariffEngine(self.TIME_INTERVAL, historical_prices_path,
+                                          number_of_days_to_predict=self.NUMBER_OF_DAYS_TO_PREDICT)
         if self.PV_SYSTEM_AVAILABLE_IN_MODEL:
             self.pv_system_manager = PVSystemManager(self.NUMBER_OF_DAYS_TO_PREDICT, self.TIME_INTERVAL)
+        self.episode_recorder = create_episode_recorder(episode_recorder_mode, self.TOTAL_TIMESTEPS,
+                                                        self.NUMBER_OF_CHARGERS, self.TIME_INTERVAL,
+                                                        **(episode_recorder_options or {}))
+        self.step_profiler = create_step_profiler(step_profiler_mode, **(step_profiler_options or {}))
+        if scenario_bank_path:
+            self.scenario_bank = ScenarioBank(scenario_bank_path)
+            self.scenario_bank.check_compatibility(self.NUMBER_OF_CHARGERS, self.TIME_INTERVAL)
+        else:
+            self.scenario_bank = None
 
         self.timestep = None
         self.info = None
@@ -41,20 +70,37 @@ class SmartNanogridEnv(gym.Env):
         self.solar_radiation = None
         self.available_solar_energy = None
         self.energy_price = None
-        self.grid_energy_per_timestep, self.solar_energy_utilization_per_timestep = None, None
-        self.total_cost_per_timestep, self.penalty_per_timestep = None, None
-        self.battery_per_timestep, self.grid_energy_cost_per_timestep = None, None
-        self.grid_power_per_timestep = None
+        self.disturbance_observations = None
 
         self.simulated_single_day = False
 
-        amount_of_observed_variables = 1 + int(self.PV_SYSTEM_AVAILABLE_IN_MODEL)
-        number_of_observed_charger_values = 2
-
-        amount_of_charger_predictions = self.NUMBER_OF_CHARGERS * number_of_observed_charger_values
-        amount_of_states = amount_of_observed_variables + (self.NUMBER_OF_HOURS_AHEAD * amount_of_observed_variables)
-
-        self.total_amount_of_states = amount_of_states + amount_of_charger_predictions + int(self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL)
+        # Unseeded, scenarios and prices come from the streams of the scenario generator and tariff engine
+        self.random_streams = None
+        if seed is not None:
+            self.seed(seed)
+
+        self.observation_layout = ObservationLayout.create(self.NUMBER_OF_CHARGERS, self.NUMBER_OF_HOURS_AHEAD,
+                                                           self.PV_SYSTEM_AVAILABLE_IN_MODEL,
+                                                           self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL)
+        self.total_amount_of_states = self.observation_layout.size
+        self.observations = np.zeros(self.total_amount_of_states, dtype=np.float32)
+
+        number_of_battery_units = len(self.central_management_system.battery_units) \
+            if self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL else 0
+        self.state_layout = StateLayout.create(self.NUMBER_OF_CHARGERS, self.time_grid.array_columns,
+                                               number_of_battery_units,
+                                               self.NUMBER_OF_DAYS_TO_PREDICT * 2 * self.TOTAL_TIMESTEPS)
+        # The loaded scenario and its part of the state buffer, built once per scenario
+        self.scenario_state = (None, None)
+
+        # 'numpy' or 'numba' steps episodes with the pure step kernel instead of the station and management objects
+        if step_kernel_backend == 'off':
+            self.step_kernel = None
+            self.kernel_parameters = None
+        else:
+            self.step_kernel = create_step_kernel(step_kernel_backend)
+            self.kernel_parameters = create_kernel_parameters(self)
+        self.kernel_state = None
 
         spaces_low = np.array(np.zeros(self.total_amount_of_states), dtype=np.float32)
         spaces_high = np.array(np.ones(self.total_amount_of_states), dtype=np.float32)
@@ -84,6 +130,10 @@ class SmartNanogridEnv(gym.Env):
         #       charged enough based on current action, and penalize wrong future actions
 
     def step(self, actions):
+        if self.step_kernel:
+            return self.__step_with_kernel(actions)
+
+        self.step_profiler.start()
         charger_actions = actions[0:self.NUMBER_OF_CHARGERS]
 
         if self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL:
@@ -93,6 +143,7 @@ class SmartNanogridEnv(gym.Env):
         [total_charging_power, total_discharging_power] = self.charging_station.simulate_vehicle_charging(charger_actions,
                                                                                                           self.timestep,
                                                                                                           self.TIME_INTERVAL)
+        self.step_profiler.lap('step.charging')
         if self.PV_SYSTEM_AVAILABLE_IN_MODEL:
             available_solar_power = self.pv_system_manager.get_available_solar_produced_power(self.TIME_INTERVAL)
         else:
@@ -103,142 +154,311 @@ class SmartNanogridEnv(gym.Env):
                                                           self.charging_station.departing_vehicles,
                                                           self.charging_station.vehicle_state_of_charge,
                                                           battery_action, self.TIME_INTERVAL)
+        self.step_profiler.lap('step.central_management_system')
 
-        self.total_cost_per_timestep.append(results['Total cost'])
-        self.grid_power_per_timestep.append(results['Grid power'])
-        self.grid_energy_per_timestep.append(results['Grid energy'])
-        self.solar_energy_utilization_per_timestep.append(results['Utilized solar energy'])
-        self.penalty_per_timestep.append(results['Insufficiently charged vehicles penalty'])
-        self.battery_per_timestep.append(results['Battery state of charge'])
-        self.grid_energy_cost_per_timestep.append(results['Total cost'])
+        self.episode_recorder.record_step(self.timestep, results,
+                                          self.charging_station.vehicle_state_of_charge[:, self.timestep])
+        self.step_profiler.lap('step.recording')
 
-        observations = self.__get_observations()
+        observations = self.get_observations()
+        self.step_profiler.lap('step.observations')
         self.timestep = self.timestep + 1
 
         self.simulated_single_day = self.__check_is_single_day_simulated()
         if self.simulated_single_day:
             self.timestep = 0
-            self.__save_prediction_results()
+            self.__finish_episode_recording(self.charging_station.vehicle_state_of_charge)
+            self.step_profiler.lap('step.finish_episode')
 
         reward = -results['Total cost']
         self.info = {}
+        self.step_profiler.finish('step')
 
         return observations, reward, self.simulated_single_day, self.info
 
-    def __get_observations(self):
-        [departure_times, vehicles_state_of_charge] = self.charging_station.simulate(self.timestep, self.TIME_INTERVAL)
-        if self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL:
-            battery_soc = self.central_management_system.battery_system.get_state_of_charge()
-        else:
-            battery_soc = 0.0
+    def __step_with_kernel(self, actions):
+        self.step_profiler.start()
+        self.kernel_state, reward, observations = self.step_kernel.step(
+            self.kernel_state, np.asarray(actions, dtype=np.float64), self.kernel_parameters)
+        self.step_profiler.lap('step.kernel')
 
-        min_timesteps_ahead = self.timestep + 1
-        max_timesteps_ahead = min_timesteps_ahead + self.NUMBER_OF_HOURS_AHEAD
+        self.episode_recorder.record_step(self.timestep, dict(zip(STEP_RESULT_NAMES, self.kernel_state.step_results)),
+                                          self.kernel_state.vehicle_state_of_charge[:, self.timestep])
+        self.step_profiler.lap('step.recording')
+        self.timestep = self.timestep + 1
 
-        max_price = self.energy_price.max()
-        if self.PV_SYSTEM_AVAILABLE_IN_MODEL:
-            max_radiation = self.solar_radiation.max()
-            normalized_disturbances_observation_at_current_timestep = np.array([
-                self.solar_radiation[0, self.timestep] / max_radiation,
-                self.energy_price[0, self.timestep] / max_price
-            ])
-
-            normalized_predictions = np.concatenate((
-                np.array([self.solar_radiation[0, min_timesteps_ahead:max_timesteps_ahead] / max_radiation]),
-                np.array([self.energy_price[0, min_timesteps_ahead:max_timesteps_ahead] / max_price])),
-                axis=None
-            )
-        else:
-            normalized_disturbances_observation_at_current_timestep = np.array([
-                self.energy_price[0, self.timestep] / max_price
-            ])
+        self.simulated_single_day = self.__check_is_single_day_simulated()
+        if self.simulated_single_day:
+            self.timestep = 0
+            self.kernel_state = self.kernel_state._replace(timestep=0)
+            self.__finish_episode_recording(self.kernel_state.vehicle_state_of_charge)
+            self.step_profiler.lap('step.finish_episode')
 
-            normalized_predictions = np.array([self.energy_price[0, min_timesteps_ahead:max_timesteps_ahead] / max_price])
+        self.info = {}
+        self.step_profiler.finish('step')
 
-        if self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL:
-            normalized_states = np.concatenate((
-                np.array(vehicles_state_of_charge),
-                np.array(departure_times) / 24,
-                np.array(battery_soc)),
-                axis=None
-            )
-        else:
-            normalized_states = np.concatenate((
-                np.array(vehicles_state_of_charge),
-                np.array(departure_times) / 24),
-                axis=None
-            )
-
-        observations = np.concatenate((
-            normalized_disturbances_observation_at_current_timestep,
-            normalized_predictions,
-            normalized_states),
-            axis=None, dtype=np.float32
-        )
+        return observations, reward, self.simulated_single_day, self.info
 
-        return observations
+    def get_observations(self):
+        # Observation of the current timestep from the station and management objects, as step returns it without a
+        # step kernel
+        [departure_times, vehicles_state_of_charge] = self.charging_station.simulate(self.timestep, self.TIME_INTERVAL)
+        layout = self.observation_layout
+
+        self.observations[layout.disturbances] = self.disturbance_observations[self.timestep]
+        self.observations[layout.vehicle_state_of_charge] = vehicles_state_of_charge
+        self.observations[layout.departure_times] = departure_times * self.TIME_INTERVAL
+        self.observations[layout.departure_times] /= 24
+        if self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL:
+            self.observations[layout.battery_state_of_charge] = \
+                self.central_management_system.battery_system.get_state_of_charge()
+
+        return self.observations.copy()
+
+    def calculate_disturbance_observations(self, energy_price, solar_radiation=None):
+        # One row per timestep holding the normalized radiation and price at that timestep followed by their values
+        # 1 to NUMBER_OF_HOURS_AHEAD hours later (timesteps, for timesteps longer than an hour), so an observation
+        # copies a single row whatever the lookahead and resolution. Lookaheads past the end of the loaded data wrap
+        # around to its start.
+        total_timesteps = self.TOTAL_TIMESTEPS
+        stride = self.time_grid.timesteps_per_hour
+        disturbances = [energy_price / energy_price.max()]
+        if solar_radiation is not None:
+            disturbances.insert(0, solar_radiation / solar_radiation.max())
+        disturbances = [np.resize(values, total_timesteps + self.NUMBER_OF_HOURS_AHEAD * stride).astype(np.float32)
+                        for values in disturbances]
+
+        prediction_timesteps = np.arange(total_timesteps)[:, np.newaxis] + \
+            stride * np.arange(1, self.NUMBER_OF_HOURS_AHEAD + 1)
+        current_values = [values[:total_timesteps, np.newaxis] for values in disturbances]
+        predicted_values = [values[prediction_timesteps] for values in disturbances]
+        return np.concatenate(current_values + predicted_values, axis=1)
 
     def __check_is_single_day_simulated(self):
-        if self.timestep == (24 / self.TIME_INTERVAL):
+        if self.timestep == self.TOTAL_TIMESTEPS:
             return True
         else:
             return False
 
-    def __save_prediction_results(self):
+    def __finish_episode_recording(self, vehicle_state_of_charge):
         if self.PV_SYSTEM_AVAILABLE_IN_MODEL:
             available_solar_energy = self.available_solar_energy
         else:
             available_solar_energy = []
 
-        prediction_results = {
-            'SOC': self.charging_station.vehicle_state_of_charge,
-            'Grid_power': self.grid_power_per_timestep,
-            'Grid_energy': self.grid_energy_per_timestep,
-            'Utilized_solar_energy': self.solar_energy_utilization_per_timestep,
-            'Penalties': self.penalty_per_timestep,
-            'Available_solar_energy': available_solar_energy,
-            'Total_cost': self.total_cost_per_timestep,
-            'Battery_state_of_charge': self.battery_per_timestep,
-            'Grid_energy_cost': self.grid_energy_cost_per_timestep
-        }
-        savemat(data_files_directory_path + '\\prediction_results.mat', {'Prediction_results': prediction_results})
-
-    def reset(self, generate_new_initial_values=True):
+        self.episode_recorder.finish_episode(vehicle_state_of_charge, available_solar_energy)
+
+    def reset(self, generate_new_initial_values=True, scenario=None, scenario_index=None, episode=None):
+        # episode restarts a seeded environment at that episode, e.g. to evaluate episodes split across processes
+        if scenario_index is not None and scenario is None and self.scenario_bank is None:
+            raise ValueError("reset(scenario_index=...) draws from the scenario bank, create the environment with a "
+                             "scenario_bank_path to use it.")
+        if episode is not None and self.random_streams is None:
+            raise ValueError("reset(episode=...) restarts the episodes of a seed, create or seed the environment "
+                             "with a seed to use it.")
+        self.step_profiler.start()
+        episode = self.random_streams.start_episode(episode) if self.random_streams else None
         self.timestep = 0
         self.simulated_single_day = False
-        self.total_cost_per_timestep = []
-        self.grid_power_per_timestep = []
-        self.grid_energy_per_timestep = []
-        self.solar_energy_utilization_per_timestep = []
-        self.penalty_per_timestep = []
-        self.battery_per_timestep = []
-        self.grid_energy_cost_per_timestep = []
+        self.episode_recorder.start_episode()
+        self.step_profiler.lap('reset.recording')
 
+        if self.tariff_engine.varies_per_episode(self.CURRENT_PRICE_MODEL):
+            price_generator = self.__get_episode_generator(episode, RandomStreams.PRICES)
+        else:
+            price_generator = None
+        self.__load_energy_price(self.tariff_engine.get_energy_price(self.CURRENT_PRICE_MODEL,
+                                                                     self.NUMBER_OF_DAYS_TO_PREDICT,
+                                                                     random_generator=price_generator))
+        self.step_profiler.lap('reset.prices')
+        self.central_management_system.reset_battery_system()
+        self.episode_recorder.set_initial_battery_state_of_charge(self.__get_battery_state_of_charge())
+        self.__load_initial_simulation_values(generate_new_initial_values, scenario, scenario_index, episode)
+        self.step_profiler.lap('reset.scenario')
+
+        if self.step_kernel:
+            observations = self.__reset_kernel_state()
+        else:
+            observations = self.get_observations()
+        self.step_profiler.lap('reset.observations')
+        self.step_profiler.finish('reset')
+        return observations
+
+    def __load_energy_price(self, energy_price):
         if self.PV_SYSTEM_AVAILABLE_IN_MODEL:
             self.solar_radiation = self.pv_system_manager.get_solar_radiation()
             self.available_solar_energy = self.pv_system_manager.get_available_solar_energy()
 
-        self.energy_price = self.central_management_system.get_energy_price(self.CURRENT_PRICE_MODEL,
-                                                                            self.NUMBER_OF_DAYS_TO_PREDICT,
-                                                                            self.TIME_INTERVAL)
-        self.__load_initial_simulation_values(generate_new_initial_values)
-
-        return self.__get_observations()
+        self.energy_price = energy_price
+        if self.PV_SYSTEM_AVAILABLE_IN_MODEL:
+            self.disturbance_observations = self.calculate_disturbance_observations(self.energy_price[0],
+                                                                                    self.solar_radiation[0])
+        else:
+            self.disturbance_observations = self.calculate_disturbance_observations(self.energy_price[0])
 
-    def __load_initial_simulation_values(self, generate_new_initial_values):
-        if generate_new_initial_values:
-            self.charging_station.generate_new_initial_values(self.TIME_INTERVAL)
+    def __get_battery_state_of_charge(self):
+        if self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL:
+            return self.central_management_system.battery_system.get_state_of_charge()
+        return 0.0
+
+    def __reset_kernel_state(self):
+        self.kernel_state = create_kernel_state(self.charging_station, self.__get_battery_state_of_charge(),
+                                                self.energy_price[0], self.disturbance_observations)
+        return self.step_kernel.observe(self.kernel_state, self.kernel_parameters)
+
+    def __get_episode_generator(self, episode, stream):
+        if self.random_streams is None:
+            return None
+        return self.random_streams.get_generator(episode, stream)
+
+    def __load_initial_simulation_values(self, generate_new_initial_values, scenario, scenario_index, episode):
+        if scenario is not None:
+            self.charging_station.load_scenario(scenario)
+        elif scenario_index is not None or (generate_new_initial_values and self.scenario_bank):
+            scenario_index_seed = self.random_streams.get_seed(episode, RandomStreams.SCENARIO_INDEX) \
+                if self.random_streams else None
+            self.charging_station.draw_scenario_from_bank(self.scenario_bank, scenario_index, scenario_index_seed)
+        elif generate_new_initial_values:
+            self.charging_station.generate_new_initial_values(
+                self.__get_episode_generator(episode, RandomStreams.SCENARIO))
+            if self.SAVE_INITIAL_VALUES:
+                self.charging_station.save_initial_values()
+        elif self.charging_station.scenario is not None:
+            self.charging_station.load_scenario(self.charging_station.scenario)
         else:
             self.charging_station.load_initial_values()
 
+    def get_scenario(self):
+        return self.charging_station.scenario
+
+    def get_state(self):
+        # Everything a step depends on as one flat float64 buffer laid out by state_layout: timestep, states of
+        # charge, scenario, prices and the generator states. get_state().tobytes() serialises it. Episode recordings
+        # are not part of the state, and neither is the global numpy state unseeded scenario bank draws use.
+        if self.timestep is None:
+            raise Exception("The environment has no state before its first reset.")
+        layout = self.state_layout
+        state = np.empty(layout.size)
+
+        if self.step_kernel:
+            vehicle_state_of_charge = self.kernel_state.vehicle_state_of_charge
+            battery_state_of_charge = [self.kernel_state.battery_state_of_charge] \
+                if self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL else []
+        else:
+            vehicle_state_of_charge = self.charging_station.vehicle_state_of_charge
+            battery_state_of_charge = self.__get_battery_state_of_charge_values()
+        battery_state_of_charge_type = get_value_type_index(battery_state_of_charge[0]) \
+            if len(battery_state_of_charge) == 1 else 0
+
+        state[layout.header] = (STATE_FORMAT_VERSION, layout.size, self.timestep, self.simulated_single_day,
+                                self.random_streams.episode if self.random_streams else -1,
+                                battery_state_of_charge_type,
+                                VALUE_TYPES.index(self.charging_station.scenario.vehicle_state_of_charge.dtype.type))
+        generator_states = state[layout.generator_states].view(np.uint64)
+        generator_states[:] = np.concatenate([
+            get_generator_state(self.charging_station.scenario_generator.random_generator),
+            get_generator_state(self.tariff_engine.random_generator)
+        ])
+        state[layout.battery_state_of_charge] = battery_state_of_charge
+        state[layout.energy_price] = self.energy_price.ravel()
+        state[layout.vehicle_state_of_charge] = vehicle_state_of_charge.ravel()
+        state[layout.scenario] = self.__get_scenario_state()
+        return state
+
+    def set_state(self, state):
+        # Restores a buffer of get_state, or its bytes, into an environment of the same configuration. Loading the
+        # scenario and prices is skipped when the buffer holds those already loaded, so restoring within an episode
+        # (look-ahead, tree search, MPC rollouts) only copies a few arrays.
+        if isinstance(state, (bytes, bytearray, memoryview)):
+            state = np.frombuffer(state, dtype=np.float64)
+        layout = self.state_layout
+        if state.shape != (layout.size,) or state[0] != STATE_FORMAT_VERSION or state[1] != layout.size:
+            raise Exception(f"The state buffer does not match this environment, it holds {state.size} values but "
+                            f"{layout.size} of format version {STATE_FORMAT_VERSION} were expected.")
+        _, _, timestep, simulated_single_day, episode, battery_state_of_charge_type, vehicle_state_of_charge_type = \
+            state[layout.header]
+
+        scenario_state = state[layout.scenario]
+        scenario_changed = self.charging_station.scenario is None or \
+            not np.array_equal(self.__get_scenario_state(), scenario_state)
+        if scenario_changed:
+            self.charging_station.load_scenario(
+                self.__create_scenario(scenario_state, VALUE_TYPES[int(vehicle_state_of_charge_type)]))
+            self.scenario_state = (self.charging_station.scenario, scenario_state.copy())
+
+        energy_price = state[layout.energy_price]
+        prices_changed = self.energy_price is None or not np.array_equal(self.energy_price.ravel(), energy_price)
+        if prices_changed:
+            self.__load_energy_price(energy_price.reshape(self.NUMBER_OF_DAYS_TO_PREDICT, -1).copy())
+
+        self.timestep = int(timestep)
+        self.simulated_single_day = bool(simulated_single_day)
+        if self.random_streams and episode >= 0:
+            self.random_streams.episode = int(episode)
+        generator_states = state[layout.generator_states].view(np.uint64)
+        set_generator_state(self.charging_station.scenario_generator.random_generator,
+                            generator_states[:GENERATOR_STATE_WORDS])
+        set_generator_state(self.tariff_engine.random_generator, generator_states[GENERATOR_STATE_WORDS:])
+
+        vehicle_state_of_charge = state[layout.vehicle_state_of_charge].reshape(self.NUMBER_OF_CHARGERS, -1)
+        battery_state_of_charge = state[layout.battery_state_of_charge]
+        if self.step_kernel:
+            if scenario_changed or prices_changed or self.kernel_state is None:
+                self.kernel_state = create_kernel_state(self.charging_station, 0.0, self.energy_price[0],
+                                                        self.disturbance_observations)
+            self.kernel_state = self.kernel_state._replace(
+                timestep=self.timestep, vehicle_state_of_charge=vehicle_state_of_charge.copy(),
+                battery_state_of_charge=float(battery_state_of_charge[0]) if battery_state_of_charge.size else 0.0)
+        else:
+            np.copyto(self.charging_station.vehicle_state_of_charge, vehicle_state_of_charge)
+            self.__set_battery_state_of_charge_values(battery_state_of_charge, int(battery_state_of_charge_type))
+            # Departing vehicles of the previous timestep, which the next step charges its penalty for
+            self.charging_station.simulate(max(self.timestep - 1, 0), self.TIME_INTERVAL)
+
+    def __get_battery_state_of_charge_values(self):
+        battery_system = self.central_management_system.battery_system
+        if battery_system is None:
+            return []
+        if isinstance(battery_system, BatteryBank):
+            return battery_system.state_of_charge
+        return [battery_system.current_capacity]
+
+    def __set_battery_state_of_charge_values(self, battery_state_of_charge, battery_state_of_charge_type):
+        battery_system = self.central_management_system.battery_system
+        if battery_system is None:
+            return
+        if isinstance(battery_system, BatteryBank):
+            battery_system.state_of_charge[:] = battery_state_of_charge
+        else:
+            battery_system.current_capacity = VALUE_TYPES[battery_state_of_charge_type](battery_state_of_charge[0])
+
+    def __get_scenario_state(self):
+        scenario, scenario_state = self.scenario_state
+        if scenario is not self.charging_station.scenario:
+            scenario_batch = ScenarioBatch.from_scenarios([self.charging_station.scenario])
+            scenario_state = np.concatenate([scenario_batch.vehicle_arrivals.ravel(),
+                                             scenario_batch.vehicle_departures.ravel(),
+                                             scenario_batch.vehicle_state_of_charge.ravel(),
+                                             scenario_batch.charger_occupancy.ravel()]).astype(np.float64)
+            self.scenario_state = (self.charging_station.scenario, scenario_state)
+        return scenario_state
+
+    def __create_scenario(self, scenario_state, vehicle_state_of_charge_type):
+        vehicle_arrivals, vehicle_departures, vehicle_state_of_charge, charger_occupancy = \
+            scenario_state.reshape(4, 1, self.NUMBER_OF_CHARGERS, -1)
+        return ScenarioBatch(vehicle_arrivals=vehicle_arrivals.astype(bool),
+                             vehicle_departures=vehicle_departures.astype(int),
+                             vehicle_state_of_charge=vehicle_state_of_charge.astype(vehicle_state_of_charge_type),
+                             charger_occupancy=charger_occupancy.astype(bool)).get_scenario(0)
+
     def render(self, mode="human"):
         pass
 
     def seed(self, seed=None):
-        # self.np_random, seed = seeding.np_random(seed)
-        # return [seed]
-        pass
+        # An int or a numpy SeedSequence, see RandomStreams. Environment j of several seeded with
+        # SeedSequence(seed, spawn_key=(j,)) runs the same episodes as slot j of a vector environment seeded with seed.
+        self.random_streams = RandomStreams(seed)
+        return [self.random_streams.seed_sequence.entropy]
 
     def close(self):
-        # return 0
-        pass
+        self.episode_recorder.close()
@@ -0,0 +1,321 @@
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+
+from smart_nanogrid_gym.envs.smart_nanogrid_environment import SmartNanogridEnv
+from smart_nanogrid_gym.utils.battery_bank import BatteryBank
+from smart_nanogrid_gym.utils.random_streams import RandomStreams
+from smart_nanogrid_gym.utils.scenario import ScenarioBatch
+from smart_nanogrid_gym.utils.step_profiler import create_step_profiler
+
+
+class VectorSmartNanogridEnv(VecEnv):
+    # Steps NUMBER_OF_ENVIRONMENTS independent nanogrid days at once. Every per-charger quantity is held in
+    # (environments, chargers, timesteps) arrays and advanced with one array operation per step, following the
+    # same rules as Charger, ChargingStation, BatteryBank and CentralManagementSystem.
+    def __init__(self, number_of_environments, price_model=0, pv_system_available_in_model=True,
+                 battery_system_available_in_model=True, vehicle_to_everything=False, scenario_bank_path=None,
+                 scenario_generator=None, number_of_hours_ahead=3, number_of_chargers=8, time_interval=1,
+                 historical_prices_path=None, step_profiler_mode='off', step_profiler_options=None,
+                 battery_units=None, seed=None):
+        self.single_environment = SmartNanogridEnv(price_model, pv_system_available_in_model,
+                                                   battery_system_available_in_model, vehicle_to_everything,
+                                                   scenario_bank_path=scenario_bank_path,
+                                                   scenario_generator=scenario_generator,
+                                                   number_of_hours_ahead=number_of_hours_ahead,
+                                                   number_of_chargers=number_of_chargers,
+                                                   time_interval=time_interval,
+                                                   historical_prices_path=historical_prices_path,
+                                                   battery_units=battery_units)
+        self.scenario_bank = self.single_environment.scenario_bank
+        self.scenario_generator = self.single_environment.charging_station.scenario_generator
+        self.NUMBER_OF_ENVIRONMENTS = number_of_environments
+        self.NUMBER_OF_CHARGERS = self.single_environment.NUMBER_OF_CHARGERS
+        self.NUMBER_OF_DAYS_TO_PREDICT = self.single_environment.NUMBER_OF_DAYS_TO_PREDICT
+        self.TIME_INTERVAL = self.single_environment.TIME_INTERVAL
+        self.NUMBER_OF_HOURS_AHEAD = self.single_environment.NUMBER_OF_HOURS_AHEAD
+        self.CURRENT_PRICE_MODEL = price_model
+        self.PV_SYSTEM_AVAILABLE_IN_MODEL = pv_system_available_in_model
+        self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL = battery_system_available_in_model
+        self.VEHICLE_TO_EVERYTHING = vehicle_to_everything
+        self.TOTAL_TIMESTEPS = self.single_environment.TOTAL_TIMESTEPS
+
+        electric_vehicle = self.single_environment.charging_station.electric_vehicle_info
+        self.vehicle_battery_capacity = electric_vehicle.battery_capacity
+        self.vehicle_max_charging_power = electric_vehicle.max_charging_power
+        self.vehicle_max_discharging_power = electric_vehicle.max_discharging_power
+
+        # One bank of battery units per environment
+        if self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL:
+            self.battery_bank = BatteryBank(self.single_environment.central_management_system.create_battery_systems(),
+                                            number_of_banks=self.NUMBER_OF_ENVIRONMENTS)
+        else:
+            self.battery_bank = None
+
+        self.tariff_engine = self.single_environment.tariff_engine
+        energy_price = self.tariff_engine.get_energy_price(self.CURRENT_PRICE_MODEL, self.NUMBER_OF_DAYS_TO_PREDICT)
+        self.day_energy_price = energy_price[0, :]
+
+        if self.PV_SYSTEM_AVAILABLE_IN_MODEL:
+            pv_system_manager = self.single_environment.pv_system_manager
+            self.solar_radiation = pv_system_manager.get_solar_radiation()[0, :]
+            self.available_solar_power = pv_system_manager.get_available_solar_produced_power(self.TIME_INTERVAL)[0, :]
+        else:
+            self.solar_radiation = None
+            self.available_solar_power = np.zeros(self.day_energy_price.shape)
+        # One disturbance table per environment, as price models 5 and 6 give every episode its own prices
+        disturbance_observations = self.single_environment.calculate_disturbance_observations(
+            self.day_energy_price, self.solar_radiation)
+        self.disturbance_observations = np.repeat(disturbance_observations[np.newaxis], self.NUMBER_OF_ENVIRONMENTS,
+                                                  axis=0)
+
+        array_columns = self.single_environment.time_grid.array_columns
+        charger_arrays_shape = (self.NUMBER_OF_ENVIRONMENTS, self.NUMBER_OF_CHARGERS, array_columns)
+        self.vehicle_state_of_charge = np.zeros(charger_arrays_shape)
+        self.charger_occupancy = np.zeros(charger_arrays_shape, dtype=bool)
+        self.vehicle_arrivals = np.zeros(charger_arrays_shape, dtype=bool)
+        self.vehicle_departures = np.zeros(charger_arrays_shape, dtype=int)
+        self.arrival_state_of_charge = np.zeros(charger_arrays_shape)
+        self.time_until_departure = np.zeros(charger_arrays_shape)
+        self.departing_vehicles = np.zeros((self.NUMBER_OF_ENVIRONMENTS, self.NUMBER_OF_CHARGERS), dtype=bool)
+        self.energy_price = np.zeros((self.NUMBER_OF_ENVIRONMENTS, self.day_energy_price.shape[0]))
+        self.timestep = np.zeros(self.NUMBER_OF_ENVIRONMENTS, dtype=int)
+        self.total_cost = np.zeros(self.NUMBER_OF_ENVIRONMENTS)
+
+        self.environment_indices = np.arange(self.NUMBER_OF_ENVIRONMENTS)
+        self.observation_layout = self.single_environment.observation_layout
+        self.observations = np.zeros((self.NUMBER_OF_ENVIRONMENTS, self.observation_layout.size), dtype=np.float32)
+        self.actions = None
+        self.step_profiler = create_step_profiler(step_profiler_mode, **(step_profiler_options or {}))
+
+        # One set of RandomStreams per environment once seeded, otherwise all environments share the streams of the
+        # scenario generator and tariff engine
+        self.environment_random_streams = None
+        if seed is not None:
+            self.seed(seed)
+
+        super().__init__(self.NUMBER_OF_ENVIRONMENTS, self.single_environment.observation_space,
+                         self.single_environment.action_space)
+
+    def reset(self, scenarios=None):
+        self.step_profiler.start()
+        self.reset_environments(self.environment_indices, scenarios)
+        self.step_profiler.lap('reset.scenario')
+        observations = self.get_observations(self.environment_indices)
+        self.step_profiler.lap('reset.observations')
+        self.step_profiler.finish('reset')
+        return observations
+
+    def reset_environments(self, environment_indices, scenarios=None):
+        episode_streams = self.start_episodes(environment_indices)
+        if scenarios is not None:
+            scenario_batch = ScenarioBatch.from_scenarios(scenarios)
+        elif self.scenario_bank:
+            scenario_batch = ScenarioBatch.from_scenarios([
+                self.scenario_bank.get_scenario(self.scenario_bank.draw_random_scenario_index(scenario_index_seed))
+                for scenario_index_seed in self.get_episode_seeds(episode_streams, RandomStreams.SCENARIO_INDEX)
+            ])
+        else:
+            random_generators = [np.random.default_rng(scenario_seed) for scenario_seed
+                                 in self.get_episode_seeds(episode_streams, RandomStreams.SCENARIO)] \
+                if self.environment_random_streams else None
+            scenario_batch = self.scenario_generator.generate_scenario_batch(len(environment_indices),
+                                                                             random_generators)
+
+        self.load_scenario_batch(environment_indices, scenario_batch)
+        if self.tariff_engine.varies_per_episode(self.CURRENT_PRICE_MODEL):
+            self.load_episode_prices(environment_indices,
+                                     self.get_episode_seeds(episode_streams, RandomStreams.PRICES))
+        else:
+            self.energy_price[environment_indices] = self.day_energy_price
+        if self.battery_bank:
+            self.battery_bank.reset(environment_indices)
+        self.timestep[environment_indices] = 0
+
+    def start_episodes(self, environment_indices):
+        # The streams and episode number of every environment that starts an episode, None for both unseeded
+        if self.environment_random_streams is None:
+            return [(None, None)] * len(environment_indices)
+        return [(self.environment_random_streams[environment_index],
+                 self.environment_random_streams[environment_index].start_episode())
+                for environment_index in environment_indices]
+
+    @staticmethod
+    def get_episode_seeds(episode_streams, stream):
+        return [random_streams.get_seed(episode, stream) if random_streams else None
+                for random_streams, episode in episode_streams]
+
+    def load_episode_prices(self, environment_indices, price_seeds):
+        for environment_index, price_seed in zip(environment_indices, price_seeds):
+            price_generator = np.random.default_rng(price_seed) if price_seed is not None else None
+            day_energy_price = self.tariff_engine.get_energy_price(self.CURRENT_PRICE_MODEL,
+                                                                   self.NUMBER_OF_DAYS_TO_PREDICT,
+                                                                   random_generator=price_generator)[0, :]
+            self.energy_price[environment_index] = day_energy_price
+            self.disturbance_observations[environment_index] = \
+                self.single_environment.calculate_disturbance_observations(day_energy_price, self.solar_radiation)
+
+    def load_scenario_batch(self, environment_indices, scenario_batch):
+        self.vehicle_arrivals[environment_indices] = scenario_batch.vehicle_arrivals
+        self.vehicle_departures[environment_indices] = scenario_batch.vehicle_departures
+        self.arrival_state_of_charge[environment_indices] = scenario_batch.vehicle_state_of_charge
+        self.vehicle_state_of_charge[environment_indices] = scenario_batch.vehicle_state_of_charge
+        self.charger_occupancy[environment_indices] = scenario_batch.charger_occupancy
+
+        # Sessions never overlap, so the running maximum of departures is the departure of the vehicle present
+        current_departure = np.maximum.accumulate(scenario_batch.vehicle_departures, axis=2)
+        self.time_until_departure[environment_indices] = \
+            (current_departure - np.arange(current_departure.shape[2])) * scenario_batch.charger_occupancy
+
+    def get_scenario(self, environment_index):
+        return ScenarioBatch(vehicle_arrivals=self.vehicle_arrivals[[environment_index]],
+                             vehicle_departures=self.vehicle_departures[[environment_index]],
+                             vehicle_state_of_charge=self.arrival_state_of_charge[[environment_index]],
+                             charger_occupancy=self.charger_occupancy[[environment_index]]).get_scenario(0)
+
+    def step_async(self, actions):
+        self.actions = np.asarray(actions, dtype=np.float64).reshape(self.NUMBER_OF_ENVIRONMENTS, -1)
+
+    def step_wait(self):
+        self.step_profiler.start()
+        charger_actions = self.actions[:, 0:self.NUMBER_OF_CHARGERS]
+        if self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL:
+            battery_actions = self.actions[:, -1]
+        else:
+            battery_actions = np.zeros(self.NUMBER_OF_ENVIRONMENTS)
+
+        total_charging_power, total_discharging_power = self.simulate_vehicle_charging(charger_actions)
+        self.step_profiler.lap('step.charging')
+        self.simulate_central_management_system(total_charging_power, total_discharging_power, battery_actions)
+        self.step_profiler.lap('step.central_management_system')
+        rewards = -self.total_cost
+
+        observations = self.get_observations(self.environment_indices)
+        self.step_profiler.lap('step.observations')
+        self.timestep += 1
+
+        dones = self.timestep == self.TOTAL_TIMESTEPS
+        infos = [{} for _ in range(self.NUMBER_OF_ENVIRONMENTS)]
+        finished_environments = np.flatnonzero(dones)
+        if finished_environments.size > 0:
+            for environment_index in finished_environments:
+                infos[environment_index]['terminal_observation'] = observations[environment_index].copy()
+            self.reset_environments(finished_environments)
+            observations[finished_environments] = self.get_observations(finished_environments)
+            self.step_profiler.lap('step.reset_finished_environments')
+
+        self.step_profiler.finish('step')
+        return observations, rewards.astype(np.float32), dones, infos
+
+    def simulate_vehicle_charging(self, charger_actions):
+        timestep = self.timestep
+        rows = self.environment_indices
+        occupied = self.charger_occupancy[rows, :, timestep]
+        arrived = self.vehicle_arrivals[rows, :, timestep]
+        previous_state_of_charge = np.where(arrived, self.vehicle_state_of_charge[rows, :, timestep],
+                                            self.vehicle_state_of_charge[rows, :, timestep - 1])
+
+        max_charging_power = np.minimum(
+            self.vehicle_max_charging_power,
+            (1 - previous_state_of_charge) * self.vehicle_battery_capacity / self.TIME_INTERVAL
+        )
+        max_discharging_power = np.minimum(
+            self.vehicle_max_discharging_power,
+            previous_state_of_charge * self.vehicle_battery_capacity / self.TIME_INTERVAL
+        )
+        max_power = np.where(charger_actions >= 0, max_charging_power, max_discharging_power)
+        charger_power_values = np.where(occupied, charger_actions * max_power, 0.0)
+
+        next_state_of_charge = previous_state_of_charge + \
+            (charger_power_values * self.TIME_INTERVAL) / self.vehicle_battery_capacity
+        self.vehicle_state_of_charge[rows, :, timestep] = np.where(occupied, next_state_of_charge,
+                                                                   self.vehicle_state_of_charge[rows, :, timestep])
+
+        total_charging_power = np.where(charger_power_values > 0, charger_power_values, 0.0).sum(axis=1)
+        total_discharging_power = np.where(charger_power_values < 0, charger_power_values, 0.0).sum(axis=1)
+        return total_charging_power, total_discharging_power
+
+    def simulate_central_management_system(self, total_charging_power, total_discharging_power, battery_actions):
+        timestep = self.timestep
+        rows = self.environment_indices
+        available_solar_power = self.available_solar_power[timestep]
+
+        total_power = total_charging_power + total_discharging_power
+        remaining_power_demand = total_power - available_solar_power
+        power_demanded = remaining_power_demand > 0
+        power_surplus = remaining_power_demand < 0
+        available_power = available_solar_power - total_power
+
+        battery_penalty = np.zeros(self.NUMBER_OF_ENVIRONMENTS)
+        if self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL:
+            battery_active = battery_actions != 0
+            remaining_power_demand, discharging_penalty = self.battery_bank.discharge(
+                remaining_power_demand, battery_actions, self.TIME_INTERVAL, power_demanded & battery_active)
+            available_power, charging_penalty = self.battery_bank.charge(
+                available_power, battery_actions, self.TIME_INTERVAL, power_surplus & battery_active)
+            battery_penalty = discharging_penalty + charging_penalty
+
+        grid_power = np.where(power_demanded, remaining_power_demand, 0.0)
+        if self.VEHICLE_TO_EVERYTHING:
+            grid_power = np.where(power_surplus, -available_power, grid_power)
+
+        grid_energy = grid_power * self.TIME_INTERVAL
+        grid_energy_cost = grid_energy * self.energy_price[rows, timestep]
+
+        uncharged_capacity = 1 - self.vehicle_state_of_charge[rows, :, timestep - 1]
+        insufficiently_charged_vehicles_penalty = np.where(self.departing_vehicles, (uncharged_capacity * 2) ** 2,
+                                                           0.0).sum(axis=1)
+
+        self.total_cost = grid_energy_cost + insufficiently_charged_vehicles_penalty + battery_penalty
+
+    def get_observations(self, environment_indices):
+        timestep = self.timestep[environment_indices]
+        occupied = self.charger_occupancy[environment_indices, :, timestep]
+        departure_times = self.time_until_departure[environment_indices, :, timestep]
+        self.departing_vehicles[environment_indices] = occupied & (departure_times == 1)
+
+        layout = self.observation_layout
+        observations = self.observations
+        observations[environment_indices, layout.disturbances] = \
+            self.disturbance_observations[environment_indices, timestep]
+        observations[environment_indices, layout.vehicle_state_of_charge] = \
+            self.vehicle_state_of_charge[environment_indices, :, timestep]
+        observations[environment_indices, layout.departure_times] = \
+            departure_times * self.TIME_INTERVAL / 24
+        if self.BATTERY_SYSTEM_AVAILABLE_IN_MODEL:
+            observations[environment_indices, layout.battery_state_of_charge] = \
+                self.battery_bank.get_state_of_charge()[environment_indices, np.newaxis]
+
+        return observations[environment_indices]
+
+    def close(self):
+        pass
+
+    def seed(self, seed=None):
+        # Environment j runs the episodes of a SmartNanogridEnv seeded with SeedSequence(seed, spawn_key=(j,))
+        random_streams = RandomStreams(seed)
+        self.environment_random_streams = random_streams.spawn(self.NUMBER_OF_ENVIRONMENTS)
+        return [environment_random_streams.seed_sequence for environment_random_streams
+                in self.environment_random_streams]
+
+    def get_all_indices(self, indices):
+        # Every environment is a row of the same arrays and attributes, so attribute calls act on all of them at once
+        # and calls meant for some of the environments only are refused rather than applied to every one
+        indices = list(self._get_indices(indices))
+        if sorted(indices) != list(range(self.NUMBER_OF_ENVIRONMENTS)):
+            raise Exception("The environments of a VectorSmartNanogridEnv share their attributes, attribute calls "
+                            "can only be made for all of them (indices=None).")
+        return indices
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name) for _ in self.get_all_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        self.get_all_indices(indices)
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return [getattr(self.single_environment, method_name)(*method_args, **method_kwargs)
+                for _ in self.get_all_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
@@ -0,0 +1,72 @@
+import numpy as np
+
+# Every model turns uniform random draws on [0, 1) into its own quantity, so ScenarioGenerator can draw the random
+# numbers for all days, chargers and timesteps in one call and hand each model the slice it needs.
+
+
+class BernoulliArrivalModel:
+    # Every free charger sees a new vehicle with the same probability at every timestep. The default 0.4 matches
+    # the original round(random.rand() - 0.1) arrival rule.
+    def __init__(self, arrival_probability=0.4):
+        self.arrival_probability = arrival_probability
+
+    def calculate_arrivals(self, uniform_draws, timestep, time_interval):
+        return uniform_draws < self.arrival_probability
+
+
+class TimeOfDayPoissonArrivalModel:
+    # Vehicles arrive at each charger as a Poisson process whose rate (vehicles per hour) changes every hour of the
+    # day, so a free charger sees at least one arrival within a timestep with probability 1 - exp(-rate * interval).
+    def __init__(self, hourly_arrival_rates):
+        self.hourly_arrival_rates = np.asarray(hourly_arrival_rates, dtype=float)
+        if self.hourly_arrival_rates.shape != (24,):
+            raise Exception("TimeOfDayPoissonArrivalModel needs one arrival rate per hour of the day.")
+
+    def calculate_arrivals(self, uniform_draws, timestep, time_interval):
+        hour_of_day = int(timestep * time_interval) % 24
+        arrival_probability = 1 - np.exp(-self.hourly_arrival_rates[hour_of_day] * time_interval)
+        return uniform_draws < arrival_probability
+
+
+class UniformDwellTimeModel:
+    # Departures drawn uniformly between minimum_hours and maximum_hours after arrival and no later than one hour
+    # past the end of the day, as in the original generator. Late arrivals that cannot stay minimum_hours before
+    # that limit keep exactly minimum_hours.
+    def __init__(self, minimum_hours=4, maximum_hours=10):
+        self.minimum_hours = minimum_hours
+        self.maximum_hours = maximum_hours
+
+    def calculate_departures(self, uniform_draws, arrival_timestep, total_timesteps, time_interval):
+        low = arrival_timestep + int(self.minimum_hours / time_interval)
+        high = min(arrival_timestep + int(self.maximum_hours / time_interval), total_timesteps + int(1 / time_interval))
+        if low >= high:
+            return np.full(uniform_draws.shape, low)
+        return low + (uniform_draws * (high - low)).astype(int)
+
+
+class EmpiricalDwellTimeModel:
+    # Dwell times sampled from an observed distribution, given as dwell durations in hours and their relative
+    # frequencies. Every vehicle stays at least one timestep.
+    def __init__(self, dwell_hours, frequencies=None):
+        self.dwell_hours = np.asarray(dwell_hours, dtype=float)
+        if frequencies is None:
+            frequencies = np.ones(self.dwell_hours.shape)
+        frequencies = np.asarray(frequencies, dtype=float)
+        self.cumulative_probabilities = np.cumsum(frequencies) / frequencies.sum()
+
+    def calculate_departures(self, uniform_draws, arrival_timestep, total_timesteps, time_interval):
+        samples = np.minimum(np.searchsorted(self.cumulative_probabilities, uniform_draws, side='right'),
+                             len(self.dwell_hours) - 1)
+        dwell_timesteps = np.maximum(np.round(self.dwell_hours / time_interval).astype(int), 1)
+        return arrival_timestep + dwell_timesteps[samples]
+
+
+class UniformStateOfChargeModel:
+    # Arrival state of charge in whole percent between minimum_percentage and maximum_percentage (exclusive).
+    def __init__(self, minimum_percentage=10, maximum_percentage=90):
+        self.minimum_percentage = minimum_percentage
+        self.maximum_percentage = maximum_percentage
+
+    def calculate_state_of_charge(self, uniform_draws):
+        percentage_range = self.maximum_percentage - self.minimum_percentage
+        return (self.minimum_percentage + (uniform_draws * percentage_range).astype(int)) / 100
@@ -0,0 +1,103 @@
+import numpy as np
+
+
+class BatteryBank:
+    # Storage units of one or more banks as (banks, units) arrays, all charged or discharged in one vectorised call.
+    # A bank is the set of units behind one battery action: the units of a site, for every environment of a vector
+    # environment or every site of a multi-site environment. Without number_of_banks the arrays are (units,) and
+    # power, action and results are scalars, as for a single BatteryEnergyStorageSystem.
+    # Every unit follows the rules of BatteryEnergyStorageSystem with its own power limits, depth of discharge and
+    # efficiencies. The power a bank's action asks for is shared among its units in proportion to the power each unit
+    # can give or take, so a bank of a single unit gives the results of that unit on its own.
+    def __init__(self, battery_systems, number_of_banks=None):
+        self.number_of_units = len(battery_systems)
+        if self.number_of_units == 0:
+            raise Exception("A battery bank needs at least one battery unit.")
+        self.batch_shape = () if number_of_banks is None else (number_of_banks,)
+
+        def unit_values(attribute):
+            return np.array([getattr(battery_system, attribute) for battery_system in battery_systems], dtype=float)
+
+        self.max_capacity = unit_values('max_capacity')
+        self.initial_state_of_charge = unit_values('current_capacity')
+        self.max_charging_power = unit_values('max_charging_power')
+        self.max_discharging_power = unit_values('max_discharging_power')
+        self.charging_efficiency = unit_values('charging_efficiency')
+        self.discharging_efficiency = unit_values('discharging_efficiency')
+        self.depth_of_discharge = unit_values('depth_of_discharge')
+
+        self.state_of_charge = np.empty(self.batch_shape + (self.number_of_units,))
+        self.reset()
+
+    def reset(self, banks=Ellipsis):
+        self.state_of_charge[banks] = self.initial_state_of_charge
+
+    def get_state_of_charge(self):
+        # Stored energy over capacity of every bank, exactly the unit's state of charge for a bank of one unit
+        if self.number_of_units == 1:
+            state_of_charge = self.state_of_charge[..., 0]
+        else:
+            state_of_charge = (self.state_of_charge * self.max_capacity).sum(axis=-1) / self.max_capacity.sum()
+        return state_of_charge[()] if self.batch_shape == () else state_of_charge.copy()
+
+    def discharge(self, power_demand, battery_actions, time_interval, active=True):
+        # Covers the power demand of every active bank, returns the remaining demand and the battery penalty
+        power_demand = np.asarray(power_demand, dtype=float)
+        battery_actions = np.asarray(battery_actions, dtype=float)
+        active = np.asarray(active)
+        battery_penalty = np.where(active & (battery_actions > 0), battery_actions, 0.0)
+
+        capacity_available_to_discharge = self.state_of_charge - self.depth_of_discharge
+        power_available_for_discharge = \
+            (capacity_available_to_discharge * self.max_capacity * self.discharging_efficiency) / time_interval
+        max_discharging_power = np.where(capacity_available_to_discharge > 0,
+                                         np.minimum(self.max_discharging_power, power_available_for_discharge), 0.0)
+        discharging_power = battery_actions[..., np.newaxis] * max_discharging_power
+
+        remaining_demand = power_demand + discharging_power.sum(axis=-1)
+        demand_covered = remaining_demand < 0
+        discharging_power = np.where(demand_covered[..., np.newaxis],
+                                     (battery_actions * power_demand)[..., np.newaxis] *
+                                     self.get_power_shares(max_discharging_power),
+                                     discharging_power)
+        remaining_demand = np.where(demand_covered, 0.0, remaining_demand)
+
+        self.update_state_of_charge(discharging_power, time_interval, active)
+        return np.where(active, remaining_demand, power_demand)[()], battery_penalty[()]
+
+    def charge(self, available_power, battery_actions, time_interval, active=True):
+        # Stores the available power of every active bank, returns the power left over and the battery penalty
+        available_power = np.asarray(available_power, dtype=float)
+        battery_actions = np.asarray(battery_actions, dtype=float)
+        active = np.asarray(active)
+        battery_penalty = np.where(active & (battery_actions < 0), -battery_actions, 0.0)
+
+        capacity_available_to_charge = 1 - self.state_of_charge
+        power_available_for_charge = \
+            (capacity_available_to_charge * self.max_capacity) / (time_interval * self.charging_efficiency)
+        max_charging_power = np.where(capacity_available_to_charge > 0,
+                                      np.minimum(self.max_charging_power, power_available_for_charge), 0.0)
+        charging_power = battery_actions[..., np.newaxis] * max_charging_power
+
+        remaining_available_power = available_power - charging_power.sum(axis=-1)
+        power_exhausted = remaining_available_power < 0
+        charging_power = np.where(power_exhausted[..., np.newaxis],
+                                  (battery_actions * available_power)[..., np.newaxis] *
+                                  self.get_power_shares(max_charging_power),
+                                  charging_power)
+        remaining_available_power = np.where(power_exhausted, 0.0, remaining_available_power)
+
+        self.update_state_of_charge(charging_power, time_interval, active)
+        return np.where(active, remaining_available_power, available_power)[()], battery_penalty[()]
+
+    @staticmethod
+    def get_power_shares(max_power):
+        # Share of every unit in the power of its bank, 1 for a bank of one unit
+        total_max_power = max_power.sum(axis=-1, keepdims=True)
+        return max_power / np.where(total_max_power > 0, total_max_power, 1.0)
+
+    def update_state_of_charge(self, power, time_interval, active):
+        # Charging stores less energy than it takes and discharging draws more energy than it gives
+        stored_energy = np.where(power > 0, power * time_interval * self.charging_efficiency,
+                                 power * time_interval / self.discharging_efficiency)
+        self.state_of_charge += np.where(active[..., np.newaxis], stored_energy / self.max_capacity, 0.0)
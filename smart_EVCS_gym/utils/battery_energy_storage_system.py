@@ -24,7 +24,8 @@ class BatteryEnergyStorageSystem:
             # Todo: Feat: Add battery_penalty = battery_action or different penalising strategy
 
         if capacity_available_to_charge > 0:
-            power_available_for_charge = (capacity_available_to_charge * self.max_capacity) / time_interval
+            power_available_for_charge = (capacity_available_to_charge * self.max_capacity) / \
+                (time_interval * self.charging_efficiency)
             max_charging_power = min([self.max_charging_power, power_available_for_charge])
             charging_power = battery_action * max_charging_power
 
@@ -34,7 +35,8 @@ class BatteryEnergyStorageSystem:
                 charging_power = battery_action * available_power
                 remaining_available_power = 0
 
-            self.current_capacity = self.current_capacity + (charging_power * time_interval) / self.max_capacity
+            self.current_capacity = self.current_capacity + \
+                self.calculate_state_of_charge_change(charging_power, time_interval)
 
             return remaining_available_power, battery_penalty
         else:
@@ -50,7 +52,8 @@ class BatteryEnergyStorageSystem:
             # Todo: Feat: Add battery_penalty = battery_action or different penalising strategy
 
         if capacity_available_to_discharge > 0:
-            power_available_for_discharge = (capacity_available_to_discharge * self.max_capacity) / time_interval
+            power_available_for_discharge = \
+                (capacity_available_to_discharge * self.max_capacity * self.discharging_efficiency) / time_interval
             max_discharging_power = min([self.max_discharging_power, power_available_for_discharge])
             discharging_power = battery_action * max_discharging_power
 
@@ -60,11 +63,18 @@ class BatteryEnergyStorageSystem:
                 discharging_power = battery_action * power_demand
                 remaining_demand = 0
 
-            self.current_capacity = self.current_capacity + (discharging_power * time_interval) / self.max_capacity
+            self.current_capacity = self.current_capacity + \
+                self.calculate_state_of_charge_change(discharging_power, time_interval)
 
             return remaining_demand, battery_penalty
         else:
             return power_demand, battery_penalty
 
+    def calculate_state_of_charge_change(self, power, time_interval):
+        # Charging stores less energy than it takes and discharging draws more energy than it gives
+        if power > 0:
+            return (power * time_interval * self.charging_efficiency) / self.max_capacity
+        return (power * time_interval / self.discharging_efficiency) / self.max_capacity
+
     def get_state_of_charge(self):
         return self.current_capacity
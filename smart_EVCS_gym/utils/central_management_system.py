@@ -1,13 +1,23 @@
-from numpy import zeros, array, concatenate, random
+from numpy import array, random
 
+from smart_nanogrid_gym.utils.battery_bank import BatteryBank
 from smart_nanogrid_gym.utils.battery_energy_storage_system import BatteryEnergyStorageSystem
 
 
 class CentralManagementSystem:
-    def __init__(self, battery_system_available_in_model, pv_system_available_in_model, vehicle_to_everything):
+    # Lossless, as the battery has always been simulated. battery_units replaces it by one or more units given as
+    # BatteryEnergyStorageSystem arguments, several units are simulated together as a BatteryBank.
+    DEFAULT_BATTERY_UNIT = {'max_capacity': 80, 'current_capacity': 0.5, 'max_charging_power': 44,
+                            'max_discharging_power': 44, 'charging_efficiency': 1.0, 'discharging_efficiency': 1.0,
+                            'depth_of_discharge': 0.15}
+
+    def __init__(self, battery_system_available_in_model, pv_system_available_in_model, vehicle_to_everything,
+                 battery_units=None):
         # Add , building_demand, building_in_nanogrid as init arguments
         self.total_cost = 0
         self.grid_energy_cost = 0
+        self.battery_units = battery_units or [self.DEFAULT_BATTERY_UNIT]
+        self.battery_system_available = battery_system_available_in_model
         self.battery_system = self.initialise_battery_system(battery_system_available_in_model)
         self.pv_system_available = pv_system_available_in_model
         self.vehicle_to_everything = vehicle_to_everything
@@ -15,10 +25,18 @@ class CentralManagementSystem:
         # self.building_exclusive_demand = self.initialise_building_exclusive_demand(building_demand)
 
     def initialise_battery_system(self, battery_system_available_in_model):
-        if battery_system_available_in_model:
-            return BatteryEnergyStorageSystem(80, 0.5, 44, 44, 0.95, 0.95, 0.15)
-        else:
+        if not battery_system_available_in_model:
             return None
+        battery_systems = self.create_battery_systems()
+        if len(battery_systems) == 1:
+            return battery_systems[0]
+        return BatteryBank(battery_systems)
+
+    def create_battery_systems(self):
+        return [BatteryEnergyStorageSystem(**battery_unit) for battery_unit in self.battery_units]
+
+    def reset_battery_system(self):
+        self.battery_system = self.initialise_battery_system(self.battery_system_available)
 
     def initialise_building_demand(self, building_in_nanogrid):
         if building_in_nanogrid:
@@ -51,7 +69,7 @@ class CentralManagementSystem:
         self.calculate_total_cost(total_penalty)
 
         if self.battery_system:
-            battery_soc = self.battery_system.current_capacity
+            battery_soc = self.battery_system.get_state_of_charge()
         else:
             battery_soc = 0
 
@@ -125,62 +143,3 @@ class CentralManagementSystem:
 
     def calculate_total_cost(self, total_penalty):
         self.total_cost = self.grid_energy_cost + total_penalty
-
-    def get_energy_price(self, current_price_model, experiment_length_in_days, time_interval):
-        grid_tariff_high = 0.028
-        grid_tariff_low = 0.013333333
-        energy_tariff_high = 0.148933333
-        energy_tariff_low = 0.087613333
-        res_incentive = 0.014
-        high_tariff = grid_tariff_high + energy_tariff_high + res_incentive
-        low_tariff = grid_tariff_low + energy_tariff_low + res_incentive
-
-        price_day = self.get_price_day(current_price_model, time_interval, low_tariff=low_tariff, high_tariff=high_tariff)
-        price = zeros((experiment_length_in_days, 2 * 24))
-        for day in range(0, experiment_length_in_days):
-            price[day, :] = price_day
-        return price
-
-    def get_price_day(self, current_price_model, time_interval, low_tariff=0.0, high_tariff=0.0):
-        price_day = []
-        if current_price_model == 0:
-            tariffs = []
-            for i in range(int(24 / time_interval)):
-                if i < 7 / time_interval or i > 19 / time_interval:
-                    tariffs.append(low_tariff)
-                else:
-                    tariffs.append(high_tariff)
-
-            day_tariffs = array(tariffs)
-            price_day = array([low_tariff, low_tariff, low_tariff, low_tariff, low_tariff, low_tariff, low_tariff,
-                               high_tariff, high_tariff, high_tariff, high_tariff, high_tariff, high_tariff,
-                               high_tariff, high_tariff, high_tariff, high_tariff, high_tariff, high_tariff,
-                               high_tariff, low_tariff, low_tariff, low_tariff, low_tariff])
-        if current_price_model == 1:
-            price_day = array([0.05, 0.05, 0.05, 0.05, 0.05, 0.05, 0.05, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1,
-                               0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.05, 0.05, 0.05, 0.05])
-            # low high
-        elif current_price_model == 2:
-            price_day = array([0.05, 0.05, 0.05, 0.05, 0.05, 0.06, 0.07, 0.08, 0.09, 0.1, 0.1, 0.1, 0.08, 0.06,
-                               0.05, 0.05, 0.05, 0.06, 0.06, 0.06, 0.06, 0.05, 0.05, 0.05])
-            # dynamic
-        elif current_price_model == 3:
-            price_day = array([0.071, 0.060, 0.056, 0.056, 0.056, 0.060, 0.060, 0.060, 0.066, 0.066, 0.076, 0.080,
-                               0.080, 0.1, 0.1, 0.076, 0.076, 0.1, 0.082, 0.080, 0.085, 0.079, 0.086, 0.070])
-            # dynamic
-        elif current_price_model == 4:
-            price_day = array([0.1, 0.1, 0.05, 0.05, 0.05, 0.05, 0.05, 0.08, 0.08, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1,
-                               0.1, 0.1, 0.06, 0.06, 0.06, 0.1, 0.1, 0.1, 0.1])
-            # dynamic
-        elif current_price_model == 5:
-            price_day[1, :] = [0.05, 0.05, 0.05, 0.05, 0.05, 0.05, 0.05, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1,
-                               0.1, 0.1, 0.1, 0.1, 0.1, 0.05, 0.05, 0.05]
-            price_day[2, :] = [0.05, 0.05, 0.05, 0.05, 0.05, 0.06, 0.07, 0.08, 0.09, 0.1, 0.1, 0.1, 0.08, 0.06, 0.05,
-                               0.05, 0.05, 0.06, 0.06, 0.06, 0.06, 0.05, 0.05, 0.05]
-            price_day[3, :] = [0.071, 0.060, 0.056, 0.056, 0.056, 0.060, 0.060, 0.060, 0.066, 0.066, 0.076, 0.080,
-                               0.080, 0.1, 0.1, 0.076, 0.076, 0.1, 0.082, 0.080, 0.085, 0.079, 0.086, 0.070]
-            price_day[4, :] = [0.1, 0.1, 0.05, 0.05, 0.05, 0.05, 0.05, 0.08, 0.08, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1,
-                               0.1, 0.06, 0.06, 0.06, 0.1, 0.1, 0.1, 0.1]
-
-        price_day = concatenate([price_day, price_day], axis=0)
-        return price_day
@@ -8,7 +8,7 @@ class Charger:
         self.occupied: bool = False
         self.connected_electric_vehicle: Optional[ElectricVehicle] = None
         self.power_value: float = 0.0
-        self.vehicle_arrivals: [] = []
+        self.vehicle_arriving: array = zeros(25, dtype=bool)
         self.vehicle_state_of_charge: array = zeros(25)
         self.occupancy: array = zeros(25)
         self.connected_electric_vehicle = ElectricVehicle(battery_capacity=40,
@@ -43,7 +43,7 @@ class Charger:
         return charging_power
 
     def calculate_max_charging_power(self, timestep, time_interval):
-        if timestep in self.vehicle_arrivals:
+        if self.vehicle_arriving[timestep]:
             remaining_uncharged_capacity = 1 - self.vehicle_state_of_charge[timestep]
         else:
             remaining_uncharged_capacity = 1 - self.vehicle_state_of_charge[timestep - 1]
@@ -59,7 +59,7 @@ class Charger:
     def calculate_next_vehicle_state_of_charge(self, power_value, timestep, time_interval):
         state_of_charge_value_change = (power_value * time_interval) / self.connected_electric_vehicle.battery_capacity
 
-        if timestep in self.vehicle_arrivals:
+        if self.vehicle_arriving[timestep]:
             self.vehicle_state_of_charge[timestep] = self.vehicle_state_of_charge[timestep] + state_of_charge_value_change
         else:
             self.vehicle_state_of_charge[timestep] = self.vehicle_state_of_charge[timestep - 1] + state_of_charge_value_change
@@ -71,7 +71,7 @@ class Charger:
         return discharging_power
 
     def calculate_max_discharging_power(self, timestep, time_interval):
-        if timestep in self.vehicle_arrivals:
+        if self.vehicle_arriving[timestep]:
             vehicle_state_of_energy = self.vehicle_state_of_charge[timestep] * self.connected_electric_vehicle.battery_capacity
         else:
             vehicle_state_of_energy = self.vehicle_state_of_charge[timestep - 1] * self.connected_electric_vehicle.battery_capacity
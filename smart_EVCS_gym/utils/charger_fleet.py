@@ -0,0 +1,48 @@
+import numpy as np
+
+
+class ChargerFleet:
+    # All chargers of a station as one set of arrays instead of a list of Charger objects. A step only touches the
+    # chargers that have a vehicle connected, taken from the event calendar, so idle charge points cost nothing.
+    # Charging follows the same rules as Charger.charge_or_discharge_vehicle.
+    def __init__(self, electric_vehicle_info):
+        self.vehicle_battery_capacity = electric_vehicle_info.battery_capacity
+        self.vehicle_max_charging_power = electric_vehicle_info.max_charging_power
+        self.vehicle_max_discharging_power = electric_vehicle_info.max_discharging_power
+
+        self.vehicle_state_of_charge = None
+        self.event_calendar = None
+
+    def assign_initial_values(self, vehicle_state_of_charge, event_calendar):
+        self.vehicle_state_of_charge = vehicle_state_of_charge
+        self.event_calendar = event_calendar
+
+    def simulate_vehicle_charging(self, actions, current_timestep, time_interval):
+        _, charger_power_values = self.charge_connected_vehicles(actions, current_timestep, time_interval)
+
+        total_discharging_power = charger_power_values[charger_power_values < 0].sum()
+        total_charging_power = charger_power_values[charger_power_values > 0].sum()
+        return total_charging_power, total_discharging_power
+
+    def charge_connected_vehicles(self, actions, current_timestep, time_interval):
+        # Returns the occupied chargers and the charging (positive) or discharging (negative) power of each
+        occupied_chargers = self.event_calendar.occupied_chargers[current_timestep]
+        if occupied_chargers.size == 0:
+            return occupied_chargers, np.zeros(0)
+
+        # A vehicle that arrives at this timestep starts from its arrival state of charge, any other from the state
+        # of charge it reached in the previous timestep
+        vehicle_arriving = self.event_calendar.vehicle_arriving[occupied_chargers, current_timestep]
+        previous_timesteps = current_timestep - 1 + vehicle_arriving
+        previous_state_of_charge = self.vehicle_state_of_charge[occupied_chargers, previous_timesteps]
+
+        charger_actions = np.asarray(actions)[occupied_chargers]
+        charging = charger_actions >= 0
+        max_power = np.where(charging, self.vehicle_max_charging_power, self.vehicle_max_discharging_power)
+        power_left = np.where(charging, 1 - previous_state_of_charge, previous_state_of_charge) * \
+            self.vehicle_battery_capacity / time_interval
+        charger_power_values = charger_actions * np.minimum(max_power, power_left)
+
+        self.vehicle_state_of_charge[occupied_chargers, current_timestep] = \
+            previous_state_of_charge + (charger_power_values * time_interval) / self.vehicle_battery_capacity
+        return occupied_chargers, charger_power_values
@@ -1,30 +1,49 @@
 import time
 
-from numpy import random, zeros
-from scipy.io import loadmat, savemat
+from numpy import zeros
 
 from smart_nanogrid_gym.utils.charger import Charger
+from smart_nanogrid_gym.utils.charger_fleet import ChargerFleet
 from smart_nanogrid_gym.utils.config import data_files_directory_path
 from smart_nanogrid_gym.utils.electric_vehicle import ElectricVehicle
+from smart_nanogrid_gym.utils.event_calendar import EventCalendar
+from smart_nanogrid_gym.utils.scenario import Scenario
+from smart_nanogrid_gym.utils.scenario_generator import ScenarioGenerator
+from smart_nanogrid_gym.utils.time_grid import TimeGrid
 
 
 class ChargingStation:
-    def __init__(self, number_of_chargers, time_interval):
+    def __init__(self, number_of_chargers, time_interval, scenario_generator=None, charger_backend='fleet'):
         self.NUMBER_OF_CHARGERS = number_of_chargers
-        array_columns = int(25 / time_interval)
-        self.chargers = [Charger() for _ in range(self.NUMBER_OF_CHARGERS)]
-        self.vehicle_state_of_charge = zeros([self.NUMBER_OF_CHARGERS, array_columns])
-        self.charger_occupancy = zeros([self.NUMBER_OF_CHARGERS, array_columns])
+        time_grid = TimeGrid(time_interval)
+        self.TOTAL_TIMESTEPS = time_grid.total_timesteps
+        self.ARRAY_COLUMNS = time_grid.array_columns
+        self.vehicle_state_of_charge = zeros([self.NUMBER_OF_CHARGERS, self.ARRAY_COLUMNS])
+        self.charger_occupancy = zeros([self.NUMBER_OF_CHARGERS, self.ARRAY_COLUMNS])
         self.arrivals = []
         self.departures = []
+        self.scenario = None
+        self.event_calendar = None
+        self.scenario_generator = scenario_generator or ScenarioGenerator(self.NUMBER_OF_CHARGERS, time_interval)
         self.departing_vehicles = []
-        self.departure_times = []
-        self.vehicle_state_of_charge_at_current_timestep = []
+        self.departure_times = zeros(self.NUMBER_OF_CHARGERS)
+        self.vehicle_state_of_charge_at_current_timestep = zeros(self.NUMBER_OF_CHARGERS)
 
         self.electric_vehicle_info = ElectricVehicle(battery_capacity=40, current_capacity=0, charging_efficiency=0.95,
                                                      discharging_efficiency=0.95, max_charging_power=22,
                                                      max_discharging_power=22)
 
+        # 'fleet' keeps all charger state in arrays and only touches occupied chargers, 'objects' simulates every
+        # charger as its own Charger object
+        if charger_backend == 'fleet':
+            self.charger_fleet = ChargerFleet(self.electric_vehicle_info)
+            self.chargers = []
+        elif charger_backend == 'objects':
+            self.charger_fleet = None
+            self.chargers = [Charger() for _ in range(self.NUMBER_OF_CHARGERS)]
+        else:
+            raise Exception(f"Unknown charger backend '{charger_backend}', expected 'fleet' or 'objects'.")
+
     def simulate(self, current_timestep, time_interval):
         self.find_departing_vehicles(current_timestep, time_interval)
         self.calculate_departure_times(current_timestep)
@@ -33,77 +52,55 @@ class ChargingStation:
         return self.departure_times, self.vehicle_state_of_charge_at_current_timestep
 
     def find_departing_vehicles(self, timestep, time_interval):
-        if timestep >= (24 / time_interval):
+        if timestep >= self.TOTAL_TIMESTEPS:
             return []
 
-        self.departing_vehicles.clear()
-        for charger in range(self.NUMBER_OF_CHARGERS):
-            charger_occupied = self.check_charger_occupancy(self.charger_occupancy[charger, timestep])
-            vehicle_departing = self.check_is_vehicle_departing(self.departures[charger], timestep)
-
-            if charger_occupied and vehicle_departing:
-                self.departing_vehicles.append(charger)
-
-    def check_charger_occupancy(self, charger_occupancy):
-        if charger_occupancy == 1:
-            return True
-        else:
-            return False
-
-    def check_is_vehicle_departing(self, vehicle_departure, timestep):
-        if timestep + 1 in vehicle_departure:
-            return True
-        else:
-            return False
+        self.departing_vehicles = self.event_calendar.departing_chargers[timestep]
 
     def calculate_departure_times(self, timestep):
-        self.departure_times.clear()
-        for charger in range(self.NUMBER_OF_CHARGERS):
-            charger_occupied = self.check_charger_occupancy(self.charger_occupancy[charger, timestep])
-
-            if charger_occupied:
-                departure_time = self.calculate_next_departure_time(self.departures[charger], timestep)
-                self.departure_times.append(departure_time)
-            else:
-                self.departure_times.append(0)
-
-    def calculate_next_departure_time(self, charger_departures, timestep):
-        for vehicle in range(len(charger_departures)):
-            if timestep <= charger_departures[vehicle]:
-                return charger_departures[vehicle] - timestep
-        return []
+        self.departure_times = self.event_calendar.time_until_departure[:, timestep]
 
     def extract_current_state_of_charge_per_vehicle(self, timestep):
-        self.vehicle_state_of_charge_at_current_timestep.clear()
-        for charger in range(self.NUMBER_OF_CHARGERS):
-            self.vehicle_state_of_charge_at_current_timestep.append(self.vehicle_state_of_charge[charger, timestep])
+        self.vehicle_state_of_charge_at_current_timestep = self.vehicle_state_of_charge[:, timestep]
 
     def load_initial_values(self):
+        scenario = Scenario.load_from_mat_file(data_files_directory_path + '\\initial_values.mat',
+                                               self.NUMBER_OF_CHARGERS)
+        if scenario.charger_occupancy.shape[1] != self.ARRAY_COLUMNS:
+            raise Exception(f"initial_values.mat holds {scenario.charger_occupancy.shape[1]} timesteps per charger, "
+                            f"but the time interval needs {self.ARRAY_COLUMNS}.")
+        self.load_scenario(scenario)
+
+    def load_scenario(self, scenario):
         self.clear_initialisation_variables()
+        self.scenario = scenario
 
-        initial_values = loadmat(data_files_directory_path + '\\initial_values.mat')
+        self.vehicle_state_of_charge = scenario.vehicle_state_of_charge.copy()
+        self.charger_occupancy = scenario.charger_occupancy.copy()
+        self.arrivals.extend(list(charger_arrivals) for charger_arrivals in scenario.arrivals)
+        self.departures.extend(list(charger_departures) for charger_departures in scenario.departures)
+        self.event_calendar = EventCalendar.from_scenario(scenario)
 
-        arrival_times = initial_values['Arrivals']
-        departure_times = initial_values['Departures']
+        self.assign_initial_values_to_chargers()
 
-        self.vehicle_state_of_charge = initial_values['SOC']
-        self.charger_occupancy = initial_values['Charger_occupancy']
+    def draw_scenario_from_bank(self, scenario_bank, scenario_index=None, seed=None):
+        if scenario_index is None:
+            scenario_index = scenario_bank.draw_random_scenario_index(seed)
 
-        for charger in range(self.NUMBER_OF_CHARGERS):
-            if arrival_times.shape == (1, self.NUMBER_OF_CHARGERS):
-                arrivals = arrival_times[0][charger][0]
-                departures = departure_times[0][charger][0]
-            elif arrival_times.shape == (self.NUMBER_OF_CHARGERS, 3):
-                arrivals = arrival_times[charger]
-                departures = departure_times[charger]
-            else:
-                raise Exception("Initial values loaded from initial_values.mat have wrong shape.")
+        self.load_scenario(scenario_bank.get_scenario(scenario_index))
+        return self.scenario
 
-            self.arrivals.append(arrivals.tolist())
-            self.departures.append(departures.tolist())
-            self.chargers[charger].vehicle_arrivals = self.arrivals[charger]
-            self.chargers[charger].vehicle_state_of_charge = self.vehicle_state_of_charge[charger, :]
-            self.chargers[charger].occupancy = initial_values['Charger_occupancy'][charger, :]
+    def save_initial_values(self):
+        self.scenario.save_to_mat_file(data_files_directory_path + '\\initial_values.mat')
+
+    def assign_initial_values_to_chargers(self):
+        if self.charger_fleet:
+            self.charger_fleet.assign_initial_values(self.vehicle_state_of_charge, self.event_calendar)
+
+        for index, charger in enumerate(self.chargers):
+            charger.vehicle_arriving = self.event_calendar.vehicle_arriving[index, :]
+            charger.vehicle_state_of_charge = self.vehicle_state_of_charge[index, :]
+            charger.occupancy = self.charger_occupancy[index, :]
 
     def clear_initialisation_variables(self):
         try:
@@ -115,80 +112,22 @@ class ChargingStation:
         except ValueError:
             return False
 
-    def generate_new_initial_values(self, time_interval):
-        initial_variables_cleared = self.clear_initialisation_variables()
-        initial_vehicle_presence_generated = self.generate_initial_vehicle_presence(initial_variables_cleared, time_interval)
-
-        generated_initial_values = {
-            'SOC': self.vehicle_state_of_charge,
-            'Arrivals': self.arrivals,
-            'Departures': self.departures,
-            'Charger_occupancy': self.charger_occupancy
-        } if initial_vehicle_presence_generated else {}
-
-        savemat(data_files_directory_path + '\\initial_values.mat', generated_initial_values)
-
-    def generate_initial_vehicle_presence(self, initial_variables_cleared, time_interval):
-        if initial_variables_cleared:
-            for charger in range(self.NUMBER_OF_CHARGERS):
-                self.generate_initial_vehicle_presence_per_charger(charger, time_interval)
-            return True
-        return False
-
-    def generate_initial_vehicle_presence_per_charger(self, charger, time_interval):
-        vehicle_arrivals = []
-        vehicle_departures = []
-
-        vehicle_present = False
-        current_departure_time = 0
-
-        total_timesteps = int(24 / time_interval)
-        for timestep in range(total_timesteps):
-            if not vehicle_present:
-                arrival = round(random.rand() - 0.1)
-                if arrival == 1 and timestep < total_timesteps:
-                    vehicle_present = True
-
-                    self.generate_random_arrival_vehicle_state_of_charge(charger, timestep)
-                    vehicle_arrivals.append(timestep)
-
-                    current_departure_time = self.generate_random_vehicle_departure_time(timestep, time_interval, total_timesteps)
-                    vehicle_departures.append(current_departure_time)
-
-            if vehicle_present and timestep < current_departure_time:
-                self.charger_occupancy[charger, timestep] = 1
-                self.chargers[charger].occupancy[timestep] = 1
-            else:
-                vehicle_present = False
-                self.charger_occupancy[charger, timestep] = 0
-                self.chargers[charger].occupancy[timestep] = 0
-
-        self.arrivals.append(vehicle_arrivals)
-        self.departures.append(vehicle_departures)
-        self.chargers[charger].vehicle_arrivals.extend(vehicle_arrivals)
-
-    def generate_random_arrival_vehicle_state_of_charge(self, charger, timestep):
-        random_integer = random.randint(10, 90)
-        self.vehicle_state_of_charge[charger, timestep] = random_integer / 100
-        self.chargers[charger].vehicle_state_of_charge[timestep] = self.vehicle_state_of_charge[charger, timestep]
-
-    def generate_random_vehicle_departure_time(self, timestep, time_interval, total_timesteps):
-        max_charging_time = timestep + int(10 / time_interval)
-        max_departing_time = total_timesteps + int(1 / time_interval)
-        upper_limit = min(max_charging_time, max_departing_time)
-        low = timestep + int(4 / time_interval)
-        high = int(upper_limit)
-        if low >= high:
-            return int(low)
-        return random.randint(low, high)
+    def generate_new_initial_values(self, random_generator=None):
+        # The scenario generator draws on the time grid it was created with
+        self.load_scenario(self.scenario_generator.generate_scenario(random_generator))
+        return self.scenario
 
     def simulate_vehicle_charging(self, actions, current_timestep, time_interval):
+        if self.charger_fleet:
+            return self.charger_fleet.simulate_vehicle_charging(actions, current_timestep, time_interval)
+
         charger_power_values = zeros(self.NUMBER_OF_CHARGERS)
 
         for index, charger in enumerate(self.chargers):
             action = actions[index]
             # to-do later (maybe): -1=Charger reserved -> lasts for max 15 minutes, 1=Occupied, 0=Empty
-            if charger.occupancy[current_timestep] == 1 and action != 0:
+            # A zero action still carries the connected vehicle's state of charge over to this timestep
+            if charger.occupancy[current_timestep] == 1:
                 charger_power_values[index] = charger.charge_or_discharge_vehicle(action, current_timestep, time_interval)
             else:
                 charger_power_values[index] = 0
@@ -0,0 +1,81 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+# Versions of the state buffer layout, a buffer of another version is refused instead of misread
+STATE_FORMAT_VERSION = 1
+# Words of a PCG64 bit generator state: state and increment as two 64-bit halves each, has_uint32 and uinteger
+GENERATOR_STATE_WORDS = 6
+# Types of values that are restored with the type they were saved with, so a restored run continues bit for bit: a
+# battery unit's state of charge turns from a float into a numpy scalar once an action has been applied, and
+# generated scenarios hold float32 states of charge
+VALUE_TYPES = [float, np.float64, np.float32]
+
+
+@dataclass
+class StateLayout:
+    # Position of every part of an environment's state in its flat float64 state buffer. Integer parts (generator
+    # words) are stored bit for bit through a uint64 view of their slice, flags and counters as whole floats.
+    #   header                    format version, buffer size, timestep, simulated single day, episode of the
+    #                             random streams (-1 unseeded), VALUE_TYPES index of the battery state of charge and
+    #                             of the vehicle states of charge
+    #   generator_states          scenario generator and tariff engine generators, see get_generator_state
+    #   battery_state_of_charge   one value per battery unit
+    #   energy_price              prices of the episode, flattened
+    #   vehicle_state_of_charge   (chargers, timesteps) states of charge reached so far
+    #   scenario                  vehicle arrivals, departures, arrival states of charge and charger occupancy of the
+    #                             episode's scenario as four (chargers, timesteps) blocks, see ScenarioBatch
+    header: slice
+    generator_states: slice
+    battery_state_of_charge: slice
+    energy_price: slice
+    vehicle_state_of_charge: slice
+    scenario: slice
+    size: int
+
+    HEADER_SIZE = 7
+
+    @classmethod
+    def create(cls, number_of_chargers, array_columns, number_of_battery_units, energy_price_size):
+        sizes = {
+            'header': cls.HEADER_SIZE,
+            'generator_states': 2 * GENERATOR_STATE_WORDS,
+            'battery_state_of_charge': number_of_battery_units,
+            'energy_price': energy_price_size,
+            'vehicle_state_of_charge': number_of_chargers * array_columns,
+            'scenario': 4 * number_of_chargers * array_columns
+        }
+
+        slices = {}
+        start = 0
+        for name, size in sizes.items():
+            slices[name] = slice(start, start + size)
+            start += size
+
+        return cls(size=start, **slices)
+
+
+def get_value_type_index(value):
+    # Values of other types, such as an int current_capacity of a battery unit's configuration, are restored as
+    # floats, which every step computes with the same way
+    return VALUE_TYPES.index(type(value)) if type(value) in VALUE_TYPES else VALUE_TYPES.index(float)
+
+
+def get_generator_state(random_generator):
+    state = random_generator.bit_generator.state
+    if state['bit_generator'] != 'PCG64':
+        raise Exception(f"Only PCG64 random generators can be saved, not {state['bit_generator']}.")
+    mask = (1 << 64) - 1
+    return np.array([state['state']['state'] >> 64, state['state']['state'] & mask,
+                     state['state']['inc'] >> 64, state['state']['inc'] & mask,
+                     state['has_uint32'], state['uinteger']], dtype=np.uint64)
+
+
+def set_generator_state(random_generator, words):
+    words = [int(word) for word in words]
+    random_generator.bit_generator.state = {
+        'bit_generator': 'PCG64',
+        'state': {'state': (words[0] << 64) | words[1], 'inc': (words[2] << 64) | words[3]},
+        'has_uint32': words[4],
+        'uinteger': words[5]
+    }
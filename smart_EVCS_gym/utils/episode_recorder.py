@@ -0,0 +1,241 @@
+import os
+import queue
+import threading
+
+import numpy as np
+from scipy.io import savemat
+
+from smart_nanogrid_gym.utils.config import data_files_directory_path
+
+# Recorded column name and the CentralManagementSystem.simulate result it is taken from.
+STEP_COLUMNS = {
+    'grid_power': 'Grid power',
+    'grid_energy': 'Grid energy',
+    'utilized_solar_energy': 'Utilized solar energy',
+    'penalties': 'Insufficiently charged vehicles penalty',
+    'total_cost': 'Total cost',
+    'battery_state_of_charge': 'Battery state of charge',
+    'grid_energy_cost': 'Grid energy cost'
+}
+# Per-episode totals kept by KpiEpisodeRecorder
+EPISODE_KPI_COLUMNS = ['reward', 'grid_energy', 'grid_energy_cost', 'penalties', 'utilized_solar_energy',
+                       'battery_cycles']
+
+
+class EpisodeColumns:
+    # Preallocated (episodes, timesteps) arrays, one per recorded quantity, written in place while stepping.
+    def __init__(self, number_of_episodes, total_timesteps, number_of_chargers):
+        self.step_values = {column: np.zeros((number_of_episodes, total_timesteps), dtype=np.float32)
+                            for column in STEP_COLUMNS}
+        self.vehicle_state_of_charge = np.zeros((number_of_episodes, total_timesteps, number_of_chargers),
+                                                dtype=np.float32)
+        self.episode_lengths = np.zeros(number_of_episodes, dtype=np.int32)
+
+    def clear_row(self, row):
+        for values in self.step_values.values():
+            values[row] = 0
+        self.vehicle_state_of_charge[row] = 0
+        self.episode_lengths[row] = 0
+
+    def record_step(self, row, timestep, results, vehicle_state_of_charge):
+        for column, result_name in STEP_COLUMNS.items():
+            self.step_values[column][row, timestep] = results[result_name]
+        self.vehicle_state_of_charge[row, timestep] = vehicle_state_of_charge
+        self.episode_lengths[row] = timestep + 1
+
+    def get_columns(self, rows=slice(None)):
+        columns = {column: values[rows] for column, values in self.step_values.items()}
+        columns['vehicle_state_of_charge'] = self.vehicle_state_of_charge[rows]
+        columns['episode_lengths'] = self.episode_lengths[rows]
+        return columns
+
+
+class EpisodeRecorder:
+    # Records nothing. Used for training, where per-step results are never looked at.
+    def start_episode(self):
+        pass
+
+    def record_step(self, timestep, results, vehicle_state_of_charge):
+        pass
+
+    def set_initial_battery_state_of_charge(self, battery_state_of_charge):
+        pass
+
+    def finish_episode(self, vehicle_state_of_charge, available_solar_energy):
+        pass
+
+    def close(self):
+        pass
+
+
+class MatFileEpisodeRecorder(EpisodeRecorder):
+    # Writes the last episode to prediction_results.mat when it ends, as the environment always used to.
+    def __init__(self, total_timesteps, number_of_chargers, file_path=None):
+        self.file_path = file_path or data_files_directory_path + '\\prediction_results.mat'
+        self.columns = EpisodeColumns(1, total_timesteps, number_of_chargers)
+
+    def start_episode(self):
+        self.columns.clear_row(0)
+
+    def record_step(self, timestep, results, vehicle_state_of_charge):
+        self.columns.record_step(0, timestep, results, vehicle_state_of_charge)
+
+    def finish_episode(self, vehicle_state_of_charge, available_solar_energy):
+        episode_length = self.columns.episode_lengths[0]
+        step_values = {column: values[0, :episode_length] for column, values in self.columns.step_values.items()}
+        prediction_results = {
+            'SOC': vehicle_state_of_charge,
+            'Grid_power': step_values['grid_power'],
+            'Grid_energy': step_values['grid_energy'],
+            'Utilized_solar_energy': step_values['utilized_solar_energy'],
+            'Penalties': step_values['penalties'],
+            'Available_solar_energy': available_solar_energy,
+            'Total_cost': step_values['total_cost'],
+            'Battery_state_of_charge': step_values['battery_state_of_charge'],
+            'Grid_energy_cost': step_values['grid_energy_cost']
+        }
+        savemat(self.file_path, {'Prediction_results': prediction_results})
+
+
+class RingBufferEpisodeRecorder(EpisodeRecorder):
+    # Keeps the last `capacity` episodes in memory, overwriting the oldest one once full.
+    def __init__(self, total_timesteps, number_of_chargers, capacity=100):
+        self.capacity = capacity
+        self.columns = EpisodeColumns(capacity, total_timesteps, number_of_chargers)
+        self.current_row = 0
+        self.number_of_recorded_episodes = 0
+
+    def start_episode(self):
+        self.columns.clear_row(self.current_row)
+
+    def record_step(self, timestep, results, vehicle_state_of_charge):
+        self.columns.record_step(self.current_row, timestep, results, vehicle_state_of_charge)
+
+    def finish_episode(self, vehicle_state_of_charge, available_solar_energy):
+        self.current_row = (self.current_row + 1) % self.capacity
+        self.number_of_recorded_episodes += 1
+
+    def get_episodes(self):
+        # Columns of the recorded episodes, oldest first
+        if self.number_of_recorded_episodes < self.capacity:
+            rows = np.arange(self.number_of_recorded_episodes)
+        else:
+            rows = np.roll(np.arange(self.capacity), -self.current_row)
+        return self.columns.get_columns(rows)
+
+
+class AsyncNpzEpisodeRecorder(EpisodeRecorder):
+    # Fills a chunk of `episodes_per_chunk` episodes in memory and hands full chunks to a background thread, which
+    # saves each one as episodes_<chunk>.npz. The step loop only waits for the writer when `max_pending_chunks`
+    # chunks are already queued, which bounds memory if the disk cannot keep up.
+    def __init__(self, total_timesteps, number_of_chargers, directory_path, episodes_per_chunk=256, compress=True,
+                 max_pending_chunks=4):
+        self.TOTAL_TIMESTEPS = total_timesteps
+        self.NUMBER_OF_CHARGERS = number_of_chargers
+        self.directory_path = directory_path
+        self.episodes_per_chunk = episodes_per_chunk
+        self.save_chunk_file = np.savez_compressed if compress else np.savez
+        os.makedirs(directory_path, exist_ok=True)
+
+        self.columns = EpisodeColumns(episodes_per_chunk, total_timesteps, number_of_chargers)
+        self.current_row = 0
+        self.chunk_index = 0
+
+        self.pending_chunks = queue.Queue(maxsize=max_pending_chunks)
+        self.writer_error = None
+        self.writer_thread = threading.Thread(target=self.write_chunks, daemon=True)
+        self.writer_thread.start()
+
+    def start_episode(self):
+        self.columns.clear_row(self.current_row)
+
+    def record_step(self, timestep, results, vehicle_state_of_charge):
+        self.columns.record_step(self.current_row, timestep, results, vehicle_state_of_charge)
+
+    def finish_episode(self, vehicle_state_of_charge, available_solar_energy):
+        self.current_row += 1
+        if self.current_row == self.episodes_per_chunk:
+            self.submit_chunk(self.columns.get_columns())
+            self.columns = EpisodeColumns(self.episodes_per_chunk, self.TOTAL_TIMESTEPS, self.NUMBER_OF_CHARGERS)
+            self.current_row = 0
+
+    def submit_chunk(self, columns):
+        if self.writer_error:
+            raise self.writer_error
+        chunk_path = os.path.join(self.directory_path, f'episodes_{self.chunk_index:06d}.npz')
+        self.pending_chunks.put((chunk_path, columns))
+        self.chunk_index += 1
+
+    def write_chunks(self):
+        while True:
+            chunk = self.pending_chunks.get()
+            if chunk is None:
+                return
+            chunk_path, columns = chunk
+            try:
+                self.save_chunk_file(chunk_path, **columns)
+            except Exception as error:
+                self.writer_error = error
+
+    def close(self):
+        if not self.writer_thread.is_alive():
+            return
+        if self.current_row > 0:
+            self.submit_chunk(self.columns.get_columns(slice(0, self.current_row)))
+            self.current_row = 0
+        self.pending_chunks.put(None)
+        self.writer_thread.join()
+        if self.writer_error:
+            raise self.writer_error
+
+
+class KpiEpisodeRecorder(EpisodeRecorder):
+    # Keeps only the totals of the running episode, so evaluations of any length run in constant memory. Once an
+    # episode ends, episode_kpis holds its EPISODE_KPI_COLUMNS. Utilized solar power is turned into energy over the
+    # time interval (hours) of a step, and battery cycles are equivalent full cycles, half the summed state of charge
+    # changes from the state of charge at reset on. The totals also restart at the first step, so an episode stepped
+    # again from a state restored with set_state is not added to the one before.
+    def __init__(self, total_timesteps, number_of_chargers, time_interval=1):
+        self.TIME_INTERVAL = time_interval
+        self.totals = dict.fromkeys(EPISODE_KPI_COLUMNS, 0.0)
+        self.initial_battery_state_of_charge = 0.0
+        self.previous_battery_state_of_charge = 0.0
+        self.episode_kpis = None
+
+    def start_episode(self):
+        self.totals = dict.fromkeys(EPISODE_KPI_COLUMNS, 0.0)
+        self.previous_battery_state_of_charge = self.initial_battery_state_of_charge
+
+    def set_initial_battery_state_of_charge(self, battery_state_of_charge):
+        self.initial_battery_state_of_charge = float(battery_state_of_charge)
+        self.previous_battery_state_of_charge = self.initial_battery_state_of_charge
+
+    def record_step(self, timestep, results, vehicle_state_of_charge):
+        if timestep == 0:
+            self.start_episode()
+        self.totals['reward'] -= float(results['Total cost'])
+        self.totals['grid_energy'] += float(results['Grid energy'])
+        self.totals['grid_energy_cost'] += float(results['Grid energy cost'])
+        self.totals['penalties'] += float(results['Insufficiently charged vehicles penalty'])
+        self.totals['utilized_solar_energy'] += float(results['Utilized solar energy']) * self.TIME_INTERVAL
+        battery_state_of_charge = float(results['Battery state of charge'])
+        self.totals['battery_cycles'] += abs(battery_state_of_charge - self.previous_battery_state_of_charge) / 2
+        self.previous_battery_state_of_charge = battery_state_of_charge
+
+    def finish_episode(self, vehicle_state_of_charge, available_solar_energy):
+        self.episode_kpis = dict(self.totals)
+
+
+def create_episode_recorder(mode, total_timesteps, number_of_chargers, time_interval=1, **options):
+    if mode == 'off':
+        return EpisodeRecorder()
+    elif mode == 'mat':
+        return MatFileEpisodeRecorder(total_timesteps, number_of_chargers, **options)
+    elif mode == 'ring':
+        return RingBufferEpisodeRecorder(total_timesteps, number_of_chargers, **options)
+    elif mode == 'npz':
+        return AsyncNpzEpisodeRecorder(total_timesteps, number_of_chargers, **options)
+    elif mode == 'kpi':
+        return KpiEpisodeRecorder(total_timesteps, number_of_chargers, time_interval, **options)
+    else:
+        raise Exception(f"Unknown episode recorder mode '{mode}', expected 'off', 'mat', 'ring', 'npz' or 'kpi'.")
@@ -0,0 +1,60 @@
+import numpy as np
+
+
+class EventCalendar:
+    # Arrivals and departures of one scenario indexed by timestep, built once when the scenario is loaded so that
+    # every step looks its events up instead of searching the per-charger session lists.
+    #   arriving_chargers[t]    chargers whose vehicle arrives at timestep t
+    #   departing_chargers[t]   occupied chargers whose vehicle leaves at the end of timestep t (departure t + 1)
+    #   vehicle_arriving        (chargers, timesteps) flags of the arrival timesteps
+    #   time_until_departure    (chargers, timesteps) timesteps until the connected vehicle's departure, 0 when free
+    #   occupied_chargers[t]    chargers with a vehicle connected at timestep t
+    def __init__(self, arrivals, departures, charger_occupancy):
+        number_of_chargers, array_columns = charger_occupancy.shape
+        occupied = charger_occupancy == 1
+
+        # One entry per session, ordered by charger and, within a charger, by time
+        sessions_per_charger = [len(charger_arrivals) for charger_arrivals in arrivals]
+        session_chargers = np.repeat(np.arange(number_of_chargers), sessions_per_charger)
+        session_arrivals = np.concatenate([np.zeros(0, dtype=int)] + [np.asarray(charger_arrivals, dtype=int)
+                                                                       for charger_arrivals in arrivals])
+        session_departures = np.concatenate([np.zeros(0, dtype=int)] + [np.asarray(charger_departures, dtype=int)
+                                                                         for charger_departures in departures])
+
+        arriving = session_arrivals < array_columns
+        self.vehicle_arriving = np.zeros((number_of_chargers, array_columns), dtype=bool)
+        self.vehicle_arriving[session_chargers[arriving], session_arrivals[arriving]] = True
+        self.arriving_chargers = self.group_chargers_by_timestep(session_chargers[arriving],
+                                                                 session_arrivals[arriving], array_columns)
+
+        departing = (session_departures >= 1) & (session_departures <= array_columns)
+        departing[departing] = occupied[session_chargers[departing], session_departures[departing] - 1]
+        self.departing_chargers = self.group_chargers_by_timestep(session_chargers[departing],
+                                                                  session_departures[departing] - 1, array_columns)
+
+        # The connected vehicle leaves at its charger's first departure not before t, found for every charger and
+        # timestep at once by searching (charger, departure) keys
+        key_stride = max(array_columns, int(session_departures.max(initial=0))) + 1
+        departure_keys = np.sort(session_chargers * key_stride + session_departures)
+        charger_rows = np.arange(number_of_chargers)[:, np.newaxis]
+        timestep_keys = charger_rows * key_stride + np.arange(array_columns)
+
+        self.time_until_departure = np.zeros((number_of_chargers, array_columns), dtype=int)
+        if departure_keys.size > 0:
+            next_departure_keys = departure_keys[np.minimum(np.searchsorted(departure_keys, timestep_keys),
+                                                            departure_keys.size - 1)]
+            same_charger = next_departure_keys // key_stride == charger_rows
+            self.time_until_departure = np.where(occupied & same_charger, next_departure_keys - timestep_keys, 0)
+
+        occupied_timesteps, occupied_chargers = np.nonzero(occupied.T)
+        self.occupied_chargers = np.split(occupied_chargers, np.cumsum(np.bincount(occupied_timesteps,
+                                                                                   minlength=array_columns))[:-1])
+
+    @staticmethod
+    def group_chargers_by_timestep(chargers, timesteps, array_columns):
+        order = np.lexsort((chargers, timesteps))
+        return np.split(chargers[order], np.cumsum(np.bincount(timesteps, minlength=array_columns))[:-1])
+
+    @classmethod
+    def from_scenario(cls, scenario):
+        return cls(scenario.arrivals, scenario.departures, scenario.charger_occupancy)
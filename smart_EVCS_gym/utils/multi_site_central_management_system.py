@@ -0,0 +1,73 @@
+import numpy as np
+
+from smart_nanogrid_gym.utils.battery_bank import BatteryBank
+from smart_nanogrid_gym.utils.central_management_system import CentralManagementSystem
+
+
+class MultiSiteCentralManagementSystem:
+    # Energy balance of several sites behind one grid contract. Every site covers its charging demand from its own
+    # PV system and bank of battery units, following the rules of CentralManagementSystem, all sites at once in
+    # (sites,) arrays.
+    # What is left is netted across the sites, so one site's surplus supplies another site's demand before anything
+    # is bought from or, with vehicle to everything, sold to the grid.
+    def __init__(self, number_of_sites, battery_system_available_in_model, pv_system_available_in_model,
+                 vehicle_to_everything, battery_units=None):
+        self.NUMBER_OF_SITES = number_of_sites
+        self.battery_system_available = battery_system_available_in_model
+        self.pv_system_available = pv_system_available_in_model
+        self.vehicle_to_everything = vehicle_to_everything
+
+        if battery_system_available_in_model:
+            battery_systems = CentralManagementSystem(battery_system_available_in_model, pv_system_available_in_model,
+                                                      vehicle_to_everything, battery_units).create_battery_systems()
+            self.battery_bank = BatteryBank(battery_systems, number_of_banks=number_of_sites)
+        else:
+            self.battery_bank = None
+
+    def reset_battery_systems(self):
+        if self.battery_bank:
+            self.battery_bank.reset()
+
+    def get_battery_state_of_charge(self):
+        if self.battery_bank:
+            return self.battery_bank.get_state_of_charge()
+        return np.zeros(self.NUMBER_OF_SITES)
+
+    def simulate(self, total_charging_power, total_discharging_power, solar_power, energy_price,
+                 insufficiently_charged_vehicles_penalty, battery_actions, time_interval):
+        total_power = total_charging_power + total_discharging_power
+        remaining_power_demand = total_power - solar_power
+        power_demanded = remaining_power_demand > 0
+        power_surplus = remaining_power_demand < 0
+        available_power = solar_power - total_power
+
+        battery_penalty = np.zeros(self.NUMBER_OF_SITES)
+        if self.battery_system_available:
+            battery_active = battery_actions != 0
+            remaining_power_demand, discharging_penalty = self.battery_bank.discharge(
+                remaining_power_demand, battery_actions, time_interval, power_demanded & battery_active)
+            available_power, charging_penalty = self.battery_bank.charge(
+                available_power, battery_actions, time_interval, power_surplus & battery_active)
+            battery_penalty = discharging_penalty + charging_penalty
+
+        site_power = np.where(power_demanded, remaining_power_demand, 0.0)
+        site_power = np.where(power_surplus, -available_power, site_power)
+        grid_power = site_power.sum()
+        if not self.vehicle_to_everything:
+            grid_power = max(grid_power, 0.0)
+
+        grid_energy = grid_power * time_interval
+        grid_energy_cost = grid_energy * energy_price
+        total_penalty = insufficiently_charged_vehicles_penalty.sum() + battery_penalty.sum()
+
+        return {
+            'Total cost': grid_energy_cost + total_penalty,
+            'Grid power': grid_power,
+            'Grid energy': grid_energy,
+            'Site power': site_power,
+            'Utilized solar energy': solar_power,
+            'Insufficiently charged vehicles penalty': insufficiently_charged_vehicles_penalty,
+            'Battery penalty': battery_penalty,
+            'Battery state of charge': self.get_battery_state_of_charge(),
+            'Grid energy cost': grid_energy_cost
+        }
@@ -0,0 +1,41 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class ObservationLayout:
+    # Position of every observed quantity in the observation vector. Quantities the model leaves out (radiation
+    # without a PV system, battery state of charge without a battery) are None.
+    solar_radiation: slice
+    energy_price: slice
+    solar_radiation_predictions: slice
+    energy_price_predictions: slice
+    vehicle_state_of_charge: slice
+    departure_times: slice
+    battery_state_of_charge: slice
+    size: int
+
+    @property
+    def disturbances(self):
+        # Radiation and price values at the current timestep followed by their predictions
+        return slice(0, self.vehicle_state_of_charge.start)
+
+    @classmethod
+    def create(cls, number_of_chargers, number_of_hours_ahead, pv_system_available_in_model,
+               battery_system_available_in_model):
+        sizes = {
+            'solar_radiation': int(pv_system_available_in_model),
+            'energy_price': 1,
+            'solar_radiation_predictions': number_of_hours_ahead * int(pv_system_available_in_model),
+            'energy_price_predictions': number_of_hours_ahead,
+            'vehicle_state_of_charge': number_of_chargers,
+            'departure_times': number_of_chargers,
+            'battery_state_of_charge': int(battery_system_available_in_model)
+        }
+
+        slices = {}
+        start = 0
+        for name, size in sizes.items():
+            slices[name] = slice(start, start + size) if size else None
+            start += size
+
+        return cls(size=start, **slices)
@@ -0,0 +1,39 @@
+import numpy as np
+
+
+class RandomStreams:
+    # Random streams of one seeded environment, all derived from one numpy SeedSequence. Every episode draws its
+    # scenario, its prices and its scenario bank index from generators seeded with the (episode, stream) child of
+    # that sequence, so episode e is reproducible on its own, whatever ran before it and in whichever process.
+    # Child j of a seed, SeedSequence(seed, spawn_key=(j,)), gives environment j (a worker process, a slot of a vector
+    # environment) streams of its own that no other child shares.
+    SCENARIO = 0
+    PRICES = 1
+    SCENARIO_INDEX = 2
+
+    def __init__(self, seed=None):
+        if isinstance(seed, np.random.SeedSequence):
+            self.seed_sequence = seed
+        else:
+            self.seed_sequence = np.random.SeedSequence(seed)
+        self.episode = 0
+
+    def get_child_seed(self, *keys):
+        return np.random.SeedSequence(self.seed_sequence.entropy, spawn_key=self.seed_sequence.spawn_key + keys,
+                                      pool_size=self.seed_sequence.pool_size)
+
+    def spawn(self, number_of_children):
+        return [RandomStreams(self.get_child_seed(child)) for child in range(number_of_children)]
+
+    def start_episode(self, episode=None):
+        # Number of the episode that starts, the next one unless given, later episodes continue from it
+        if episode is None:
+            episode = self.episode
+        self.episode = episode + 1
+        return episode
+
+    def get_seed(self, episode, stream):
+        return self.get_child_seed(episode, stream)
+
+    def get_generator(self, episode, stream):
+        return np.random.default_rng(self.get_seed(episode, stream))
@@ -0,0 +1,275 @@
+import json
+import os
+
+import numpy as np
+
+from smart_nanogrid_gym.utils.episode_recorder import EPISODE_KPI_COLUMNS
+
+# Versions of the store layout, a store of another version is refused instead of misread
+STORE_FORMAT_VERSION = 1
+STATISTICS_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+# Columns every row starts with, before the value columns
+LABEL_COLUMNS = {'policy': '<i4', 'episode': '<i8'}
+VALUE_DTYPE = '<f8'
+
+
+class StreamingHistogram:
+    # Counts of the finite values of every column in `number_of_bins` equal bins that cover every value added so far.
+    # The bins start on the range of the first values and double their width, merging neighbouring bins, whenever a
+    # value falls outside, so memory stays the same and a quantile read from the bins is off by at most one bin width,
+    # a 1 / number_of_bins share of the range, whatever the number of values.
+    def __init__(self, number_of_columns, number_of_bins=2048):
+        self.NUMBER_OF_BINS = number_of_bins
+        self.counts = np.zeros((number_of_columns, number_of_bins), dtype=np.int64)
+        self.origin = np.full(number_of_columns, np.nan)
+        self.width = np.zeros(number_of_columns)
+
+    def add(self, values):
+        # values: (rows, columns)
+        for column, column_values in enumerate(values.T):
+            minimum, maximum = column_values.min(), column_values.max()
+            if np.isnan(self.origin[column]):
+                self.origin[column] = minimum
+                self.width[column] = (maximum - minimum) / self.NUMBER_OF_BINS or max(abs(minimum), 1.0) * 2 ** -20
+            while minimum < self.origin[column]:
+                self.widen(column, downwards=True)
+            while maximum >= self.origin[column] + self.NUMBER_OF_BINS * self.width[column]:
+                self.widen(column, downwards=False)
+            bins = np.minimum(((column_values - self.origin[column]) / self.width[column]).astype(np.int64),
+                              self.NUMBER_OF_BINS - 1)
+            self.counts[column] += np.bincount(bins, minlength=self.NUMBER_OF_BINS)
+
+    def widen(self, column, downwards):
+        # Doubles the bin width, keeping the current range in the upper half of the bins when widening downwards
+        merged_counts = self.counts[column].reshape(-1, 2).sum(axis=1)
+        self.counts[column] = 0
+        if downwards:
+            self.counts[column, self.NUMBER_OF_BINS // 2:] = merged_counts
+            self.origin[column] -= self.NUMBER_OF_BINS * self.width[column]
+        else:
+            self.counts[column, :self.NUMBER_OF_BINS // 2] = merged_counts
+        self.width[column] *= 2
+
+    def get_quantiles(self, quantiles, minimum, maximum):
+        # (columns, quantiles) estimates, interpolated within the bins and kept within the extremes seen
+        estimates = np.full((len(self.counts), len(quantiles)), np.nan)
+        for column, counts in enumerate(self.counts):
+            cumulative_counts = np.concatenate([[0], np.cumsum(counts)])
+            if cumulative_counts[-1] == 0:
+                continue
+            edges = self.origin[column] + self.width[column] * np.arange(self.NUMBER_OF_BINS + 1)
+            estimates[column] = np.clip(np.interp(np.asarray(quantiles) * cumulative_counts[-1], cumulative_counts,
+                                                  edges), minimum[column], maximum[column])
+        return estimates
+
+
+class StreamingStatistics:
+    # Count, mean, variance, extremes and quantile estimates of every column of the rows added so far, in memory
+    # that does not grow with the number of rows. Rows are added in batches; means and variances are merged with the
+    # batch's as in Chan et al.'s parallel variance algorithm.
+    def __init__(self, number_of_columns, quantiles=STATISTICS_QUANTILES, number_of_bins=2048):
+        self.quantiles = list(quantiles)
+        self.count = 0
+        self.mean = np.zeros(number_of_columns)
+        self.squared_deviations = np.zeros(number_of_columns)
+        self.minimum = np.full(number_of_columns, np.inf)
+        self.maximum = np.full(number_of_columns, -np.inf)
+        self.histogram = StreamingHistogram(number_of_columns, number_of_bins)
+
+    def add(self, values):
+        # values: (rows, columns) of finite values, an infinity would stretch the histogram forever
+        values = np.asarray(values, dtype=np.float64)
+        batch_count = len(values)
+        if batch_count == 0:
+            return
+        if not np.isfinite(values).all():
+            raise Exception("Streaming statistics only take finite values.")
+        batch_mean = values.mean(axis=0)
+        batch_squared_deviations = np.square(values - batch_mean).sum(axis=0)
+        count = self.count + batch_count
+        deviations = batch_mean - self.mean
+        self.mean += deviations * batch_count / count
+        self.squared_deviations += batch_squared_deviations + np.square(deviations) * self.count * batch_count / count
+        self.count = count
+        np.minimum(self.minimum, values.min(axis=0), out=self.minimum)
+        np.maximum(self.maximum, values.max(axis=0), out=self.maximum)
+        self.histogram.add(values)
+
+    def get_summary(self, column_names):
+        if self.count == 0:
+            return {column_name: {'count': 0} for column_name in column_names}
+        standard_deviation = np.sqrt(self.squared_deviations / self.count)
+        quantile_estimates = self.histogram.get_quantiles(self.quantiles, self.minimum, self.maximum)
+        return {
+            column_name: {
+                'count': self.count,
+                'mean': float(self.mean[column]),
+                'std': float(standard_deviation[column]),
+                'min': float(self.minimum[column]),
+                'max': float(self.maximum[column]),
+                'quantiles': {f'p{quantile * 100:g}': float(quantile_estimates[column, index])
+                              for index, quantile in enumerate(self.quantiles)}
+            }
+            for column, column_name in enumerate(column_names)
+        }
+
+
+class ResultStore:
+    # Append-only columnar store of per-episode evaluation results with streaming statistics per policy. Every column
+    # is a raw little-endian file <column>.bin in directory_path, one value per row, next to schema.json, which
+    # names the columns, their dtypes and the policies the policy column indexes. Rows are buffered in chunks of
+    # `rows_per_chunk`; every full chunk, or the rows buffered so far when flush is called, is added to the statistics
+    # and appended to the column files, after which summary.json is rewritten with the statistics of every row
+    # written so far, so a running evaluation can be queried with read_summary and read_columns from another process.
+    # Memory does not grow with the number of rows. Values must be finite.
+    #
+    # Opening an existing store appends to it: rows torn by an interrupted write are cut off and the statistics are
+    # rebuilt from the rows on disk, a chunk at a time.
+    def __init__(self, directory_path, columns=EPISODE_KPI_COLUMNS, quantiles=STATISTICS_QUANTILES,
+                 rows_per_chunk=1000):
+        self.directory_path = directory_path
+        self.value_columns = list(columns)
+        self.column_dtypes = dict(LABEL_COLUMNS, **{column: VALUE_DTYPE for column in self.value_columns})
+        self.quantiles = list(quantiles)
+        self.rows_per_chunk = rows_per_chunk
+        self.policies = []
+        self.statistics = {}
+        self.number_of_rows = 0
+        os.makedirs(directory_path, exist_ok=True)
+
+        if os.path.exists(self.get_path('schema.json')):
+            self.open_existing_store()
+        self.write_schema()
+        self.create_column_files()
+
+        self.chunk = {column: np.zeros(rows_per_chunk, dtype=dtype) for column, dtype in self.column_dtypes.items()}
+        self.chunk_rows = 0
+        self.closed = False
+
+    def get_path(self, file_name):
+        return os.path.join(self.directory_path, file_name)
+
+    def get_column_path(self, column):
+        return self.get_path(f'{column}.bin')
+
+    def open_existing_store(self):
+        schema = self.read_schema(self.directory_path)
+        if schema['columns'] != self.column_dtypes:
+            raise Exception(f"The result store in {self.directory_path} has the columns {list(schema['columns'])}, "
+                            f"not {list(self.column_dtypes)}.")
+        self.policies = schema['policies']
+        # A store interrupted before its first flush has a schema but may lack column files
+        self.create_column_files()
+        self.number_of_rows = self.get_number_of_rows(self.directory_path, schema)
+        for column, dtype in self.column_dtypes.items():
+            os.truncate(self.get_column_path(column), self.number_of_rows * np.dtype(dtype).itemsize)
+
+        for first_row in range(0, self.number_of_rows, self.rows_per_chunk):
+            rows = min(self.rows_per_chunk, self.number_of_rows - first_row)
+            self.add_to_statistics(self.read_column('policy', first_row, rows),
+                                   np.column_stack([self.read_column(column, first_row, rows)
+                                                    for column in self.value_columns]))
+
+    def create_column_files(self):
+        # Empty column files next to the schema, existing ones are left as they are
+        for column in self.column_dtypes:
+            with open(self.get_column_path(column), 'ab'):
+                pass
+
+    def read_column(self, column, first_row, rows):
+        dtype = np.dtype(self.column_dtypes[column])
+        return np.fromfile(self.get_column_path(column), dtype=dtype, count=rows, offset=first_row * dtype.itemsize)
+
+    def add_to_statistics(self, policies, values):
+        for policy in np.unique(policies):
+            policy_name = self.policies[policy]
+            if policy_name not in self.statistics:
+                self.statistics[policy_name] = StreamingStatistics(len(self.value_columns), self.quantiles)
+            self.statistics[policy_name].add(values[policies == policy])
+
+    def append(self, policy_name, episode, values):
+        # values maps every value column to the episode's value
+        if self.closed:
+            raise Exception("The result store is closed.")
+        non_finite_columns = [column for column in self.value_columns if not np.isfinite(values[column])]
+        if non_finite_columns:
+            raise Exception(f"Episode {episode} of {policy_name} has non-finite values in {non_finite_columns}.")
+        if policy_name not in self.policies:
+            self.policies.append(policy_name)
+            self.write_schema()
+
+        self.chunk['policy'][self.chunk_rows] = self.policies.index(policy_name)
+        self.chunk['episode'][self.chunk_rows] = episode
+        for column in self.value_columns:
+            self.chunk[column][self.chunk_rows] = values[column]
+        self.chunk_rows += 1
+
+        if self.chunk_rows == self.rows_per_chunk:
+            self.flush()
+
+    def flush(self):
+        # Appends the buffered rows to the statistics and the column files and publishes the statistics
+        self.add_to_statistics(self.chunk['policy'][:self.chunk_rows],
+                               np.column_stack([self.chunk[column][:self.chunk_rows]
+                                                for column in self.value_columns]))
+        for column, values in self.chunk.items():
+            with open(self.get_column_path(column), 'ab') as column_file:
+                column_file.write(values[:self.chunk_rows].tobytes())
+        self.number_of_rows += self.chunk_rows
+        self.chunk_rows = 0
+        self.write_json('summary.json', self.get_summary())
+
+    def get_summary(self):
+        # Statistics of every row written to the column files, the rows of the current chunk follow at its end
+        return {
+            'rows': self.number_of_rows,
+            'policies': {policy_name: self.statistics[policy_name].get_summary(self.value_columns)
+                         for policy_name in self.policies if policy_name in self.statistics}
+        }
+
+    def write_schema(self):
+        self.write_json('schema.json', {'version': STORE_FORMAT_VERSION, 'columns': self.column_dtypes,
+                                        'policies': self.policies})
+
+    def write_json(self, file_name, contents):
+        path = self.get_path(file_name)
+        with open(f'{path}.tmp', 'w') as json_file:
+            json.dump(contents, json_file, indent=4)
+        os.replace(f'{path}.tmp', path)
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+
+    @staticmethod
+    def read_schema(directory_path):
+        with open(os.path.join(directory_path, 'schema.json')) as schema_file:
+            schema = json.load(schema_file)
+        if schema['version'] != STORE_FORMAT_VERSION:
+            raise Exception(f"Result store version {schema['version']} cannot be read, "
+                            f"expected version {STORE_FORMAT_VERSION}.")
+        return schema
+
+    @staticmethod
+    def get_number_of_rows(directory_path, schema):
+        # Rows every column file holds completely, a store being written may hold part of a chunk in some of them
+        return min(os.path.getsize(os.path.join(directory_path, f'{column}.bin')) // np.dtype(dtype).itemsize
+                   if os.path.exists(os.path.join(directory_path, f'{column}.bin')) else 0
+                   for column, dtype in schema['columns'].items())
+
+    @staticmethod
+    def read_summary(directory_path):
+        with open(os.path.join(directory_path, 'summary.json')) as summary_file:
+            return json.load(summary_file)
+
+    @staticmethod
+    def read_columns(directory_path):
+        # Policy names and read-only memory maps of every column, cut to the rows every column holds
+        schema = ResultStore.read_schema(directory_path)
+        number_of_rows = ResultStore.get_number_of_rows(directory_path, schema)
+        columns = {column: np.memmap(os.path.join(directory_path, f'{column}.bin'), dtype=dtype, mode='r',
+                                     shape=(number_of_rows,)) if number_of_rows else np.zeros(0, dtype=dtype)
+                   for column, dtype in schema['columns'].items()}
+        return schema['policies'], columns
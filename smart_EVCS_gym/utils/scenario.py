@@ -0,0 +1,118 @@
+from dataclasses import dataclass
+
+from numpy import array, bincount, cumsum, empty, ndarray, split, zeros
+from scipy.io import loadmat, savemat
+
+
+@dataclass
+class Scenario:
+    vehicle_state_of_charge: ndarray
+    charger_occupancy: ndarray
+    arrivals: list
+    departures: list
+
+    def copy(self):
+        return Scenario(vehicle_state_of_charge=self.vehicle_state_of_charge.copy(),
+                        charger_occupancy=self.charger_occupancy.copy(),
+                        arrivals=[list(charger_arrivals) for charger_arrivals in self.arrivals],
+                        departures=[list(charger_departures) for charger_departures in self.departures])
+
+    def save_to_mat_file(self, file_path):
+        savemat(file_path, {
+            'SOC': self.vehicle_state_of_charge,
+            'Arrivals': self.convert_to_mat_cell_array(self.arrivals),
+            'Departures': self.convert_to_mat_cell_array(self.departures),
+            'Charger_occupancy': self.charger_occupancy
+        })
+
+    @staticmethod
+    def convert_to_mat_cell_array(values_per_charger):
+        cell_array = empty((1, len(values_per_charger)), dtype=object)
+        for charger, charger_values in enumerate(values_per_charger):
+            cell_array[0, charger] = array(charger_values, dtype=int).reshape(1, -1)
+        return cell_array
+
+    @classmethod
+    def load_from_mat_file(cls, file_path, number_of_chargers):
+        initial_values = loadmat(file_path)
+
+        arrival_times = initial_values['Arrivals']
+        departure_times = initial_values['Departures']
+
+        arrivals = []
+        departures = []
+        for charger in range(number_of_chargers):
+            if arrival_times.shape == (1, number_of_chargers):
+                charger_arrivals = arrival_times[0][charger].flatten()
+                charger_departures = departure_times[0][charger].flatten()
+            elif arrival_times.shape == (number_of_chargers, 3):
+                charger_arrivals = arrival_times[charger]
+                charger_departures = departure_times[charger]
+            else:
+                raise Exception("Initial values loaded from initial_values.mat have wrong shape.")
+
+            arrivals.append(charger_arrivals.tolist())
+            departures.append(charger_departures.tolist())
+
+        return cls(vehicle_state_of_charge=initial_values['SOC'],
+                   charger_occupancy=initial_values['Charger_occupancy'],
+                   arrivals=arrivals,
+                   departures=departures)
+
+
+@dataclass
+class ScenarioBatch:
+    # Many scenarios in (days, chargers, timesteps) arrays. vehicle_arrivals flags the timestep a vehicle arrives,
+    # and vehicle_departures and vehicle_state_of_charge hold that vehicle's departure timestep and arrival state
+    # of charge at the same position.
+    vehicle_arrivals: ndarray
+    vehicle_departures: ndarray
+    vehicle_state_of_charge: ndarray
+    charger_occupancy: ndarray
+
+    def __len__(self):
+        return self.vehicle_arrivals.shape[0]
+
+    @classmethod
+    def from_scenarios(cls, scenarios):
+        number_of_chargers, array_columns = scenarios[0].charger_occupancy.shape
+        arrays_shape = (len(scenarios), number_of_chargers, array_columns)
+        vehicle_arrivals = zeros(arrays_shape, dtype=bool)
+        vehicle_departures = zeros(arrays_shape, dtype=int)
+        vehicle_state_of_charge = zeros(arrays_shape)
+        charger_occupancy = zeros(arrays_shape, dtype=bool)
+
+        for day, scenario in enumerate(scenarios):
+            vehicle_state_of_charge[day] = scenario.vehicle_state_of_charge
+            charger_occupancy[day] = scenario.charger_occupancy == 1
+            for charger in range(number_of_chargers):
+                for arrival, departure in zip(scenario.arrivals[charger], scenario.departures[charger]):
+                    vehicle_arrivals[day, charger, int(arrival)] = True
+                    vehicle_departures[day, charger, int(arrival)] = int(departure)
+
+        return cls(vehicle_arrivals=vehicle_arrivals,
+                   vehicle_departures=vehicle_departures,
+                   vehicle_state_of_charge=vehicle_state_of_charge,
+                   charger_occupancy=charger_occupancy)
+
+    def get_sessions(self):
+        days, chargers, arrivals = self.vehicle_arrivals.nonzero()
+        departures = self.vehicle_departures[days, chargers, arrivals]
+        state_of_charge = self.vehicle_state_of_charge[days, chargers, arrivals]
+        return days, chargers, arrivals, departures, state_of_charge
+
+    def get_scenario(self, day):
+        chargers, arrivals = self.vehicle_arrivals[day].nonzero()
+        departures = self.vehicle_departures[day, chargers, arrivals]
+        number_of_chargers = self.vehicle_arrivals.shape[1]
+
+        return Scenario(vehicle_state_of_charge=self.vehicle_state_of_charge[day].copy(),
+                        charger_occupancy=self.charger_occupancy[day].astype(float),
+                        arrivals=split_per_charger(arrivals, chargers, number_of_chargers),
+                        departures=split_per_charger(departures, chargers, number_of_chargers))
+
+
+def split_per_charger(session_values, session_chargers, number_of_chargers):
+    # Per-charger lists from session values ordered by charger
+    charger_ends = cumsum(bincount(session_chargers, minlength=number_of_chargers))[:-1]
+    return [charger_values.tolist() for charger_values in split(session_values, charger_ends)]
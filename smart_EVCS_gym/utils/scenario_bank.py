@@ -0,0 +1,171 @@
+import argparse
+import json
+import os
+import shutil
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+from numpy import random
+
+from smart_nanogrid_gym.utils.scenario import Scenario, split_per_charger
+from smart_nanogrid_gym.utils.scenario_generator import ScenarioGenerator
+from smart_nanogrid_gym.utils.time_grid import TimeGrid
+
+
+class ScenarioBank:
+    # Station-days stored as one row per charging session (charger, arrival, departure, arrival state of charge) in
+    # fixed-width .npy files, plus an offset index giving every scenario's first session row. All files are opened
+    # read-only through np.memmap, so any number of worker processes can share one bank without copying it.
+    SESSION_FILES = {
+        'session_chargers': np.int16,
+        'session_arrivals': np.int16,
+        'session_departures': np.int16,
+        'session_state_of_charge': np.float32
+    }
+
+    def __init__(self, bank_directory_path):
+        with open(os.path.join(bank_directory_path, 'metadata.json')) as metadata_file:
+            metadata = json.load(metadata_file)
+
+        self.NUMBER_OF_CHARGERS = metadata['number_of_chargers']
+        time_grid = TimeGrid(metadata['time_interval'])
+        self.TIME_INTERVAL = time_grid.time_interval
+        self.TOTAL_TIMESTEPS = time_grid.total_timesteps
+        self.ARRAY_COLUMNS = time_grid.array_columns
+
+        self.scenario_offsets = np.load(os.path.join(bank_directory_path, 'scenario_offsets.npy'), mmap_mode='r')
+        self.session_chargers = np.load(os.path.join(bank_directory_path, 'session_chargers.npy'), mmap_mode='r')
+        self.session_arrivals = np.load(os.path.join(bank_directory_path, 'session_arrivals.npy'), mmap_mode='r')
+        self.session_departures = np.load(os.path.join(bank_directory_path, 'session_departures.npy'), mmap_mode='r')
+        self.session_state_of_charge = np.load(os.path.join(bank_directory_path, 'session_state_of_charge.npy'),
+                                               mmap_mode='r')
+
+    def __len__(self):
+        return len(self.scenario_offsets) - 1
+
+    def check_compatibility(self, number_of_chargers, time_interval):
+        if self.NUMBER_OF_CHARGERS != number_of_chargers or self.TIME_INTERVAL != TimeGrid(time_interval).time_interval:
+            raise Exception(f"Scenario bank holds {self.NUMBER_OF_CHARGERS} chargers at time interval "
+                            f"{self.TIME_INTERVAL}, but {number_of_chargers} chargers at time interval "
+                            f"{time_interval} were requested.")
+
+    def draw_random_scenario_index(self, seed=None):
+        if seed is None:
+            return int(random.randint(len(self)))
+        return int(random.default_rng(seed).integers(len(self)))
+
+    def get_scenario(self, scenario_index):
+        first_session, last_session = self.scenario_offsets[scenario_index], self.scenario_offsets[scenario_index + 1]
+        chargers = self.session_chargers[first_session:last_session].astype(int)
+        arrivals = self.session_arrivals[first_session:last_session].astype(int)
+        departures = self.session_departures[first_session:last_session].astype(int)
+
+        vehicle_state_of_charge = np.zeros([self.NUMBER_OF_CHARGERS, self.ARRAY_COLUMNS])
+        vehicle_state_of_charge[chargers, arrivals] = self.session_state_of_charge[first_session:last_session]
+
+        occupancy_changes = np.zeros([self.NUMBER_OF_CHARGERS, self.ARRAY_COLUMNS + 1])
+        np.add.at(occupancy_changes, (chargers, arrivals), 1)
+        np.add.at(occupancy_changes, (chargers, np.minimum(departures, self.TOTAL_TIMESTEPS)), -1)
+        charger_occupancy = np.cumsum(occupancy_changes, axis=1)[:, :self.ARRAY_COLUMNS]
+
+        return Scenario(vehicle_state_of_charge=vehicle_state_of_charge,
+                        charger_occupancy=charger_occupancy,
+                        arrivals=split_per_charger(arrivals, chargers, self.NUMBER_OF_CHARGERS),
+                        departures=split_per_charger(departures, chargers, self.NUMBER_OF_CHARGERS))
+
+    @classmethod
+    def build(cls, bank_directory_path, number_of_scenarios, number_of_chargers=8, time_interval=1, seed=None,
+              number_of_workers=None, scenarios_per_chunk=10000, arrival_model=None, dwell_time_model=None,
+              state_of_charge_model=None):
+        os.makedirs(bank_directory_path, exist_ok=True)
+        chunks_directory_path = os.path.join(bank_directory_path, 'chunks')
+        os.makedirs(chunks_directory_path, exist_ok=True)
+
+        chunk_sizes = [min(scenarios_per_chunk, number_of_scenarios - first_scenario)
+                       for first_scenario in range(0, number_of_scenarios, scenarios_per_chunk)]
+        chunk_seeds = random.SeedSequence(seed).spawn(len(chunk_sizes))
+        chunk_arguments = [
+            (os.path.join(chunks_directory_path, str(chunk)), chunk_size,
+             ScenarioGenerator(number_of_chargers, time_interval, arrival_model, dwell_time_model,
+                               state_of_charge_model, seed=chunk_seeds[chunk]))
+            for chunk, chunk_size in enumerate(chunk_sizes)
+        ]
+
+        with Pool(number_of_workers or cpu_count()) as pool:
+            chunk_paths = pool.map(generate_scenario_bank_chunk, chunk_arguments)
+
+        cls.merge_chunks(bank_directory_path, chunk_paths)
+        shutil.rmtree(chunks_directory_path)
+
+        with open(os.path.join(bank_directory_path, 'metadata.json'), 'w') as metadata_file:
+            json.dump({
+                'number_of_scenarios': number_of_scenarios,
+                'number_of_chargers': number_of_chargers,
+                'time_interval': time_interval,
+                'seed': seed
+            }, metadata_file)
+
+        return cls(bank_directory_path)
+
+    @classmethod
+    def merge_chunks(cls, bank_directory_path, chunk_paths):
+        chunk_offsets = [np.load(os.path.join(chunk_path, 'scenario_offsets.npy')) for chunk_path in chunk_paths]
+        total_scenarios = sum(len(offsets) - 1 for offsets in chunk_offsets)
+        total_sessions = sum(int(offsets[-1]) for offsets in chunk_offsets)
+
+        scenario_offsets = np.lib.format.open_memmap(os.path.join(bank_directory_path, 'scenario_offsets.npy'),
+                                                     mode='w+', dtype=np.int64, shape=(total_scenarios + 1,))
+        first_scenario, first_session = 0, 0
+        for offsets in chunk_offsets:
+            scenario_offsets[first_scenario:first_scenario + len(offsets)] = offsets + first_session
+            first_scenario += len(offsets) - 1
+            first_session += int(offsets[-1])
+        scenario_offsets.flush()
+
+        for file_name, dtype in cls.SESSION_FILES.items():
+            merged_values = np.lib.format.open_memmap(os.path.join(bank_directory_path, file_name + '.npy'),
+                                                      mode='w+', dtype=dtype, shape=(total_sessions,))
+            first_session = 0
+            for chunk_path in chunk_paths:
+                chunk_values = np.load(os.path.join(chunk_path, file_name + '.npy'))
+                merged_values[first_session:first_session + len(chunk_values)] = chunk_values
+                first_session += len(chunk_values)
+            merged_values.flush()
+            del merged_values
+
+
+def generate_scenario_bank_chunk(arguments):
+    chunk_path, number_of_scenarios, scenario_generator = arguments
+    days, chargers, arrivals, departures, state_of_charge = \
+        scenario_generator.generate_scenario_batch(number_of_scenarios).get_sessions()
+
+    scenario_offsets = np.zeros(number_of_scenarios + 1, dtype=np.int64)
+    scenario_offsets[1:] = np.cumsum(np.bincount(days, minlength=number_of_scenarios))
+    sessions = {
+        'session_chargers': chargers,
+        'session_arrivals': arrivals,
+        'session_departures': departures,
+        'session_state_of_charge': state_of_charge
+    }
+
+    os.makedirs(chunk_path, exist_ok=True)
+    np.save(os.path.join(chunk_path, 'scenario_offsets.npy'), scenario_offsets)
+    for file_name, dtype in ScenarioBank.SESSION_FILES.items():
+        np.save(os.path.join(chunk_path, file_name + '.npy'), sessions[file_name].astype(dtype))
+    return chunk_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", required=True)
+    parser.add_argument("--scenarios", default=1000000, type=int)
+    parser.add_argument("--chargers", default=8, type=int)
+    parser.add_argument("--time_interval", default=1, type=float)
+    parser.add_argument("--seed", default=None, type=int)
+    parser.add_argument("--workers", default=None, type=int)
+    parser.add_argument("--chunk_size", default=10000, type=int)
+    args = parser.parse_args()
+
+    scenario_bank = ScenarioBank.build(args.path, args.scenarios, args.chargers, args.time_interval, args.seed,
+                                       args.workers, args.chunk_size)
+    print(f"Built scenario bank with {len(scenario_bank)} scenarios in {args.path}")
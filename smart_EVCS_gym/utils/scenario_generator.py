@@ -0,0 +1,77 @@
+import numpy as np
+
+from smart_nanogrid_gym.utils.arrival_models import BernoulliArrivalModel, UniformDwellTimeModel, \
+    UniformStateOfChargeModel
+from smart_nanogrid_gym.utils.scenario import ScenarioBatch
+from smart_nanogrid_gym.utils.time_grid import TimeGrid
+
+
+class ScenarioGenerator:
+    def __init__(self, number_of_chargers, time_interval, arrival_model=None, dwell_time_model=None,
+                 state_of_charge_model=None, seed=None):
+        self.NUMBER_OF_CHARGERS = number_of_chargers
+        time_grid = TimeGrid(time_interval)
+        self.TIME_INTERVAL = time_grid.time_interval
+        self.TOTAL_TIMESTEPS = time_grid.total_timesteps
+        self.ARRAY_COLUMNS = time_grid.array_columns
+
+        self.arrival_model = arrival_model or BernoulliArrivalModel()
+        self.dwell_time_model = dwell_time_model or UniformDwellTimeModel()
+        self.state_of_charge_model = state_of_charge_model or UniformStateOfChargeModel()
+        self.random_generator = np.random.default_rng(seed)
+
+    def generate_scenario_batch(self, number_of_days, random_generators=None):
+        # All random numbers for arrivals, dwell times and state of charge are drawn in one call, timestep-major so
+        # that every step of the walk over the day reads contiguous (days, chargers) slices. The walk itself is the
+        # only sequential part, because a charger only accepts a new vehicle one timestep after the previous one
+        # departed.
+        slice_shape = (number_of_days, self.NUMBER_OF_CHARGERS)
+        arrival_draws, departure_draws, state_of_charge_draws = self.draw_random_numbers(number_of_days,
+                                                                                         random_generators)
+
+        vehicle_arrivals = np.zeros((self.TOTAL_TIMESTEPS,) + slice_shape, dtype=bool)
+        vehicle_departures = np.zeros((self.TOTAL_TIMESTEPS,) + slice_shape, dtype=np.int16)
+        charger_occupancy = np.zeros((self.TOTAL_TIMESTEPS,) + slice_shape, dtype=bool)
+        charger_free_from = np.zeros(slice_shape, dtype=np.int16)
+
+        for timestep in range(self.TOTAL_TIMESTEPS):
+            vehicle_arriving = np.logical_and(
+                self.arrival_model.calculate_arrivals(arrival_draws[timestep], timestep, self.TIME_INTERVAL),
+                charger_free_from <= timestep,
+                out=vehicle_arrivals[timestep]
+            )
+            departures = self.dwell_time_model.calculate_departures(departure_draws[timestep], timestep,
+                                                                    self.TOTAL_TIMESTEPS, self.TIME_INTERVAL)
+            np.copyto(vehicle_departures[timestep], departures, where=vehicle_arriving, casting='unsafe')
+            np.copyto(charger_free_from, vehicle_departures[timestep] + 1, where=vehicle_arriving, casting='unsafe')
+            np.less(timestep + 1, charger_free_from, out=charger_occupancy[timestep])
+
+        vehicle_state_of_charge = np.where(
+            vehicle_arrivals, self.state_of_charge_model.calculate_state_of_charge(state_of_charge_draws), 0.0)
+
+        return ScenarioBatch(vehicle_arrivals=self.convert_to_day_major(vehicle_arrivals),
+                             vehicle_departures=self.convert_to_day_major(vehicle_departures),
+                             vehicle_state_of_charge=self.convert_to_day_major(vehicle_state_of_charge),
+                             charger_occupancy=self.convert_to_day_major(charger_occupancy))
+
+    def draw_random_numbers(self, number_of_days, random_generators):
+        # Either all days from the generator's own stream, or day d from random_generators[d]. A day drawn on its own
+        # reads the same numbers in both cases, so generate_scenario(random_generator) gives that day's scenario.
+        if random_generators is None:
+            return self.random_generator.random((3, self.TOTAL_TIMESTEPS, number_of_days, self.NUMBER_OF_CHARGERS),
+                                                dtype=np.float32)
+        if len(random_generators) != number_of_days:
+            raise Exception(f"{len(random_generators)} random generators were given for {number_of_days} days.")
+        return np.stack([random_generator.random((3, self.TOTAL_TIMESTEPS, self.NUMBER_OF_CHARGERS), dtype=np.float32)
+                         for random_generator in random_generators], axis=2)
+
+    def convert_to_day_major(self, timestep_major_values):
+        number_of_days = timestep_major_values.shape[1]
+        day_major_values = np.zeros((number_of_days, self.NUMBER_OF_CHARGERS, self.ARRAY_COLUMNS),
+                                    dtype=timestep_major_values.dtype)
+        day_major_values[:, :, :self.TOTAL_TIMESTEPS] = timestep_major_values.transpose(1, 2, 0)
+        return day_major_values
+
+    def generate_scenario(self, random_generator=None):
+        random_generators = None if random_generator is None else [random_generator]
+        return self.generate_scenario_batch(1, random_generators).get_scenario(0)
@@ -0,0 +1,42 @@
+import os
+import tempfile
+
+import numpy as np
+
+
+class SharedDataRegistry:
+    # Read-only tables (solar irradiance, tariffs) that every environment of a training run needs. The first process
+    # that asks for a table builds it and publishes it as a .npy file in the registry directory, every process then
+    # maps that file read-only, so all workers share one copy through the page cache instead of each parsing the
+    # source data again. Tables are also kept per process, so environments of one process reuse the same array. The
+    # modification times of the files a table is built from are part of its file name, so editing the source data
+    # never serves a stale table.
+    def __init__(self, registry_directory_path=None):
+        self.registry_directory_path = registry_directory_path or os.environ.get(
+            'SMART_NANOGRID_GYM_REGISTRY', os.path.join(tempfile.gettempdir(), 'smart_nanogrid_gym_tables'))
+        self.tables = {}
+
+    def get_table(self, table_name, build_table, source_file_paths=()):
+        if table_name not in self.tables:
+            source_versions = [str(os.stat(source_file_path).st_mtime_ns) for source_file_path in source_file_paths]
+            table_file_name = '_'.join([table_name] + source_versions) + '.npy'
+            table_path = os.path.join(self.registry_directory_path, table_file_name)
+            if not os.path.exists(table_path):
+                self.publish_table(table_path, build_table())
+            self.tables[table_name] = np.load(table_path, mmap_mode='r')
+        return self.tables[table_name]
+
+    def publish_table(self, table_path, table):
+        # Written under a process-unique name and renamed into place, so workers building the same table at the same
+        # time never see a partially written file.
+        os.makedirs(self.registry_directory_path, exist_ok=True)
+        temporary_table_path = f'{table_path}.{os.getpid()}.tmp'
+        with open(temporary_table_path, 'wb') as table_file:
+            np.save(table_file, np.asarray(table))
+        os.replace(temporary_table_path, table_path)
+
+    def clear(self):
+        self.tables.clear()
+
+
+shared_data_registry = SharedDataRegistry()
@@ -0,0 +1,315 @@
+import types
+from typing import NamedTuple
+
+import numpy as np
+
+from smart_nanogrid_gym.utils.battery_bank import BatteryBank
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# One step of a nanogrid day as a pure function step(state, actions, parameters) -> (state, reward, observations)
+# over plain NumPy arrays. It follows the same rules as Charger/ChargerFleet, BatteryEnergyStorageSystem and
+# CentralManagementSystem, but never changes its input state: the returned state holds a new vehicle state of charge
+# array and shares every other array with the input. The same source runs as plain NumPy ('numpy') or compiled with
+# Numba ('numba'). Compilation is cached on disk next to this module, so only the first process pays for it.
+# StepKernel.step() and observe() unpack the named tuples in Python and call the kernel with one argument per field,
+# as Numba types a named tuple argument several times slower than the whole step takes.
+STEP_RESULT_NAMES = ('Total cost', 'Grid power', 'Grid energy', 'Utilized solar energy',
+                     'Insufficiently charged vehicles penalty', 'Battery state of charge', 'Grid energy cost')
+
+
+class KernelParameters(NamedTuple):
+    # Constant over the lifetime of an environment
+    time_interval: float
+    number_of_chargers: int
+    observation_size: int
+    vehicle_battery_capacity: float
+    vehicle_max_charging_power: float
+    vehicle_max_discharging_power: float
+    battery_system_available: bool
+    battery_max_capacity: float
+    battery_max_charging_power: float
+    battery_max_discharging_power: float
+    battery_charging_efficiency: float
+    battery_discharging_efficiency: float
+    battery_depth_of_discharge: float
+    vehicle_to_everything: bool
+    # Per timestep, zeros without a PV system
+    available_solar_power: np.ndarray
+
+
+class KernelState(NamedTuple):
+    timestep: int
+    # (chargers, array columns)
+    vehicle_state_of_charge: np.ndarray
+    charger_occupancy: np.ndarray
+    vehicle_arriving: np.ndarray
+    time_until_departure: np.ndarray
+    battery_state_of_charge: float
+    # Per timestep of the episode
+    energy_price: np.ndarray
+    disturbance_observations: np.ndarray
+    # STEP_RESULT_NAMES of the last step
+    step_results: tuple
+
+
+def create_kernel_parameters(environment):
+    electric_vehicle = environment.charging_station.electric_vehicle_info
+    battery_system = environment.central_management_system.battery_system
+    if isinstance(battery_system, BatteryBank):
+        raise Exception("The step kernel simulates a single battery unit, use step_kernel_backend='off' for "
+                        "several battery units.")
+    if environment.PV_SYSTEM_AVAILABLE_IN_MODEL:
+        available_solar_power = environment.pv_system_manager.get_available_solar_produced_power(
+            environment.TIME_INTERVAL)[0, :]
+    else:
+        available_solar_power = np.zeros(environment.TOTAL_TIMESTEPS)
+
+    return KernelParameters(
+        time_interval=float(environment.TIME_INTERVAL),
+        number_of_chargers=int(environment.NUMBER_OF_CHARGERS),
+        observation_size=int(environment.observation_layout.size),
+        vehicle_battery_capacity=float(electric_vehicle.battery_capacity),
+        vehicle_max_charging_power=float(electric_vehicle.max_charging_power),
+        vehicle_max_discharging_power=float(electric_vehicle.max_discharging_power),
+        battery_system_available=battery_system is not None,
+        battery_max_capacity=float(battery_system.max_capacity) if battery_system else 0.0,
+        battery_max_charging_power=float(battery_system.max_charging_power) if battery_system else 0.0,
+        battery_max_discharging_power=float(battery_system.max_discharging_power) if battery_system else 0.0,
+        battery_charging_efficiency=float(battery_system.charging_efficiency) if battery_system else 1.0,
+        battery_discharging_efficiency=float(battery_system.discharging_efficiency) if battery_system else 1.0,
+        battery_depth_of_discharge=float(battery_system.depth_of_discharge) if battery_system else 0.0,
+        vehicle_to_everything=bool(environment.VEHICLE_TO_EVERYTHING),
+        available_solar_power=np.ascontiguousarray(available_solar_power, dtype=np.float64)
+    )
+
+
+def create_kernel_state(charging_station, battery_state_of_charge, energy_price, disturbance_observations):
+    # State at the first timestep of the episode loaded into the charging station
+    event_calendar = charging_station.event_calendar
+    return KernelState(
+        timestep=0,
+        vehicle_state_of_charge=np.array(charging_station.vehicle_state_of_charge, dtype=np.float64),
+        charger_occupancy=np.ascontiguousarray(charging_station.charger_occupancy == 1),
+        vehicle_arriving=np.ascontiguousarray(event_calendar.vehicle_arriving, dtype=np.bool_),
+        time_until_departure=np.ascontiguousarray(event_calendar.time_until_departure, dtype=np.int64),
+        battery_state_of_charge=float(battery_state_of_charge),
+        energy_price=np.ascontiguousarray(energy_price, dtype=np.float64),
+        disturbance_observations=np.ascontiguousarray(disturbance_observations, dtype=np.float32),
+        step_results=(0.0,) * len(STEP_RESULT_NAMES)
+    )
+
+
+def charge_vehicles(timestep, vehicle_state_of_charge, charger_occupancy, vehicle_arriving, charger_actions,
+                    parameters):
+    vehicle_state_of_charge = vehicle_state_of_charge.copy()
+    occupied = charger_occupancy[:, timestep]
+
+    # A vehicle that arrives at this timestep starts from its arrival state of charge, any other from the state
+    # of charge it reached in the previous timestep
+    previous_state_of_charge = np.where(vehicle_arriving[:, timestep], vehicle_state_of_charge[:, timestep],
+                                        vehicle_state_of_charge[:, timestep - 1])
+    charging = charger_actions >= 0
+    max_power = np.where(charging, parameters.vehicle_max_charging_power,
+                         parameters.vehicle_max_discharging_power)
+    power_left = np.where(charging, 1 - previous_state_of_charge, previous_state_of_charge) * \
+        parameters.vehicle_battery_capacity / parameters.time_interval
+    charger_power_values = np.where(occupied, charger_actions * np.minimum(max_power, power_left), 0.0)
+
+    vehicle_state_of_charge[:, timestep] = np.where(
+        occupied,
+        previous_state_of_charge + (charger_power_values * parameters.time_interval) /
+        parameters.vehicle_battery_capacity,
+        vehicle_state_of_charge[:, timestep])
+
+    total_charging_power = charger_power_values[charger_power_values > 0].sum()
+    total_discharging_power = charger_power_values[charger_power_values < 0].sum()
+    return vehicle_state_of_charge, total_charging_power, total_discharging_power
+
+
+def calculate_battery_state_of_charge_change(power, parameters):
+    if power > 0:
+        return (power * parameters.time_interval * parameters.battery_charging_efficiency) / \
+            parameters.battery_max_capacity
+    return (power * parameters.time_interval / parameters.battery_discharging_efficiency) / \
+        parameters.battery_max_capacity
+
+
+def discharge_battery(power_demand, battery_state_of_charge, battery_action, parameters):
+    battery_penalty = battery_action if battery_action > 0 else 0.0
+    capacity_available_to_discharge = battery_state_of_charge - parameters.battery_depth_of_discharge
+    if capacity_available_to_discharge <= 0:
+        return power_demand, battery_state_of_charge, battery_penalty
+
+    power_available_for_discharge = (capacity_available_to_discharge * parameters.battery_max_capacity *
+                                     parameters.battery_discharging_efficiency) / parameters.time_interval
+    discharging_power = battery_action * min(parameters.battery_max_discharging_power,
+                                             power_available_for_discharge)
+    remaining_demand = power_demand + discharging_power
+    if remaining_demand < 0:
+        discharging_power = battery_action * power_demand
+        remaining_demand = 0.0
+
+    battery_state_of_charge += calculate_battery_state_of_charge_change(discharging_power, parameters)
+    return remaining_demand, battery_state_of_charge, battery_penalty
+
+
+def charge_battery(available_power, battery_state_of_charge, battery_action, parameters):
+    battery_penalty = -battery_action if battery_action < 0 else 0.0
+    capacity_available_to_charge = 1 - battery_state_of_charge
+    if capacity_available_to_charge <= 0:
+        return available_power, battery_state_of_charge, battery_penalty
+
+    power_available_for_charge = (capacity_available_to_charge * parameters.battery_max_capacity) / \
+        (parameters.time_interval * parameters.battery_charging_efficiency)
+    charging_power = battery_action * min(parameters.battery_max_charging_power, power_available_for_charge)
+    remaining_available_power = available_power - charging_power
+    if remaining_available_power < 0:
+        charging_power = battery_action * available_power
+        remaining_available_power = 0.0
+
+    battery_state_of_charge += calculate_battery_state_of_charge_change(charging_power, parameters)
+    return remaining_available_power, battery_state_of_charge, battery_penalty
+
+
+def calculate_grid_power(power_demand, available_solar_power, battery_state_of_charge, battery_action,
+                         parameters):
+    # Returns the grid power, the new battery state of charge and the battery penalty
+    remaining_power_demand = power_demand - available_solar_power
+    use_battery = parameters.battery_system_available and battery_action != 0
+
+    if remaining_power_demand == 0:
+        return 0.0, battery_state_of_charge, 0.0
+    elif remaining_power_demand > 0:
+        if use_battery:
+            return discharge_battery(remaining_power_demand, battery_state_of_charge, battery_action, parameters)
+        return remaining_power_demand, battery_state_of_charge, 0.0
+
+    available_power = available_solar_power - power_demand
+    battery_penalty = 0.0
+    if use_battery:
+        available_power, battery_state_of_charge, battery_penalty = charge_battery(
+            available_power, battery_state_of_charge, battery_action, parameters)
+    if parameters.vehicle_to_everything:
+        return -available_power, battery_state_of_charge, battery_penalty
+    return 0.0, battery_state_of_charge, battery_penalty
+
+
+def calculate_insufficiently_charged_penalty(timestep, vehicle_state_of_charge, charger_occupancy,
+                                             time_until_departure, parameters):
+    # Vehicles leaving at the end of the last observed timestep, which is the previous one except for the first
+    # step of an episode that follows the observation of reset(), charged up to the previous timestep
+    observed_timestep = max(timestep - 1, 0)
+    departing_vehicles = charger_occupancy[:, observed_timestep] & \
+        (time_until_departure[:, observed_timestep] == 1)
+    uncharged_capacity = 1 - vehicle_state_of_charge[:, timestep - 1][departing_vehicles]
+    return ((uncharged_capacity * 2) ** 2).sum()
+
+
+def observe_arrays(timestep, vehicle_state_of_charge, time_until_departure, battery_state_of_charge,
+                   disturbance_observations, parameters):
+    number_of_chargers = parameters.number_of_chargers
+    observations = np.zeros(parameters.observation_size, dtype=np.float32)
+    disturbances_size = disturbance_observations.shape[1]
+    departure_times_start = disturbances_size + number_of_chargers
+    departure_times_end = departure_times_start + number_of_chargers
+
+    observations[:disturbances_size] = disturbance_observations[timestep]
+    observations[disturbances_size:departure_times_start] = vehicle_state_of_charge[:, timestep]
+    observations[departure_times_start:departure_times_end] = time_until_departure[:, timestep] * \
+        parameters.time_interval
+    observations[departure_times_start:departure_times_end] /= 24
+    if parameters.battery_system_available:
+        observations[departure_times_end] = battery_state_of_charge
+    return observations
+
+
+def step_arrays(timestep, vehicle_state_of_charge, charger_occupancy, vehicle_arriving, time_until_departure,
+                battery_state_of_charge, energy_price, disturbance_observations, actions, time_interval,
+                number_of_chargers, observation_size, vehicle_battery_capacity, vehicle_max_charging_power,
+                vehicle_max_discharging_power, battery_system_available, battery_max_capacity,
+                battery_max_charging_power, battery_max_discharging_power, battery_charging_efficiency,
+                battery_discharging_efficiency, battery_depth_of_discharge, vehicle_to_everything,
+                available_solar_power):
+    parameters = KernelParameters(time_interval, number_of_chargers, observation_size, vehicle_battery_capacity,
+                                  vehicle_max_charging_power, vehicle_max_discharging_power,
+                                  battery_system_available, battery_max_capacity, battery_max_charging_power,
+                                  battery_max_discharging_power, battery_charging_efficiency,
+                                  battery_discharging_efficiency, battery_depth_of_discharge, vehicle_to_everything,
+                                  available_solar_power)
+    vehicle_state_of_charge, total_charging_power, total_discharging_power = charge_vehicles(
+        timestep, vehicle_state_of_charge, charger_occupancy, vehicle_arriving, actions[:number_of_chargers],
+        parameters)
+
+    battery_action = actions[number_of_chargers] if battery_system_available else 0.0
+    grid_power, battery_state_of_charge, battery_penalty = calculate_grid_power(
+        total_charging_power + total_discharging_power, available_solar_power[timestep], battery_state_of_charge,
+        battery_action, parameters)
+    grid_energy = grid_power * time_interval
+    grid_energy_cost = grid_energy * energy_price[timestep]
+    insufficiently_charged_vehicles_penalty = calculate_insufficiently_charged_penalty(
+        timestep, vehicle_state_of_charge, charger_occupancy, time_until_departure, parameters)
+    total_cost = grid_energy_cost + (insufficiently_charged_vehicles_penalty + battery_penalty)
+
+    # The observation after a step still shows its timestep, with the state of charge reached in it
+    observations = observe_arrays(timestep, vehicle_state_of_charge, time_until_departure,
+                                  battery_state_of_charge, disturbance_observations, parameters)
+    step_results = (total_cost, grid_power, grid_energy, available_solar_power[timestep],
+                    insufficiently_charged_vehicles_penalty, battery_state_of_charge, grid_energy_cost)
+    return vehicle_state_of_charge, battery_state_of_charge, step_results, observations
+
+
+KERNEL_FUNCTIONS = (charge_vehicles, calculate_battery_state_of_charge_change, discharge_battery, charge_battery,
+                    calculate_grid_power, calculate_insufficiently_charged_penalty, observe_arrays, step_arrays)
+
+
+def compile_kernel_functions():
+    # Compiled copies of the kernel functions that look each other up in a globals dict of compiled copies, so the
+    # compiled functions call each other compiled, and the plain ones stay plain
+    compiled_globals = dict(globals())
+    for function in KERNEL_FUNCTIONS:
+        compiled_globals[function.__name__] = numba.njit(cache=True)(
+            types.FunctionType(function.__code__, compiled_globals, function.__name__))
+    return compiled_globals['step_arrays'], compiled_globals['observe_arrays']
+
+
+class StepKernel:
+    def __init__(self, backend, step_arrays_function, observe_arrays_function):
+        self.backend = backend
+        self.step_arrays = step_arrays_function
+        self.observe_arrays = observe_arrays_function
+
+    def step(self, state, actions, parameters):
+        vehicle_state_of_charge, battery_state_of_charge, step_results, observations = self.step_arrays(
+            state.timestep, state.vehicle_state_of_charge, state.charger_occupancy, state.vehicle_arriving,
+            state.time_until_departure, state.battery_state_of_charge, state.energy_price,
+            state.disturbance_observations, actions, *parameters)
+        next_state = KernelState(state.timestep + 1, vehicle_state_of_charge, state.charger_occupancy,
+                                 state.vehicle_arriving, state.time_until_departure, battery_state_of_charge,
+                                 state.energy_price, state.disturbance_observations, step_results)
+        return next_state, -step_results[0], observations
+
+    def observe(self, state, parameters):
+        return self.observe_arrays(state.timestep, state.vehicle_state_of_charge, state.time_until_departure,
+                                   state.battery_state_of_charge, state.disturbance_observations, parameters)
+
+
+compiled_kernel_functions = None
+
+
+def create_step_kernel(backend):
+    global compiled_kernel_functions
+    if backend == 'numpy':
+        return StepKernel(backend, step_arrays, observe_arrays)
+    elif backend == 'numba':
+        if numba is None:
+            raise Exception("Step kernel backend 'numba' needs the numba package, install it or use 'numpy'.")
+        # Built once per process, compiled on the first call or loaded from the on-disk cache
+        if compiled_kernel_functions is None:
+            compiled_kernel_functions = compile_kernel_functions()
+        return StepKernel(backend, *compiled_kernel_functions)
+    else:
+        raise Exception(f"Unknown step kernel backend '{backend}', expected 'numpy' or 'numba'.")
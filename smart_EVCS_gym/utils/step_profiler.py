@@ -0,0 +1,164 @@
+import json
+import os
+import time
+
+# Phases are timed as laps: start() marks the beginning of a step or reset, every lap(phase) records the time since
+# the previous mark under that phase, and finish(name) records the whole call. Phase names are '<call>.<phase>',
+# e.g. 'step.charging', so a Chrome trace shows the phases nested under their call.
+
+
+class StepProfiler:
+    # Times nothing. Every hook is an empty method, so an environment that is not profiled only pays a few calls per
+    # step.
+    def start(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+    def finish(self, name):
+        pass
+
+
+class TimingStepProfiler(StepProfiler):
+    # Call count, cumulative time and a histogram of durations per phase, kept as one [calls, total nanoseconds,
+    # histogram] list per phase so that recording a lap is a single dict lookup. Histogram bucket b counts durations
+    # of 2 ** (b - 1) to 2 ** b nanoseconds, which keeps the cost of recording constant however long the run.
+    HISTOGRAM_BUCKETS = 64
+
+    def __init__(self):
+        self.process_id = os.getpid()
+        self.phase_timings = {}
+        self.start_nanoseconds = 0
+        self.lap_nanoseconds = 0
+
+    def start(self):
+        self.start_nanoseconds = self.lap_nanoseconds = time.perf_counter_ns()
+
+    def lap(self, phase):
+        now = time.perf_counter_ns()
+        self.record(phase, self.lap_nanoseconds, now - self.lap_nanoseconds)
+        self.lap_nanoseconds = now
+
+    def finish(self, name):
+        self.record(name, self.start_nanoseconds, time.perf_counter_ns() - self.start_nanoseconds)
+
+    def record(self, phase, start_nanoseconds, duration_nanoseconds):
+        phase_timing = self.phase_timings.get(phase)
+        if phase_timing is None:
+            phase_timing = self.phase_timings[phase] = [0, 0, [0] * self.HISTOGRAM_BUCKETS]
+        phase_timing[0] += 1
+        phase_timing[1] += duration_nanoseconds
+        phase_timing[2][duration_nanoseconds.bit_length()] += 1
+
+    def reset(self):
+        self.phase_timings.clear()
+
+    def get_report(self):
+        # One flat row per phase, percentiles read from the histogram as the upper bound of their bucket
+        return {
+            phase: {
+                'calls': calls,
+                'total_ms': total_nanoseconds / 1e6,
+                'mean_us': total_nanoseconds / calls / 1e3,
+                'p50_us': self.get_percentile(histogram, calls, 0.5) / 1e3,
+                'p99_us': self.get_percentile(histogram, calls, 0.99) / 1e3
+            }
+            for phase, (calls, total_nanoseconds, histogram) in sorted(self.phase_timings.items())
+        }
+
+    @staticmethod
+    def get_percentile(histogram, calls, fraction):
+        counted = 0
+        for bucket, count in enumerate(histogram):
+            counted += count
+            if counted >= fraction * calls:
+                return 2 ** bucket
+        return 2 ** (len(histogram) - 1)
+
+    def format_report(self):
+        lines = [f"{'phase':<40}{'calls':>10}{'total ms':>12}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}"]
+        for phase, row in self.get_report().items():
+            lines.append(f"{phase:<40}{row['calls']:>10}{row['total_ms']:>12.1f}{row['mean_us']:>10.1f}"
+                         f"{row['p50_us']:>10.1f}{row['p99_us']:>10.1f}")
+        return '\n'.join(lines)
+
+    def save_report(self, file_path):
+        with open(file_path, 'w') as report_file:
+            json.dump(self.get_report(), report_file, indent=2)
+
+    def merge(self, profiler):
+        for phase, (calls, total_nanoseconds, histogram) in profiler.phase_timings.items():
+            phase_timing = self.phase_timings.setdefault(phase, [0, 0, [0] * self.HISTOGRAM_BUCKETS])
+            phase_timing[0] += calls
+            phase_timing[1] += total_nanoseconds
+            phase_timing[2] = [count + other_count for count, other_count in zip(phase_timing[2], histogram)]
+
+
+class TraceStepProfiler(TimingStepProfiler):
+    # Also keeps every timed phase as an event for a Chrome trace (chrome://tracing or Perfetto). Events past
+    # max_trace_events are counted but not kept, so a long run cannot exhaust memory.
+    def __init__(self, max_trace_events=1000000):
+        super().__init__()
+        self.max_trace_events = max_trace_events
+        self.trace_events = []
+        self.dropped_trace_events = 0
+
+    def record(self, phase, start_nanoseconds, duration_nanoseconds):
+        super().record(phase, start_nanoseconds, duration_nanoseconds)
+        if len(self.trace_events) < self.max_trace_events:
+            self.trace_events.append((phase, start_nanoseconds, duration_nanoseconds, self.process_id))
+        else:
+            self.dropped_trace_events += 1
+
+    def reset(self):
+        super().reset()
+        self.trace_events.clear()
+        self.dropped_trace_events = 0
+
+    def merge(self, profiler):
+        super().merge(profiler)
+        if isinstance(profiler, TraceStepProfiler):
+            self.trace_events.extend(profiler.trace_events)
+            self.dropped_trace_events += profiler.dropped_trace_events
+
+    def save_chrome_trace(self, file_path):
+        # perf_counter_ns is system wide, so events of merged worker profilers line up on one time axis
+        first_nanoseconds = min((event[1] for event in self.trace_events), default=0)
+        with open(file_path, 'w') as trace_file:
+            json.dump({
+                'traceEvents': [
+                    {'name': phase, 'cat': phase.split('.')[0], 'ph': 'X', 'pid': process_id, 'tid': process_id,
+                     'ts': (start_nanoseconds - first_nanoseconds) / 1e3, 'dur': duration_nanoseconds / 1e3}
+                    for phase, start_nanoseconds, duration_nanoseconds, process_id in self.trace_events
+                ],
+                'otherData': {'dropped_trace_events': self.dropped_trace_events}
+            }, trace_file)
+
+
+def create_step_profiler(mode, **options):
+    if mode == 'off':
+        return StepProfiler()
+    elif mode == 'timing':
+        if options:
+            raise Exception(f"The 'timing' step profiler takes no options, got {sorted(options)}; max_trace_events "
+                            f"is an option of the 'trace' step profiler.")
+        return TimingStepProfiler()
+    elif mode == 'trace':
+        return TraceStepProfiler(**options)
+    else:
+        raise Exception(f"Unknown step profiler mode '{mode}', expected 'off', 'timing' or 'trace'.")
+
+
+def merge_step_profilers(profilers):
+    # Combines the profilers of several environments, e.g. vec_env.get_attr('step_profiler') of a SubprocVecEnv
+    # whose workers each return a copy of theirs. The same profiler listed more than once is counted once.
+    unique_profilers = list({id(profiler): profiler for profiler in profilers
+                             if isinstance(profiler, TimingStepProfiler)}.values())
+    if any(isinstance(profiler, TraceStepProfiler) for profiler in unique_profilers):
+        merged_profiler = TraceStepProfiler(max_trace_events=float('inf'))
+    else:
+        merged_profiler = TimingStepProfiler()
+    for profiler in unique_profilers:
+        merged_profiler.merge(profiler)
+    return merged_profiler
@@ -0,0 +1,150 @@
+import argparse
+
+import numpy as np
+
+from smart_nanogrid_gym.utils.config import data_files_directory_path
+from smart_nanogrid_gym.utils.shared_data_registry import shared_data_registry
+from smart_nanogrid_gym.utils.time_grid import TimeGrid
+
+
+class TariffEngine:
+    # Energy price tables with one row per predicted day, holding the prices of that day followed by the prices of
+    # the next day at every timestep of the time grid.
+    #   0-4  fixed daily tariffs, repeated for both days. Their tables are built once per (model, days, time
+    #        interval) and shared through the registry, so a reset only looks them up.
+    #   5    every day follows one of the tariffs 1-4, drawn at random for each table
+    #   6    consecutive days of a historical day-ahead price series, starting at a random day of the series
+    GRID_TARIFF_HIGH = 0.028
+    GRID_TARIFF_LOW = 0.013333333
+    ENERGY_TARIFF_HIGH = 0.148933333
+    ENERGY_TARIFF_LOW = 0.087613333
+    RES_INCENTIVE = 0.014
+
+    HOURLY_TARIFFS = {
+        # low high
+        1: [0.05, 0.05, 0.05, 0.05, 0.05, 0.05, 0.05, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1,
+            0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.05, 0.05, 0.05, 0.05],
+        # dynamic
+        2: [0.05, 0.05, 0.05, 0.05, 0.05, 0.06, 0.07, 0.08, 0.09, 0.1, 0.1, 0.1, 0.08, 0.06,
+            0.05, 0.05, 0.05, 0.06, 0.06, 0.06, 0.06, 0.05, 0.05, 0.05],
+        # dynamic
+        3: [0.071, 0.060, 0.056, 0.056, 0.056, 0.060, 0.060, 0.060, 0.066, 0.066, 0.076, 0.080,
+            0.080, 0.1, 0.1, 0.076, 0.076, 0.1, 0.082, 0.080, 0.085, 0.079, 0.086, 0.070],
+        # dynamic
+        4: [0.1, 0.1, 0.05, 0.05, 0.05, 0.05, 0.05, 0.08, 0.08, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1,
+            0.1, 0.1, 0.06, 0.06, 0.06, 0.1, 0.1, 0.1, 0.1]
+    }
+    MIXED_PRICE_MODEL = 5
+    HISTORICAL_PRICE_MODEL = 6
+
+    def __init__(self, time_interval, historical_prices_path=None, seed=None, number_of_days_to_predict=1):
+        # A price table of number_of_days_to_predict days also holds the day after them
+        self.time_grid = TimeGrid(time_interval)
+        self.historical_price_series = HistoricalPriceSeries(historical_prices_path, number_of_days_to_predict + 1) \
+            if historical_prices_path else None
+        self.random_generator = np.random.default_rng(seed)
+
+    def varies_per_episode(self, price_model):
+        return price_model in (self.MIXED_PRICE_MODEL, self.HISTORICAL_PRICE_MODEL)
+
+    def get_energy_price(self, price_model, number_of_days, first_day=None, random_generator=None):
+        # Random price models draw from random_generator if given, otherwise from the engine's own stream
+        if random_generator is None:
+            random_generator = self.random_generator
+        if price_model == self.MIXED_PRICE_MODEL:
+            tariffs = random_generator.integers(len(self.HOURLY_TARIFFS), size=number_of_days + 1)
+            return self.join_consecutive_days(self.get_tariff_prices()[tariffs])
+
+        if price_model == self.HISTORICAL_PRICE_MODEL:
+            if self.historical_price_series is None:
+                raise Exception(f"Price model {price_model} needs a historical price series, pass "
+                                f"historical_prices_path to the environment.")
+            if first_day is None:
+                last_first_day = self.historical_price_series.number_of_days - number_of_days - 1
+                if last_first_day < 0:
+                    raise Exception(f"A price table of {number_of_days} days needs {number_of_days + 1} days of "
+                                    f"historical prices, the series has "
+                                    f"{self.historical_price_series.number_of_days}.")
+                first_day = random_generator.integers(last_first_day + 1)
+            hourly_prices = self.historical_price_series.get_days(first_day, number_of_days + 1)
+            return self.join_consecutive_days(self.time_grid.resample_hourly_values(hourly_prices))
+
+        if price_model not in range(len(self.HOURLY_TARIFFS) + 1):
+            raise Exception(f"Unknown price model {price_model}, expected 0 to {self.HISTORICAL_PRICE_MODEL}.")
+        # A writable copy of the shared read-only table, as every other price model returns
+        return np.array(shared_data_registry.get_table(
+            f'energy_price_{price_model}_{number_of_days}_{self.time_grid.name}',
+            lambda: self.calculate_energy_price(price_model, number_of_days),
+            source_file_paths=[__file__]
+        ))
+
+    def calculate_energy_price(self, price_model, number_of_days):
+        day_prices = self.time_grid.resample_hourly_values(self.get_hourly_tariff(price_model))
+        return np.tile(np.concatenate([day_prices, day_prices]), (number_of_days, 1))
+
+    def get_hourly_tariff(self, price_model):
+        if price_model == 0:
+            high_tariff = self.GRID_TARIFF_HIGH + self.ENERGY_TARIFF_HIGH + self.RES_INCENTIVE
+            low_tariff = self.GRID_TARIFF_LOW + self.ENERGY_TARIFF_LOW + self.RES_INCENTIVE
+            hours = np.arange(24)
+            return np.where((hours >= 7) & (hours <= 19), high_tariff, low_tariff)
+        return np.array(self.HOURLY_TARIFFS[price_model])
+
+    def get_tariff_prices(self):
+        # Tariffs 1-4 resampled to the time grid, one row per tariff
+        return shared_data_registry.get_table(
+            f'tariff_prices_{self.time_grid.name}',
+            lambda: self.time_grid.resample_hourly_values(np.array(list(self.HOURLY_TARIFFS.values()))),
+            source_file_paths=[__file__]
+        )
+
+    @staticmethod
+    def join_consecutive_days(day_prices):
+        return np.concatenate([day_prices[:-1], day_prices[1:]], axis=1)
+
+
+class HistoricalPriceSeries:
+    # Hourly day-ahead prices of consecutive days, 24 per day, in one .npy file opened read-only through np.memmap.
+    # Any window of days is a slice of the mapped file, so drawing a new price day costs the same for a series of
+    # many years as for a single week, and all worker processes share the file through the page cache.
+    HOURS_PER_DAY = 24
+
+    def __init__(self, price_file_path, minimum_number_of_days=1):
+        self.hourly_prices = np.load(price_file_path, mmap_mode='r')
+        if self.hourly_prices.ndim != 1 or len(self.hourly_prices) % self.HOURS_PER_DAY != 0:
+            raise Exception(f"Historical prices in {price_file_path} should be one value per hour of whole days.")
+        self.number_of_days = len(self.hourly_prices) // self.HOURS_PER_DAY
+        if self.number_of_days < minimum_number_of_days:
+            raise Exception(f"Historical prices in {price_file_path} cover {self.number_of_days} days, at least "
+                            f"{minimum_number_of_days} are needed: the days of an episode and the day after them.")
+
+    def get_days(self, first_day, number_of_days):
+        if first_day < 0 or first_day + number_of_days > self.number_of_days:
+            raise Exception(f"Days {first_day} to {first_day + number_of_days - 1} are outside the "
+                            f"{self.number_of_days} days of the historical price series.")
+        first_hour = first_day * self.HOURS_PER_DAY
+        last_hour = first_hour + number_of_days * self.HOURS_PER_DAY
+        return self.hourly_prices[first_hour:last_hour].reshape(number_of_days, self.HOURS_PER_DAY)
+
+    @staticmethod
+    def convert_from_csv(csv_file_path, price_file_path, price_column=1, price_scale=0.001, skip_header=1):
+        # Day-ahead markets publish prices per MWh, price_scale converts them to the per kWh of the tariff models
+        hourly_prices = np.genfromtxt(csv_file_path, delimiter=',', usecols=price_column, skip_header=skip_header)
+        if np.isnan(hourly_prices).any():
+            raise Exception(f"Column {price_column} of {csv_file_path} has missing or non-numeric prices.")
+
+        whole_days = len(hourly_prices) // HistoricalPriceSeries.HOURS_PER_DAY
+        np.save(price_file_path, hourly_prices[:whole_days * HistoricalPriceSeries.HOURS_PER_DAY] * price_scale)
+        return HistoricalPriceSeries(price_file_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", required=True)
+    parser.add_argument("--path", default=data_files_directory_path + 'historical_prices.npy')
+    parser.add_argument("--price_column", default=1, type=int)
+    parser.add_argument("--price_scale", default=0.001, type=float)
+    args = parser.parse_args()
+
+    price_series = HistoricalPriceSeries.convert_from_csv(args.csv, args.path, args.price_column, args.price_scale)
+    print(f"Converted {price_series.number_of_days} days of historical prices to {args.path}")
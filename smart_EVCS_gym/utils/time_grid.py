@@ -0,0 +1,59 @@
+import re
+
+import numpy as np
+
+
+class TimeGrid:
+    # Length of a simulation timestep and the conversions from the hourly (tariffs) and per-minute (solar irradiance)
+    # source data to one value per timestep. The time interval is given in hours (0.25) or as a string ('15min',
+    # '1h'), and must split an hour evenly or be a whole number of hours that splits a day evenly.
+    MINUTES_PER_DAY = 24 * 60
+
+    def __init__(self, time_interval=1):
+        self.minutes_per_timestep = self.parse_minutes_per_timestep(time_interval)
+        if self.MINUTES_PER_DAY % self.minutes_per_timestep != 0 or \
+                (60 % self.minutes_per_timestep != 0 and self.minutes_per_timestep % 60 != 0):
+            raise Exception(f"Time interval of {self.minutes_per_timestep} minutes does not split an hour or a day "
+                            f"into whole timesteps.")
+
+        self.time_interval = self.minutes_per_timestep / 60
+        self.name = f'{self.minutes_per_timestep}min'
+        self.total_timesteps = self.MINUTES_PER_DAY // self.minutes_per_timestep
+        # Predictions stay one hour apart at every resolution, so the observation size does not depend on it
+        self.timesteps_per_hour = max(60 // self.minutes_per_timestep, 1)
+        # Station arrays hold one hour past the end of the day for vehicles that depart after midnight
+        self.array_columns = self.total_timesteps + self.timesteps_per_hour
+
+    @staticmethod
+    def parse_minutes_per_timestep(time_interval):
+        if isinstance(time_interval, str):
+            match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*(min|h)\s*', time_interval)
+            if match is None:
+                raise Exception(f"Time interval '{time_interval}' should look like '15min' or '1h'.")
+            value, unit = float(match.group(1)), match.group(2)
+            minutes = value if unit == 'min' else value * 60
+        else:
+            minutes = float(time_interval) * 60
+
+        if minutes <= 0 or abs(minutes - round(minutes)) > 1e-6:
+            raise Exception(f"Time interval of {minutes} minutes is not a whole number of minutes.")
+        return int(round(minutes))
+
+    def resample_hourly_values(self, hourly_values):
+        # Hourly values along the last axis, held for every timestep of their hour or averaged over the hours of
+        # a timestep
+        hourly_values = np.asarray(hourly_values)
+        if self.minutes_per_timestep <= 60:
+            return np.repeat(hourly_values, self.timesteps_per_hour, axis=-1)
+
+        hours_per_timestep = self.minutes_per_timestep // 60
+        return hourly_values.reshape(hourly_values.shape[:-1] + (-1, hours_per_timestep)).mean(axis=-1)
+
+    def resample_minute_values(self, minute_values, number_of_timesteps):
+        # Mean of the per-minute values within each of the first number_of_timesteps timesteps
+        minute_values = np.asarray(minute_values).reshape(-1)
+        number_of_minutes = number_of_timesteps * self.minutes_per_timestep
+        if minute_values.shape[0] < number_of_minutes:
+            raise Exception(f"{number_of_timesteps} timesteps of {self.minutes_per_timestep} minutes need "
+                            f"{number_of_minutes} minute values, but only {minute_values.shape[0]} are available.")
+        return minute_values[:number_of_minutes].reshape(number_of_timesteps, self.minutes_per_timestep).mean(axis=1)
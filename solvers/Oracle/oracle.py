@@ -0,0 +1,378 @@
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.optimize import Bounds, LinearConstraint, milp
+from scipy.sparse import coo_matrix
+
+from smart_nanogrid_gym.utils.battery_bank import BatteryBank
+from smart_nanogrid_gym.utils.episode_recorder import EpisodeRecorder
+
+# Results of an older formulation are never served from the cache
+ORACLE_VERSION = 1
+
+
+@dataclass
+class OracleResult:
+    # actions    (timesteps, action size) plan that reaches cost when replayed from the start of the episode
+    # cost       total cost of the episode under the plan, as the environment computes it
+    # lower_bound objective of the mixed integer program, below the cost of any physically consistent plan
+    actions: np.ndarray
+    cost: float
+    lower_bound: float
+
+
+class Oracle:
+    # Hindsight-optimal charging for the episode an environment was just reset to. The whole day is known: arrivals,
+    # departures and arrival states of charge, prices, PV power and the battery, so the day is one mixed integer
+    # linear program, solved with HiGHS in milliseconds:
+    #   vehicles    power and state of charge of every occupied charger and timestep, within the charger power and
+    #               0 to 1 state of charge, which is exactly what charger actions can reach
+    #   penalty     (2 * uncharged capacity) ** 2 of every departing vehicle as the maximum of tangent cuts, charged
+    #               where CentralManagementSystem charges it
+    #   battery     charges only from PV surplus and discharges only into demand, one binary per timestep choosing
+    #               which, as in CentralManagementSystem
+    #   grid        bought at the price, sold at the price with vehicle to everything, otherwise surplus is wasted
+    # The plan is turned into actions and replayed in the environment, so the cost is exact. The battery is planned
+    # physically consistent: the simulation covers the whole demand when a discharge action asks for more than it
+    # needs, which a policy may exploit to fall below the oracle's cost.
+    # Results are cached on disk by a hash of everything the day's cost depends on.
+    PENALTY_CUTS = 21
+    # Battery actions ask for this much less than the planned power, so that rounding never lets the simulation see
+    # a discharge larger than the demand or a charge larger than the surplus, which it would cut to a fraction
+    BATTERY_POWER_MARGIN = 1e-4
+
+    def __init__(self, environment, cache_directory_path=None):
+        self.environment = environment
+        self.cache_directory_path = cache_directory_path or os.environ.get(
+            'SMART_NANOGRID_GYM_ORACLE_CACHE', os.path.join(tempfile.gettempdir(), 'smart_nanogrid_gym_oracle'))
+
+        if isinstance(environment.central_management_system.battery_system, BatteryBank):
+            raise Exception("The oracle plans a single battery unit.")
+
+    @property
+    def battery_system(self):
+        # Every reset replaces the battery
+        return self.environment.central_management_system.battery_system
+
+    def solve(self):
+        environment = self.environment
+        if environment.timestep != 0:
+            raise Exception("The oracle plans whole episodes, reset the environment first.")
+
+        day = self.get_day()
+        cache_path = os.path.join(self.cache_directory_path, self.get_day_hash(day) + '.npz')
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as cached_result:
+                return OracleResult(actions=cached_result['actions'], cost=float(cached_result['cost']),
+                                    lower_bound=float(cached_result['lower_bound']))
+
+        actions, lower_bound = self.plan(day)
+        result = OracleResult(actions=actions, cost=self.replay(actions), lower_bound=lower_bound)
+        self.save_result(cache_path, result)
+        return result
+
+    def get_day(self):
+        environment = self.environment
+        charging_station = environment.charging_station
+        electric_vehicle = charging_station.electric_vehicle_info
+        if environment.PV_SYSTEM_AVAILABLE_IN_MODEL:
+            solar_power = environment.pv_system_manager.get_available_solar_produced_power(
+                environment.TIME_INTERVAL)[0, :environment.TOTAL_TIMESTEPS]
+        else:
+            solar_power = np.zeros(environment.TOTAL_TIMESTEPS)
+        battery_system = self.battery_system
+
+        event_calendar = charging_station.event_calendar
+        vehicle_departing = np.zeros(charging_station.charger_occupancy.shape, dtype=bool)
+        for timestep, departing_chargers in enumerate(event_calendar.departing_chargers):
+            vehicle_departing[departing_chargers, timestep] = True
+
+        return {
+            'charger_occupancy': charging_station.charger_occupancy == 1,
+            'vehicle_arriving': event_calendar.vehicle_arriving,
+            'vehicle_departing': vehicle_departing,
+            'vehicle_state_of_charge': np.asarray(charging_station.vehicle_state_of_charge, dtype=np.float64),
+            'energy_price': np.asarray(environment.energy_price[0, :environment.TOTAL_TIMESTEPS], dtype=np.float64),
+            'solar_power': np.asarray(solar_power, dtype=np.float64),
+            'parameters': np.array([
+                ORACLE_VERSION, environment.TIME_INTERVAL, environment.VEHICLE_TO_EVERYTHING,
+                electric_vehicle.battery_capacity, electric_vehicle.max_charging_power,
+                electric_vehicle.max_discharging_power, battery_system is not None,
+                battery_system.max_capacity if battery_system else 0,
+                battery_system.current_capacity if battery_system else 0,
+                battery_system.max_charging_power if battery_system else 0,
+                battery_system.max_discharging_power if battery_system else 0,
+                battery_system.charging_efficiency if battery_system else 1,
+                battery_system.discharging_efficiency if battery_system else 1,
+                battery_system.depth_of_discharge if battery_system else 0
+            ], dtype=np.float64)
+        }
+
+    @staticmethod
+    def get_day_hash(day):
+        day_hash = hashlib.sha256()
+        for name, values in day.items():
+            day_hash.update(name.encode())
+            day_hash.update(np.ascontiguousarray(values).tobytes())
+        return day_hash.hexdigest()
+
+    def plan(self, day):
+        environment = self.environment
+        time_interval = environment.TIME_INTERVAL
+        total_timesteps = environment.TOTAL_TIMESTEPS
+        vehicle_to_everything = environment.VEHICLE_TO_EVERYTHING
+        electric_vehicle = environment.charging_station.electric_vehicle_info
+        vehicle_capacity = electric_vehicle.battery_capacity
+        occupancy = day['charger_occupancy'][:, :total_timesteps]
+        arriving = day['vehicle_arriving']
+        state_of_charge = day['vehicle_state_of_charge']
+        solar_power = day['solar_power']
+        battery_system = self.battery_system
+
+        program = MixedIntegerProgram()
+        # Power and state of charge of every occupied charger and timestep
+        chargers, timesteps = np.nonzero(occupancy)
+        vehicle_power = program.add_variables(
+            chargers.size, -electric_vehicle.max_discharging_power if vehicle_to_everything else 0.0,
+            electric_vehicle.max_charging_power)
+        vehicle_state_of_charge = program.add_variables(chargers.size, 0.0, 1.0)
+        slot_variables = {(charger, timestep): slot
+                          for slot, (charger, timestep) in enumerate(zip(chargers, timesteps))}
+
+        previous_slots = []
+        for slot, (charger, timestep) in enumerate(zip(chargers, timesteps)):
+            # A vehicle starts from its arrival state of charge, or from the one reached in the previous timestep
+            coefficients = {vehicle_state_of_charge[slot]: 1.0, vehicle_power[slot]: -time_interval / vehicle_capacity}
+            previous_slot = slot_variables.get((charger, timestep - 1))
+            if arriving[charger, timestep] or previous_slot is None:
+                previous_value = state_of_charge[charger, timestep if arriving[charger, timestep] else timestep - 1]
+                program.add_constraint(coefficients, previous_value, previous_value)
+                previous_slots.append(None)
+            else:
+                coefficients[vehicle_state_of_charge[previous_slot]] = -1.0
+                program.add_constraint(coefficients, 0.0, 0.0)
+                previous_slots.append(previous_slot)
+
+        # Vehicles leaving at the end of timestep t are charged their penalty in step t + 1 on their state of
+        # charge at t, those leaving at the end of the first timestep also in the first step, on the state of charge
+        # of the last array column
+        departing = day['vehicle_departing']
+        constant_penalty = float(np.sum(((1 - state_of_charge[departing[:, 0], -1]) * 2) ** 2))
+        tangent_points = np.linspace(0.0, 1.0, self.PENALTY_CUTS)
+        for charger, timestep in zip(*np.nonzero(departing[:, :total_timesteps - 1])):
+            penalty = program.add_variables(1, 0.0, np.inf, cost=1.0)[0]
+            for tangent_point in tangent_points[1:]:
+                # penalty >= 4 u0 ** 2 + 8 u0 (u - u0) with u = 1 - state of charge
+                program.add_constraint({penalty: 1.0,
+                                        vehicle_state_of_charge[slot_variables[charger, timestep]]: 8 * tangent_point},
+                                       8 * tangent_point - 4 * tangent_point ** 2, np.inf)
+
+        load = [[] for _ in range(total_timesteps)]
+        for slot, timestep in enumerate(timesteps):
+            load[timestep].append(vehicle_power[slot])
+
+        # Bounds of the vehicles' load per timestep, as tight as possible for the mode constraints below
+        connected_vehicles = np.bincount(timesteps, minlength=total_timesteps)
+        max_load = connected_vehicles * electric_vehicle.max_charging_power
+        min_load = -connected_vehicles * electric_vehicle.max_discharging_power if vehicle_to_everything \
+            else np.zeros(total_timesteps)
+
+        uses_modes = battery_system is not None or not vehicle_to_everything
+        if battery_system is not None:
+            battery_discharging_power = program.add_variables(total_timesteps, 0.0,
+                                                              battery_system.max_discharging_power)
+            battery_charging_power = program.add_variables(total_timesteps, 0.0, battery_system.max_charging_power)
+            # Never below the depth of discharge, or the initial state of charge if that starts below it
+            battery_state_of_charge = program.add_variables(
+                total_timesteps, min(battery_system.depth_of_discharge, battery_system.current_capacity), 1.0)
+        # Surplus mode per timestep: PV covers the vehicles, the battery may charge and the grid takes the rest
+        surplus = program.add_variables(total_timesteps, 0.0, 1.0, integral=True) if uses_modes else None
+        grid_power = program.add_variables(total_timesteps, -np.inf if vehicle_to_everything else 0.0, np.inf,
+                                           cost=day['energy_price'] * time_interval)
+        wasted_power = program.add_variables(total_timesteps, 0.0, 0.0 if vehicle_to_everything else np.inf)
+
+        for timestep in range(total_timesteps):
+            # grid = load - solar - discharge + charge + wasted
+            balance = {grid_power[timestep]: 1.0, wasted_power[timestep]: -1.0}
+            for variable in load[timestep]:
+                balance[variable] = -1.0
+            if battery_system is not None:
+                balance[battery_discharging_power[timestep]] = 1.0
+                balance[battery_charging_power[timestep]] = -1.0
+            program.add_constraint(balance, -solar_power[timestep], -solar_power[timestep])
+            if not uses_modes:
+                continue
+
+            mode = surplus[timestep]
+            if not vehicle_to_everything:
+                # Surplus is wasted only in surplus mode, where nothing is bought
+                program.add_constraint({wasted_power[timestep]: 1.0, mode: -solar_power[timestep]}, -np.inf, 0.0)
+                grid_bound = max(max_load[timestep] - solar_power[timestep], 0.0)
+                program.add_constraint({grid_power[timestep]: 1.0, mode: grid_bound}, -np.inf, grid_bound)
+            if battery_system is not None:
+                discharge, charge = battery_discharging_power[timestep], battery_charging_power[timestep]
+                max_discharge, max_charge = battery_system.max_discharging_power, battery_system.max_charging_power
+                # Discharge only into demand: discharge <= load - solar in demand mode, 0 in surplus mode
+                demand_bound = max_discharge - min_load[timestep] + solar_power[timestep]
+                demand = {discharge: 1.0, mode: -demand_bound}
+                for variable in load[timestep]:
+                    demand[variable] = -1.0
+                program.add_constraint(demand, -np.inf, -solar_power[timestep])
+                program.add_constraint({discharge: 1.0, mode: max_discharge}, -np.inf, max_discharge)
+                # Charge only from surplus: charge <= solar - load in surplus mode, 0 in demand mode
+                supply_bound = max(max_charge + max_load[timestep] - solar_power[timestep], 0.0)
+                supply = {charge: 1.0, mode: supply_bound}
+                for variable in load[timestep]:
+                    supply[variable] = 1.0
+                program.add_constraint(supply, -np.inf, solar_power[timestep] + supply_bound)
+                program.add_constraint({charge: 1.0, mode: -max_charge}, -np.inf, 0.0)
+
+                change = {battery_state_of_charge[timestep]: 1.0,
+                          charge: -time_interval * battery_system.charging_efficiency / battery_system.max_capacity,
+                          discharge: time_interval / battery_system.discharging_efficiency /
+                          battery_system.max_capacity}
+                if timestep == 0:
+                    program.add_constraint(change, battery_system.current_capacity, battery_system.current_capacity)
+                else:
+                    change[battery_state_of_charge[timestep - 1]] = -1.0
+                    program.add_constraint(change, 0.0, 0.0)
+
+        def round_modes(relaxed_solution):
+            # Surplus mode where the relaxed plan leaves surplus, or charges the battery more than it discharges it
+            net_load = np.array([sum(relaxed_solution[variable] for variable in load[timestep]) -
+                                 solar_power[timestep] for timestep in range(total_timesteps)])
+            if battery_system is None:
+                return net_load < 0
+            battery_power = relaxed_solution[battery_charging_power] - relaxed_solution[battery_discharging_power]
+            return (net_load < 0) | ((net_load <= 0) & (battery_power > 0))
+
+        solution, _, lower_bound = program.solve(round_modes)
+
+        actions = np.zeros((total_timesteps, environment.action_space.shape[0]), dtype=np.float32)
+        for slot, (charger, timestep) in enumerate(zip(chargers, timesteps)):
+            power = solution[vehicle_power[slot]]
+            previous_slot = previous_slots[slot]
+            if previous_slot is None:
+                previous = state_of_charge[charger, timestep if arriving[charger, timestep] else timestep - 1]
+            else:
+                previous = solution[vehicle_state_of_charge[previous_slot]]
+            if power >= 0:
+                max_power = min(electric_vehicle.max_charging_power, (1 - previous) * vehicle_capacity / time_interval)
+            else:
+                max_power = min(electric_vehicle.max_discharging_power, previous * vehicle_capacity / time_interval)
+            actions[timestep, charger] = power / max_power if max_power > 0 else 0.0
+
+        if battery_system is not None:
+            previous = battery_system.current_capacity
+            for timestep in range(total_timesteps):
+                discharge = solution[battery_discharging_power[timestep]]
+                charge = solution[battery_charging_power[timestep]]
+                if discharge > charge:
+                    max_power = min(battery_system.max_discharging_power,
+                                    (previous - battery_system.depth_of_discharge) * battery_system.max_capacity *
+                                    battery_system.discharging_efficiency / time_interval)
+                    actions[timestep, -1] = -discharge / max_power if max_power > 0 else 0.0
+                    actions[timestep, -1] *= 1 - self.BATTERY_POWER_MARGIN
+                elif charge > 0:
+                    max_power = min(battery_system.max_charging_power,
+                                    (1 - previous) * battery_system.max_capacity /
+                                    (time_interval * battery_system.charging_efficiency))
+                    actions[timestep, -1] = charge / max_power if max_power > 0 else 0.0
+                    actions[timestep, -1] *= 1 - self.BATTERY_POWER_MARGIN
+                previous = solution[battery_state_of_charge[timestep]]
+
+        np.clip(actions, environment.action_space.low, environment.action_space.high, out=actions)
+        return actions, lower_bound + constant_penalty
+
+    def replay(self, actions, record_episode=False):
+        # Steps the environment through the plan and restores it to the start of the episode. The environment's
+        # episode recorder is swapped for one that records nothing, so solving never writes recordings, unless
+        # record_episode asks for the replayed episode to be recorded.
+        environment = self.environment
+        initial_state = environment.get_state()
+        episode_recorder = environment.episode_recorder
+        if not record_episode:
+            environment.episode_recorder = EpisodeRecorder()
+        total_cost = 0.0
+        try:
+            for timestep_actions in actions:
+                _, reward, _, _ = environment.step(timestep_actions)
+                total_cost -= reward
+        finally:
+            environment.episode_recorder = episode_recorder
+        environment.set_state(initial_state)
+        return float(total_cost)
+
+    def save_result(self, cache_path, result):
+        # Written under a process-unique name and renamed into place, as shared registry tables are
+        os.makedirs(self.cache_directory_path, exist_ok=True)
+        temporary_cache_path = f'{cache_path}.{os.getpid()}.tmp'
+        with open(temporary_cache_path, 'wb') as cache_file:
+            np.savez(cache_file, actions=result.actions, cost=result.cost, lower_bound=result.lower_bound)
+        os.replace(temporary_cache_path, cache_path)
+
+
+class MixedIntegerProgram:
+    # Variables and sparse constraint rows collected one at a time, solved with scipy.optimize.milp
+    OPTIMALITY_TOLERANCE = 1e-9
+
+    def __init__(self):
+        self.lower_bounds = []
+        self.upper_bounds = []
+        self.costs = []
+        self.integrality = []
+        self.rows, self.columns, self.values = [], [], []
+        self.constraint_lower_bounds = []
+        self.constraint_upper_bounds = []
+
+    def add_variables(self, count, lower_bound, upper_bound, cost=0.0, integral=False):
+        first_variable = len(self.costs)
+        self.lower_bounds.extend(np.broadcast_to(lower_bound, count))
+        self.upper_bounds.extend(np.broadcast_to(upper_bound, count))
+        self.costs.extend(np.broadcast_to(cost, count))
+        self.integrality.extend([int(integral)] * count)
+        return list(range(first_variable, first_variable + count))
+
+    def add_constraint(self, coefficients, lower_bound, upper_bound):
+        row = len(self.constraint_lower_bounds)
+        for variable, coefficient in coefficients.items():
+            self.rows.append(row)
+            self.columns.append(variable)
+            self.values.append(coefficient)
+        self.constraint_lower_bounds.append(lower_bound)
+        self.constraint_upper_bounds.append(upper_bound)
+
+    def solve(self, round_solution):
+        # Returns a solution, its objective and a lower bound of the objective. The relaxation of these programs is
+        # usually tight: round_solution turns its solution into values of the integer variables, and if the program
+        # left with those fixed reaches the relaxation's objective that is the optimum, found in two linear programs
+        # instead of a branch and bound whose heuristics take a hundred times longer
+        costs = np.array(self.costs)
+        integrality = np.array(self.integrality)
+        lower_bounds, upper_bounds = np.array(self.lower_bounds), np.array(self.upper_bounds)
+        constraints = LinearConstraint(
+            coo_matrix((self.values, (self.rows, self.columns)),
+                       shape=(len(self.constraint_lower_bounds), len(self.costs))).tocsr(),
+            self.constraint_lower_bounds, self.constraint_upper_bounds)
+
+        relaxation = milp(costs, bounds=Bounds(lower_bounds, upper_bounds), constraints=constraints)
+        if not relaxation.success:
+            raise Exception(f"The oracle found no plan: {relaxation.message}")
+        integral = integrality == 1
+        if not integral.any():
+            return relaxation.x, float(relaxation.fun), float(relaxation.fun)
+
+        lower_bounds[integral] = upper_bounds[integral] = round_solution(relaxation.x)
+        rounded = milp(costs, bounds=Bounds(lower_bounds, upper_bounds), constraints=constraints)
+        if rounded.success and rounded.fun <= relaxation.fun + self.OPTIMALITY_TOLERANCE * (1 + abs(relaxation.fun)):
+            return rounded.x, float(rounded.fun), float(relaxation.fun)
+
+        result = milp(costs, integrality=integrality, bounds=Bounds(np.array(self.lower_bounds),
+                                                                    np.array(self.upper_bounds)),
+                      constraints=constraints)
+        if not result.success:
+            raise Exception(f"The oracle found no plan: {result.message}")
+        return result.x, float(result.fun), float(result.mip_dual_bound)
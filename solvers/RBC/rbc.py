@@ -2,28 +2,30 @@ import numpy as np
 
 
 class RBC:
+    # Departure times are normalized to [0, 1] by 24 hours, so a vehicle leaving within the next 4 hours has a
+    # departure time below 0.16667 and is charged at full power. Other vehicles follow the solar radiation, taken
+    # as the mean of the current radiation and its one hour prediction. Without a PV system they wait.
+    DEPARTING_SOON = 0.16667
 
     def select_action(self, states):
-        action=[0,0,0,0,0,0,0,0]
-        for car in range(self.NUMBER_OF_CHARGERS):
-            #the departure hour for every spot is placed on the last 10 positions in states vector(10 spots)
-            #have in mind that departure time is normalized in [0,1] so if T_leave is within the next 3 hours then
-            #action[car]=1, else action[car]=solar_radiation or action[car]={mean value of solar radiation and the predicted one hour radiation}
-            if states[16+car]==0:
-                action[car]=0
-            elif states[16+car]>0 and states[16+car]<0.16667:
-                action[car]=1
-            else:
-                #solar ratiation is states[0] and the predictions on ratiation are states[2],states[3],states[4]
-
-                #this case describes that if T_leave> 3 hours, then scenario 1: action is equal to the radiation
-                #scenario 2: action is equal to the mean value of current radiation and its next hour prediction
-
-                # scenario 1, current value of radiation
-                #action[car]=states[0]
-
-                # scenario 2, mean value of current radiation and one hour ahead
-                action[car]=(states[0] + states[2]) / 2
-
-
-        return action
+        actions = RBC.select_actions(np.asarray(states)[np.newaxis, :], self.observation_layout,
+                                     self.action_space.shape[0])
+        return actions[0]
+
+    @staticmethod
+    def select_actions(observations, observation_layout, action_size):
+        departure_times = observations[:, observation_layout.departure_times]
+
+        if observation_layout.solar_radiation is not None:
+            current_radiation = observations[:, observation_layout.solar_radiation]
+            next_radiation = observations[:, observation_layout.solar_radiation_predictions.start, np.newaxis]
+            solar_actions = (current_radiation + next_radiation) / 2
+        else:
+            solar_actions = np.zeros((observations.shape[0], 1))
+
+        charger_actions = np.where(departure_times == 0, 0.0,
+                                   np.where(departure_times < RBC.DEPARTING_SOON, 1.0, solar_actions))
+
+        actions = np.zeros((observations.shape[0], action_size), dtype=np.float32)
+        actions[:, :charger_actions.shape[1]] = charger_actions
+        return actions
@@ -0,0 +1,97 @@
+import io
+import json
+import os
+import queue
+import threading
+import zipfile
+
+
+class CheckpointManager:
+    # Saves training checkpoints without stalling learning and keeps a bounded number of them. save() only serialises
+    # the model into memory; a background thread compresses the snapshot, writes it as <timesteps>.zip, the same file
+    # model.save would write and that <algorithm>.load reads, and then deletes every checkpoint that is neither one of
+    # the last `keep_last` nor one of the `keep_best` with the highest evaluation reward. checkpoints.json lists the
+    # checkpoints kept. save() only waits for the writer when `max_pending_checkpoints` snapshots are already queued,
+    # which bounds memory if the disk cannot keep up.
+    def __init__(self, models_directory, keep_last=3, keep_best=2, max_pending_checkpoints=2, compression_level=6):
+        self.models_directory = models_directory
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        self.compression_level = compression_level
+        os.makedirs(models_directory, exist_ok=True)
+
+        # (timesteps, evaluation reward) of the checkpoints on disk, only touched by the writer thread
+        self.checkpoints = []
+
+        self.pending_checkpoints = queue.Queue(maxsize=max_pending_checkpoints)
+        self.writer_error = None
+        self.writer_thread = threading.Thread(target=self.write_checkpoints, daemon=True)
+        self.writer_thread.start()
+
+    def save(self, model, timesteps, evaluation_reward=None):
+        self.raise_writer_error()
+        snapshot = io.BytesIO()
+        model.save(snapshot)
+        self.pending_checkpoints.put((timesteps, evaluation_reward, snapshot.getvalue()))
+
+    def raise_writer_error(self):
+        # Raised once, a later checkpoint that is written fine is saved as usual
+        if self.writer_error:
+            writer_error, self.writer_error = self.writer_error, None
+            raise writer_error
+
+    def get_checkpoint_path(self, timesteps):
+        return os.path.join(self.models_directory, f'{timesteps}.zip')
+
+    def write_checkpoints(self):
+        while True:
+            checkpoint = self.pending_checkpoints.get()
+            if checkpoint is None:
+                return
+            timesteps, evaluation_reward, snapshot = checkpoint
+            try:
+                self.write_checkpoint(timesteps, snapshot)
+                self.checkpoints = [(saved_timesteps, saved_reward) for saved_timesteps, saved_reward
+                                    in self.checkpoints if saved_timesteps != timesteps]
+                self.checkpoints.append((timesteps, evaluation_reward))
+                self.apply_retention_policy()
+            except Exception as error:
+                self.writer_error = error
+
+    def write_checkpoint(self, timesteps, snapshot):
+        # model.save stores its zip members uncompressed, they are compressed here, off the training thread
+        checkpoint_path = self.get_checkpoint_path(timesteps)
+        temporary_checkpoint_path = f'{checkpoint_path}.tmp'
+        with zipfile.ZipFile(io.BytesIO(snapshot)) as snapshot_archive, \
+                zipfile.ZipFile(temporary_checkpoint_path, 'w', compression=zipfile.ZIP_DEFLATED,
+                                compresslevel=self.compression_level) as checkpoint_archive:
+            for member in snapshot_archive.infolist():
+                checkpoint_archive.writestr(member.filename, snapshot_archive.read(member),
+                                            compress_type=zipfile.ZIP_DEFLATED)
+        os.replace(temporary_checkpoint_path, checkpoint_path)
+
+    def apply_retention_policy(self):
+        latest = sorted(self.checkpoints, key=lambda checkpoint: checkpoint[0])[-self.keep_last:] \
+            if self.keep_last > 0 else []
+        evaluated = [checkpoint for checkpoint in self.checkpoints if checkpoint[1] is not None]
+        best = sorted(evaluated, key=lambda checkpoint: checkpoint[1])[-self.keep_best:] if self.keep_best > 0 else []
+        kept = set(latest) | set(best)
+
+        for checkpoint in self.checkpoints:
+            if checkpoint not in kept and os.path.exists(self.get_checkpoint_path(checkpoint[0])):
+                os.remove(self.get_checkpoint_path(checkpoint[0]))
+        self.checkpoints = sorted(kept, key=lambda checkpoint: checkpoint[0])
+
+        index = [{'timesteps': timesteps, 'evaluation_reward': evaluation_reward,
+                  'path': self.get_checkpoint_path(timesteps)} for timesteps, evaluation_reward in self.checkpoints]
+        index_path = os.path.join(self.models_directory, 'checkpoints.json')
+        with open(f'{index_path}.tmp', 'w') as index_file:
+            json.dump(index, index_file, indent=4)
+        os.replace(f'{index_path}.tmp', index_path)
+
+    def close(self):
+        if not self.writer_thread.is_alive():
+            return
+        self.pending_checkpoints.put(None)
+        self.writer_thread.join()
+        self.raise_writer_error()
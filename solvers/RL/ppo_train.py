@@ -7,6 +7,7 @@ import os
 from stable_baselines3.common.noise import NormalActionNoise, OrnsteinUhlenbeckActionNoise
 from stable_baselines3 import PPO
 from stable_baselines3.common.evaluation import evaluate_policy
+from solvers.RL.checkpoint_manager import CheckpointManager
 import time
 
 env_variants = [
@@ -52,16 +53,26 @@ if not os.path.exists(logdir):
     os.makedirs(logdir)
 
 current_env_configuration = current_env['config']
-env = gym.make('SmartNanogridEnv-v0', **current_env_configuration)
+env = gym.make('SmartNanogridEnv-v0', **current_env_configuration, episode_recorder_mode='off')
 
 model = PPO("MlpPolicy", env, verbose=1, tensorboard_log=logdir)
 
 TIMESTEPS = 20000
 # TIMESTEPS = 200
+# Checkpoints are written in the background, only the last 3 and the 2 best evaluated are kept
+checkpoint_manager = CheckpointManager(models_dir, keep_last=3, keep_best=2)
+evaluation_env = gym.make('SmartNanogridEnv-v0', **current_env_configuration, episode_recorder_mode='off')
+# Re-seeded before every evaluation, so every checkpoint is scored on the same episodes and the best ones are ranked
+# by the policy rather than by the episodes drawn
+EVALUATION_SEED = 0
 start = time.time()
 for i in range(1, 50):
     model.learn(total_timesteps=TIMESTEPS, reset_num_timesteps=False, tb_log_name="PPO")
-    model.save(f"{models_dir}/{TIMESTEPS * i}")
+    evaluation_env.seed(EVALUATION_SEED)
+    mean_reward, _ = evaluate_policy(model, evaluation_env, n_eval_episodes=10)
+    checkpoint_manager.save(model, TIMESTEPS * i, mean_reward)
+
+checkpoint_manager.close()
 
 env.close
 
@@ -0,0 +1,30 @@
+env_variants = [
+    {
+        'variant_name': 'basic-',
+        'config': {
+            'vehicle_to_everything': False,
+            'pv_system_available_in_model': False,
+            'battery_system_available_in_model': False
+        }},
+    {
+        'variant_name': 'b-pv-',
+        'config': {
+            'vehicle_to_everything': False,
+            'pv_system_available_in_model': True,
+            'battery_system_available_in_model': True
+        }},
+    {
+        'variant_name': 'v2x-',
+        'config': {
+            'vehicle_to_everything': True,
+            'pv_system_available_in_model': False,
+            'battery_system_available_in_model': False
+        }},
+    {
+        'variant_name': 'v2x-b-pv-',
+        'config': {
+            'vehicle_to_everything': True,
+            'pv_system_available_in_model': True,
+            'battery_system_available_in_model': True
+        }}
+]
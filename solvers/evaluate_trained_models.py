@@ -55,6 +55,7 @@ for ep in range(episodes):
 
     # PPO
     obs = env.reset(generate_new_initial_values=1)
+    scenario = env.get_scenario()
     done = False
     while not done:
         action, _states = model2.predict(obs)
@@ -65,7 +66,7 @@ for ep in range(episodes):
     #RBC case
     ##########obs = env.reset(1)##########
 
-    obs=env.reset(generate_new_initial_values=1)
+    obs=env.reset(scenario=scenario)
     done=False
     while not done:
         # state = obs
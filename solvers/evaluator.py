@@ -40,6 +40,7 @@ for ep in range(episodes):
 
     # PPO
     obs = env.reset(generate_new_initial_values=True)
+    scenario = env.get_scenario()
     done = False
     while not done:
         action, _states = model1.predict(obs)
@@ -48,7 +49,7 @@ for ep in range(episodes):
     final_reward_PPO_1[ep] = sum(rewards_list_PPO_1)
 
     # RBC case
-    obs = env.reset(generate_new_initial_values=False)
+    obs = env.reset(scenario=scenario)
     done = False
     while not done:
         action_rbc = RBC.select_action(env.env, obs)
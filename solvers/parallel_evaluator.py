@@ -0,0 +1,179 @@
+import argparse
+import json
+import time
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+
+from smart_nanogrid_gym.envs import SmartNanogridEnv
+from smart_nanogrid_gym.utils.episode_recorder import EPISODE_KPI_COLUMNS
+from smart_nanogrid_gym.utils.result_store import ResultStore
+from solvers.Oracle.oracle import Oracle
+from solvers.RBC.rbc import RBC
+from solvers.env_variants import env_variants
+
+# Policies are given as "<name>=<algorithm>:<model path>", "RBC" or "Oracle". Every worker process builds its
+# environment and loads every model once, in initialise_worker, and then only receives episode numbers. Workers send
+# back the EPISODE_KPI_COLUMNS of every episode, totalled by the environment's 'kpi' episode recorder.
+worker_environment = None
+worker_policies = None
+
+
+def parse_policy(policy_description):
+    if policy_description.upper() == 'RBC':
+        return 'RBC', 'RBC', None
+    if policy_description.upper() == 'ORACLE':
+        return 'Oracle', 'ORACLE', None
+    policy_name, model_description = policy_description.split('=', 1) if '=' in policy_description \
+        else (policy_description, policy_description)
+    algorithm, model_path = model_description.split(':', 1)
+    return policy_name, algorithm.upper(), model_path
+
+
+def load_policy(algorithm, model_path):
+    if algorithm == 'RBC':
+        return None
+    if algorithm == 'ORACLE':
+        return Oracle(worker_environment)
+    import stable_baselines3
+    return getattr(stable_baselines3, algorithm).load(model_path, device='cpu')
+
+
+def initialise_worker(env_configuration, policy_descriptions, seed, scenario_bank_path):
+    global worker_environment, worker_policies
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+
+    # Episode k always gets the scenario and prices of episode k of the evaluation seed, whichever worker runs it
+    worker_environment = SmartNanogridEnv(**env_configuration, episode_recorder_mode='kpi',
+                                          scenario_bank_path=scenario_bank_path, seed=seed)
+    worker_policies = []
+    for policy_description in policy_descriptions:
+        policy_name, algorithm, model_path = parse_policy(policy_description)
+        worker_policies.append((policy_name, load_policy(algorithm, model_path)))
+
+
+def run_episode(policy, episode):
+    observation = worker_environment.reset(episode=episode)
+    if isinstance(policy, Oracle):
+        # Replayed with recording, so that the recorder totals the oracle's episode
+        policy.replay(policy.solve().actions, record_episode=True)
+    else:
+        done = False
+        while not done:
+            if policy is None:
+                action = RBC.select_action(worker_environment, observation)
+            else:
+                action, _ = policy.predict(observation, deterministic=True)
+            observation, _, done, _ = worker_environment.step(action)
+    episode_kpis = worker_environment.episode_recorder.episode_kpis
+    return [episode_kpis[column] for column in EPISODE_KPI_COLUMNS]
+
+
+def evaluate_episodes(episodes):
+    kpis = np.zeros((len(worker_policies), len(episodes), len(EPISODE_KPI_COLUMNS)))
+    for column, episode in enumerate(episodes):
+        for row, (_, policy) in enumerate(worker_policies):
+            kpis[row, column] = run_episode(policy, episode)
+    return episodes, kpis
+
+
+def get_result_columns(policy_names):
+    # Every policy's regret in the episode is stored next to its KPIs when the oracle is evaluated
+    return EPISODE_KPI_COLUMNS + (['regret'] if 'Oracle' in policy_names else [])
+
+
+def evaluate(env_configuration, policy_descriptions, number_of_episodes, seed=0, number_of_workers=None,
+             scenario_bank_path=None, episodes_per_task=None, result_store=None):
+    # Returns every policy's reward in every episode, or, given a ResultStore, appends every policy's KPIs in every
+    # episode to it as tasks finish and returns None instead, keeping nothing per episode in memory
+    number_of_workers = number_of_workers or cpu_count()
+    episodes_per_task = episodes_per_task or max(1, number_of_episodes // (number_of_workers * 4))
+    tasks = [list(range(first_episode, min(first_episode + episodes_per_task, number_of_episodes)))
+             for first_episode in range(0, number_of_episodes, episodes_per_task)]
+
+    policy_names = [parse_policy(policy_description)[0] for policy_description in policy_descriptions]
+    total_rewards = np.zeros((len(policy_names), number_of_episodes)) if result_store is None else None
+    with Pool(number_of_workers, initializer=initialise_worker,
+              initargs=(env_configuration, policy_descriptions, seed, scenario_bank_path)) as pool:
+        for episodes, task_kpis in pool.imap_unordered(evaluate_episodes, tasks):
+            task_rewards = task_kpis[..., EPISODE_KPI_COLUMNS.index('reward')]
+            if result_store is None:
+                total_rewards[:, episodes] = task_rewards
+            else:
+                store_episodes(result_store, policy_names, episodes, task_kpis, task_rewards)
+
+    return policy_names, total_rewards
+
+
+def store_episodes(result_store, policy_names, episodes, task_kpis, task_rewards):
+    oracle_rewards = task_rewards[policy_names.index('Oracle')] if 'Oracle' in policy_names else None
+    for row, policy_name in enumerate(policy_names):
+        for column, episode in enumerate(episodes):
+            values = dict(zip(EPISODE_KPI_COLUMNS, task_kpis[row, column]))
+            if oracle_rewards is not None:
+                values['regret'] = oracle_rewards[column] - task_rewards[row, column]
+            result_store.append(policy_name, episode, values)
+    # Published after every task, so the summary of a running evaluation never lags behind by more than one task
+    result_store.flush()
+
+
+def summarise(policy_names, total_rewards):
+    summary = {
+        policy_name: {
+            'mean': float(np.mean(policy_rewards)),
+            'std': float(np.std(policy_rewards)),
+            'min': float(np.min(policy_rewards)),
+            'max': float(np.max(policy_rewards))
+        }
+        for policy_name, policy_rewards in zip(policy_names, total_rewards)
+    }
+
+    # Regret: cost above the oracle's in the same episodes
+    if 'Oracle' in policy_names:
+        oracle_rewards = total_rewards[policy_names.index('Oracle')]
+        for policy_name, policy_rewards in zip(policy_names, total_rewards):
+            summary[policy_name]['mean_regret'] = float(np.mean(oracle_rewards - policy_rewards))
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--env_variant", default=env_variants[3]['variant_name'],
+                        choices=[env_variant['variant_name'] for env_variant in env_variants])
+    parser.add_argument("--policies", nargs='+', default=['RBC'],
+                        help="RBC, Oracle or <name>=<algorithm>:<model path>, "
+                             "e.g. PPO_1=PPO:models/PPO-1676639715/9800")
+    parser.add_argument("--episodes", default=100, type=int)
+    parser.add_argument("--seed", default=0, type=int)
+    parser.add_argument("--workers", default=None, type=int)
+    parser.add_argument("--scenario_bank", default=None)
+    parser.add_argument("--output", default=None, help="Path of an .npz file for the per-episode rewards")
+    parser.add_argument("--results", default=None,
+                        help="Directory of a result store for the per-episode KPIs, whose summary.json is updated "
+                             "while the evaluation runs")
+    args = parser.parse_args()
+    if args.output and args.results:
+        parser.error("--output and --results cannot be combined, the result store keeps the per-episode rewards")
+
+    env_configuration = next(env_variant['config'] for env_variant in env_variants
+                             if env_variant['variant_name'] == args.env_variant)
+
+    policy_names = [parse_policy(policy_description)[0] for policy_description in args.policies]
+    result_store = ResultStore(args.results, get_result_columns(policy_names)) if args.results else None
+
+    start = time.perf_counter()
+    policy_names, total_rewards = evaluate(env_configuration, args.policies, args.episodes, args.seed, args.workers,
+                                           args.scenario_bank, result_store=result_store)
+    if result_store is None:
+        print(json.dumps(summarise(policy_names, total_rewards), indent=4))
+    else:
+        result_store.close()
+        print(json.dumps(result_store.get_summary(), indent=4))
+    print(f"Evaluated {args.episodes} episodes in {time.perf_counter() - start:.1f} s")
+
+    if args.output:
+        np.savez(args.output, policy_names=np.array(policy_names), total_rewards=total_rewards, seed=args.seed)
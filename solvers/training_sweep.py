@@ -0,0 +1,177 @@
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import time
+import traceback
+
+import numpy as np
+
+from solvers.env_variants import env_variants
+
+# Trains every combination of algorithm, env variant and seed, as solvers/RL/ppo_train.py and ddpg_train.py train
+# one, over a process pool sized to the machine. Every pool worker is pinned to cores of its own and limits torch and
+# the BLAS libraries to as many threads, so runs never compete for a core. BLAS reads its thread count when numpy is
+# first imported, so workers are spawned rather than forked from this process, which has numpy loaded already, with
+# THREAD_ENVIRONMENT_VARIABLES set in the environment they start with. Models are saved under
+# models/<algorithm>-<variant><seed>-<start time>/ and the sweep ends with one table of every run's training
+# throughput and final evaluation reward. A run that fails gets a row of its own with the error, the other runs
+# still finish and are reported.
+THREAD_ENVIRONMENT_VARIABLES = ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS']
+TABLE_COLUMNS = ['algorithm', 'variant', 'seed', 'timesteps', 'training_seconds', 'steps_per_second',
+                 'final_reward_mean', 'final_reward_std', 'models_directory', 'error']
+
+
+def get_available_cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count()))
+
+
+def initialise_worker(core_sets):
+    # Takes one set of cores for the lifetime of this pool worker, before torch is imported
+    cores = core_sets.get()
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    import torch
+    torch.set_num_threads(len(cores))
+
+
+def create_model(algorithm, environment, seed, log_directory):
+    import stable_baselines3
+    if algorithm == 'PPO':
+        return stable_baselines3.PPO("MlpPolicy", environment, verbose=0, seed=seed, tensorboard_log=log_directory)
+    if algorithm == 'DDPG':
+        from stable_baselines3.common.noise import OrnsteinUhlenbeckActionNoise
+        number_of_actions = environment.action_space.shape[-1]
+        action_noise = OrnsteinUhlenbeckActionNoise(mean=np.zeros(number_of_actions),
+                                                    sigma=float(0.5) * np.ones(number_of_actions))
+        return stable_baselines3.DDPG("MlpPolicy", environment, verbose=0, seed=seed, action_noise=action_noise,
+                                      tensorboard_log=log_directory)
+    raise Exception(f"Unknown algorithm '{algorithm}', expected 'PPO' or 'DDPG'.")
+
+
+def train_run(run):
+    import gym
+    import smart_nanogrid_gym
+    from stable_baselines3.common.evaluation import evaluate_policy
+
+    algorithm, env_variant, seed, total_timesteps, evaluation_episodes = run
+    variant_name = env_variant['variant_name']
+    run_name = f"{algorithm}-{variant_name}{seed}-{int(time.time())}"
+    models_directory = f"models/{run_name}"
+    log_directory = f"logs/{run_name}"
+    os.makedirs(models_directory, exist_ok=True)
+    os.makedirs(log_directory, exist_ok=True)
+
+    environment = gym.make('SmartNanogridEnv-v0', **env_variant['config'], episode_recorder_mode='off', seed=seed)
+    model = create_model(algorithm, environment, seed, log_directory)
+    start = time.perf_counter()
+    model.learn(total_timesteps=total_timesteps, tb_log_name=algorithm)
+    training_seconds = time.perf_counter() - start
+    model.save(f"{models_directory}/{total_timesteps}")
+    environment.close()
+
+    # Evaluated on episodes of their own, never seen in training
+    evaluation_environment = gym.make('SmartNanogridEnv-v0', **env_variant['config'], episode_recorder_mode='off',
+                                      seed=np.random.SeedSequence(seed, spawn_key=(1,)))
+    final_reward_mean, final_reward_std = evaluate_policy(model, evaluation_environment,
+                                                          n_eval_episodes=evaluation_episodes)
+    evaluation_environment.close()
+
+    return {
+        'algorithm': algorithm,
+        'variant': variant_name,
+        'seed': seed,
+        'timesteps': total_timesteps,
+        'training_seconds': training_seconds,
+        'steps_per_second': total_timesteps / training_seconds,
+        'final_reward_mean': float(final_reward_mean),
+        'final_reward_std': float(final_reward_std),
+        'models_directory': models_directory,
+        'error': ''
+    }
+
+
+def try_train_run(indexed_run):
+    # Keeps the index of the run, results arrive in the order runs finish
+    index, run = indexed_run
+    try:
+        return index, train_run(run)
+    except Exception as exception:
+        traceback.print_exc()
+        algorithm, env_variant, seed, total_timesteps, evaluation_episodes = run
+        result = dict.fromkeys(TABLE_COLUMNS)
+        result.update({'algorithm': algorithm, 'variant': env_variant['variant_name'], 'seed': seed,
+                       'timesteps': total_timesteps, 'error': f'{type(exception).__name__}: {exception}'})
+        return index, result
+
+
+def sweep(algorithms, variant_names, seeds, total_timesteps, evaluation_episodes=10, threads_per_run=1,
+          number_of_workers=None):
+    selected_variants = [env_variant for env_variant in env_variants if env_variant['variant_name'] in variant_names]
+    runs = [(algorithm, env_variant, seed, total_timesteps, evaluation_episodes)
+            for algorithm, env_variant, seed in itertools.product(algorithms, selected_variants, seeds)]
+
+    # One set of threads_per_run cores per pool worker, as many workers as the machine has sets or runs
+    available_cores = get_available_cores()
+    number_of_core_sets = max(1, len(available_cores) // threads_per_run)
+    number_of_workers = min(number_of_workers or number_of_core_sets, number_of_core_sets, len(runs))
+
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager:
+        core_sets = manager.Queue()
+        for worker in range(number_of_workers):
+            core_sets.put(set(available_cores[worker * threads_per_run:(worker + 1) * threads_per_run]
+                              or available_cores))
+        # Set only while the workers start, they keep their copy of the environment
+        previous_values = {variable: os.environ.get(variable) for variable in THREAD_ENVIRONMENT_VARIABLES}
+        os.environ.update({variable: str(threads_per_run) for variable in THREAD_ENVIRONMENT_VARIABLES})
+        try:
+            pool = context.Pool(number_of_workers, initializer=initialise_worker, initargs=(core_sets,))
+        finally:
+            for variable, value in previous_values.items():
+                if value is None:
+                    os.environ.pop(variable)
+                else:
+                    os.environ[variable] = value
+        with pool:
+            indexed_results = sorted(pool.imap_unordered(try_train_run, enumerate(runs)), key=lambda item: item[0])
+    return [result for index, result in indexed_results]
+
+
+def format_table(results):
+    rows = [[f'{value:.2f}' if isinstance(value, float) else '' if value is None else str(value) for value in
+             (result[column] for column in TABLE_COLUMNS)] for result in results]
+    widths = [max(len(cell) for cell in cells) for cells in zip(TABLE_COLUMNS, *rows)]
+    return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(cells, widths)).rstrip()
+                     for cells in [TABLE_COLUMNS] + rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--algorithms", nargs='+', default=['PPO', 'DDPG'], choices=['PPO', 'DDPG'])
+    variant_names = [env_variant['variant_name'] for env_variant in env_variants]
+    parser.add_argument("--env_variants", nargs='+', default=variant_names, choices=variant_names)
+    parser.add_argument("--seeds", nargs='+', default=[0, 1, 2], type=int)
+    parser.add_argument("--timesteps", default=20000, type=int)
+    parser.add_argument("--evaluation_episodes", default=10, type=int)
+    parser.add_argument("--threads_per_run", default=1, type=int)
+    parser.add_argument("--workers", default=None, type=int)
+    parser.add_argument("--output", default=None, help="Path of a .csv file for the table")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = sweep(args.algorithms, args.env_variants, args.seeds, args.timesteps, args.evaluation_episodes,
+                    args.threads_per_run, args.workers)
+    print(format_table(results))
+    number_of_failed_runs = sum(1 for result in results if result['error'])
+    print(f"Trained {len(results) - number_of_failed_runs} runs, {number_of_failed_runs} failed, "
+          f"in {time.perf_counter() - start:.1f} s")
+
+    if args.output:
+        with open(args.output, 'w', newline='') as output_file:
+            writer = csv.DictWriter(output_file, fieldnames=TABLE_COLUMNS)
+            writer.writeheader()
+            writer.writerows(results)